@@ -25,3 +25,141 @@ VECTOR_LABELS = [
     "romance_intensity",
     "conversation_depth",
 ]
+
+# Request tracing: JSON span log per request on stdout, plus optional OTLP/JSON file export
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+OTEL_TRACE_FILE = os.getenv("OTEL_TRACE_FILE", "")
+
+# On-demand request profiling. Disabled unless ADMIN_API_TOKEN is configured.
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
+# Shared, memory-mapped catalog index. tmpfs by default, so every worker maps
+# the same pages and a container restart starts from a clean slate.
+INDEX_DIR = os.getenv(
+    "INDEX_DIR",
+    "/dev/shm/mynextdate-index" if os.path.isdir("/dev/shm") else os.path.join(os.path.dirname(__file__), "data", ".index"),
+)
+INDEX_REFRESH_SECONDS = float(os.getenv("INDEX_REFRESH_SECONDS", "1.0"))
+
+# Cross-worker cache invalidation: "local" (single worker), "file" (shared JSON
+# lines file on one host, rotated past its size cap) or "postgres"
+# (LISTEN/NOTIFY on DATABASE_URL). WEB_CONCURRENCY is the worker count, as
+# read by uvicorn and gunicorn; above 1, "local" refuses to start.
+INVALIDATION_BACKEND = os.getenv("INVALIDATION_BACKEND", "local").lower()
+INVALIDATION_FILE = os.getenv("INVALIDATION_FILE", os.path.join(INDEX_DIR, "invalidation.jsonl"))
+INVALIDATION_FILE_MAX_BYTES = int(os.getenv("INVALIDATION_FILE_MAX_BYTES", str(8 * 1024 * 1024)))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "mynextdate_invalidation")
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+# Hybrid retrieval: weight of the max-normalised BM25 score added to cosine
+# similarity, and how long to wait for the LLM before answering lexically
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.15"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "4.0"))
+
+# Custom activities are indexed per worker and updated on insert through the
+# invalidation bus; this full re-read only catches rows that missed the bus
+CUSTOM_ACTIVITIES_RELOAD_SECONDS = float(os.getenv("CUSTOM_ACTIVITIES_RELOAD_SECONDS", "600"))
+
+# Recommendation sessions: ranked candidates cached per cursor for paging
+REC_SESSION_TTL_SECONDS = float(os.getenv("REC_SESSION_TTL_SECONDS", "600"))
+REC_SESSION_CANDIDATES = int(os.getenv("REC_SESSION_CANDIDATES", "50"))
+REC_SESSION_MAX = int(os.getenv("REC_SESSION_MAX", "10000"))
+
+# Materialized recommendations: recompute delay after a history write, how
+# often to refresh rows built against other catalog content, and how many
+# users' rows each worker keeps in memory
+MATERIALIZE_DEBOUNCE_SECONDS = float(os.getenv("MATERIALIZE_DEBOUNCE_SECONDS", "1.0"))
+MATERIALIZE_SWEEP_SECONDS = float(os.getenv("MATERIALIZE_SWEEP_SECONDS", "900"))
+MATERIALIZE_LOCAL_MAX = int(os.getenv("MATERIALIZE_LOCAL_MAX", "10000"))
+
+# Bulk date import: row and byte limits per upload, imports running and waiting
+# per worker, descriptions per LLM call and its timeout, and rows per
+# date_history insert
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+IMPORT_MAX_CONCURRENT = int(os.getenv("IMPORT_MAX_CONCURRENT", "2"))
+IMPORT_MAX_QUEUED = int(os.getenv("IMPORT_MAX_QUEUED", "8"))
+IMPORT_LLM_BATCH = int(os.getenv("IMPORT_LLM_BATCH", "20"))
+IMPORT_LLM_TIMEOUT_SECONDS = float(os.getenv("IMPORT_LLM_TIMEOUT_SECONDS", "30"))
+IMPORT_INSERT_BATCH = int(os.getenv("IMPORT_INSERT_BATCH", "500"))
+
+# Admin-only endpoints (e.g. the all-users export). Disabled unless a token is configured.
+# /api/metrics also takes it, as X-Admin-Token or "Authorization: Bearer <token>";
+# without one, only loopback and private-network clients may scrape.
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+# Durable background jobs (SQLite, shared by the workers on one host): pool
+# size, jobs claimed per drain, retry policy and crash-recovery lease
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(os.path.dirname(__file__), "data", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "20"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_COALESCE_SECONDS = float(os.getenv("JOB_COALESCE_SECONDS", "0.5"))
+
+# Near-duplicate activities: a new activity is aliased to an existing one when
+# their vectors' cosine similarity and their names' word overlap both reach these
+DEDUP_MIN_COSINE = float(os.getenv("DEDUP_MIN_COSINE", "0.97"))
+DEDUP_MIN_NAME_SIMILARITY = float(os.getenv("DEDUP_MIN_NAME_SIMILARITY", "0.5"))
+
+# Local text→vector regressor (scripts/train_local_vectorizer.py) tried before
+# the LLM, and the persisted LLM outputs it is trained on
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), "data", "llm_cache.sqlite3"))
+LOCAL_VECTORIZER_PATH = os.getenv("LOCAL_VECTORIZER_PATH", os.path.join(os.path.dirname(__file__), "data", "local_vectorizer.npz"))
+LOCAL_VECTORIZER_FEATURES = int(os.getenv("LOCAL_VECTORIZER_FEATURES", "4096"))
+LOCAL_VECTORIZER_MIN_CONFIDENCE = float(os.getenv("LOCAL_VECTORIZER_MIN_CONFIDENCE", "0.9"))
+
+# LLM providers in order of preference (the first configured one is primary).
+# A call is hedged to the next provider if the primary hasn't answered within
+# its recent LLM_HEDGE_QUANTILE latency, clamped to the min/max delay
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "groq,gemini").split(",") if p.strip()]
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.9"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.3"))
+LLM_HEDGE_MAX_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MAX_DELAY_SECONDS", "2.0"))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "1.0"))
+
+# Client-side timeouts, so a hung dependency can't hold a worker indefinitely
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "10"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "10"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+
+# Circuit breakers (services/circuit_breaker.py): outcomes window, the failure
+# and slow-call rates that open a breaker, and how long it stays open
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "2"))
+
+# Verifies access tokens locally while Supabase's circuit is open. Optional;
+# placeholder or short (< 32 character) values are ignored.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+
+# Actian connection (services/actian_connection.py): channel pool and keepalive,
+# per-RPC deadline, health-check interval and reconnect backoff
+ACTIAN_POOL_SIZE = int(os.getenv("ACTIAN_POOL_SIZE", "3"))
+ACTIAN_KEEPALIVE_MS = int(os.getenv("ACTIAN_KEEPALIVE_MS", "300000"))
+ACTIAN_KEEPALIVE_TIMEOUT_MS = int(os.getenv("ACTIAN_KEEPALIVE_TIMEOUT_MS", "10000"))
+ACTIAN_CALL_TIMEOUT_SECONDS = float(os.getenv("ACTIAN_CALL_TIMEOUT_SECONDS", "10"))
+ACTIAN_HEALTH_CHECK_SECONDS = float(os.getenv("ACTIAN_HEALTH_CHECK_SECONDS", "15"))
+ACTIAN_RECONNECT_BASE_SECONDS = float(os.getenv("ACTIAN_RECONNECT_BASE_SECONDS", "0.5"))
+ACTIAN_RECONNECT_MAX_SECONDS = float(os.getenv("ACTIAN_RECONNECT_MAX_SECONDS", "30"))
+
+# Bulk seeding (services/bulk_loader.py): vectors per batch_upsert, parallel
+# upload streams, attempts per chunk, and where resumable checkpoints live
+ACTIAN_BULK_CHUNK_SIZE = int(os.getenv("ACTIAN_BULK_CHUNK_SIZE", "500"))
+ACTIAN_BULK_STREAMS = int(os.getenv("ACTIAN_BULK_STREAMS", "3"))
+ACTIAN_BULK_MAX_ATTEMPTS = int(os.getenv("ACTIAN_BULK_MAX_ATTEMPTS", "4"))
+ACTIAN_BULK_CHECKPOINT_DIR = os.getenv("ACTIAN_BULK_CHECKPOINT_DIR", os.path.join(os.path.dirname(__file__), "data", ".seed_checkpoints"))
+
+# Incremental catalog sync (services/catalog_sync.py): run at startup, and the
+# largest share of a collection a sync may delete without --force
+ACTIAN_SYNC_ON_STARTUP = os.getenv("ACTIAN_SYNC_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+ACTIAN_SYNC_MAX_DELETE_FRACTION = float(os.getenv("ACTIAN_SYNC_MAX_DELETE_FRACTION", "0.5"))
@@ -1,10 +1,22 @@
-from fastapi import FastAPI
+import asyncio
+import math
+import os
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from middleware.auth import require_metrics_access
+from middleware.metrics import MetricsMiddleware
+from middleware.tracing import TracingMiddleware
+from middleware.profiling import ProfilingMiddleware
 from routes.recommend import router as recommend_router
 from routes.dates import router as dates_router
 from routes.analytics import router as analytics_router
 from routes.explore import router as explore_router
 from routes.social import router as social_router
+from routes.export import router as export_router
+from routes.admin import router as admin_router
+from services.circuit_breaker import CircuitOpenError
+from config import ACTIAN_SYNC_ON_STARTUP
 
 app = FastAPI(title="MyNextDate API", version="1.0.0")
 
@@ -14,69 +26,124 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 app.include_router(recommend_router)
 app.include_router(dates_router)
 app.include_router(analytics_router)
 app.include_router(explore_router)
 app.include_router(social_router)
+app.include_router(export_router)
+app.include_router(admin_router)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open(request: Request, exc: CircuitOpenError):
+    """A dependency a route had no fallback for is failing fast: 503 until its breaker half-opens."""
+    return JSONResponse(
+        {"detail": f"{exc.dependency} is temporarily unavailable, please retry shortly"},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 
 @app.on_event("startup")
 async def startup():
-    """Seed the Actian DB (if needed), warm vector cache, and ensure location table exists."""
-    import os
-    from services.actian_service import get_client, init_collection, seed_activities, ensure_cache
+    """Kick off startup steps in the background so /api/health answers immediately."""
+    from services.metrics import monitor_event_loop_lag
+    from services.job_queue import run_job_queue
+    from services.materialized_service import run_materializer
+    from services.actian_connection import run_actian_health_checks
+    from services.startup import StartupStep, run_startup
 
-    actian_client = None
-    try:
-        actian_client = get_client()
-        # Create collection + seed if it's empty
-        init_collection(actian_client)
-        stats = actian_client.describe_collection("date_activities")
-        count = getattr(stats, "point_count", 0) or getattr(stats, "vectors_count", 0) or 0
-        if count == 0:
-            activities_path = os.path.join(os.path.dirname(__file__), "data", "activities.json")
-            seed_activities(actian_client, activities_path)
-        ensure_cache()
-    except Exception as e:
-        print(f"Warning: Startup init failed: {e}")
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    app.state.materializer_task = asyncio.create_task(run_materializer())
+    app.state.job_queue_task = asyncio.create_task(run_job_queue())
+    app.state.actian_health_task = asyncio.create_task(run_actian_health_checks())
+    app.state.startup_task = asyncio.create_task(run_startup([
+        StartupStep("invalidation_bus", _start_invalidation_bus, timeout=10.0, gates_ready=True),
+        StartupStep("actian_catalog", _init_activity_catalog, timeout=60.0, gates_ready=True),
+        StartupStep("city_catalog", _init_city_catalog, timeout=60.0, gates_ready=True),
+        StartupStep("couples", _load_couples, timeout=10.0),
+        StartupStep("supabase_user_locations", _ensure_location_table, timeout=15.0),
+        StartupStep("supabase_custom_activities", _ensure_custom_activities_table, timeout=15.0),
+        StartupStep("supabase_materialized_recommendations", _ensure_materialized_table, timeout=15.0),
+    ]))
+    if ACTIAN_SYNC_ON_STARTUP:
+        app.state.catalog_sync_task = asyncio.create_task(_sync_catalogs_after_startup(app.state.startup_task))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    from services.invalidation import stop_bus
+    from services.actian_connection import connection
+    await asyncio.to_thread(stop_bus)
+    await asyncio.to_thread(connection.close)
+
+
+def _start_invalidation_bus():
+    """Listen for cache invalidations published by other workers."""
+    from services.invalidation import start_bus
+    start_bus()
+
+
+def _init_activity_catalog():
+    """Create the Actian collection (if needed) and warm the activity index, from the compiled snapshot when fresh."""
+    from services.actian_connection import actian_call
+    from services.actian_service import init_collection, ensure_cache
 
-    # Synthetic couples — pure in-memory, no Actian
     try:
-        from services.couples_service import load_couples
-        couples_path = os.path.join(os.path.dirname(__file__), "data", "synthetic_couples.json")
-        load_couples(couples_path)
+        with actian_call("get_or_create_collection") as actian_client:
+            init_collection(actian_client)
     except Exception as e:
-        print(f"Warning: Couples load failed: {e}")
+        # The snapshot can still serve the catalog; ensure_cache raises if there is none
+        print(f"Warning: Actian unavailable, loading activities from the snapshot: {e}")
+    ensure_cache()
+
+
+def _init_city_catalog():
+    """Create the city collection in Actian (if needed); the shared city index loads from the snapshot either way."""
+    from services.city_service import init_city_collection, load_city_cache
 
-    # City activities setup
     try:
-        from services.city_service import init_city_collection, seed_city_activities, load_city_cache
-        city_path = os.path.join(os.path.dirname(__file__), "data", "city_activities.json")
         init_city_collection()
-        city_seeded = False
-        if actian_client:
-            try:
-                city_stats = actian_client.describe_collection("city_date_spots")
-                city_count = getattr(city_stats, "point_count", 0) or getattr(city_stats, "vectors_count", 0) or 0
-                if city_count == 0:
-                    seed_city_activities(city_path)
-                    city_seeded = True
-                else:
-                    load_city_cache(city_path)
-                    city_seeded = True
-            except Exception:
-                pass
-        if not city_seeded:
-            load_city_cache(city_path)
     except Exception as e:
-        print(f"Warning: City activities init failed: {e}")
+        print(f"Warning: City collection unavailable, serving city spots from JSON: {e}")
+    load_city_cache(os.path.join(DATA_DIR, "city_activities.json"))
+
+
+def _sync_catalogs():
+    """Bring both Actian collections in line with the JSON catalogs: only changed records are written."""
+    from services.actian_service import sync_activities
+    from services.city_service import sync_city_activities
+
+    for name, sync, path in (
+        ("activities", sync_activities, "activities.json"),
+        ("city spots", sync_city_activities, "city_activities.json"),
+    ):
+        try:
+            sync(os.path.join(DATA_DIR, path))
+        except Exception as e:
+            print(f"Warning: Actian sync of {name} failed, will retry on next startup: {e}")
 
-    # Ensure tables exist in Supabase
-    await _ensure_location_table()
-    await _ensure_custom_activities_table()
+
+async def _sync_catalogs_after_startup(startup_task: asyncio.Task):
+    # Runs outside the startup steps so a long first sync doesn't hold back readiness
+    await startup_task
+    await asyncio.to_thread(_sync_catalogs)
+
+
+def _load_couples():
+    # Synthetic couples — pure in-memory, no Actian
+    from services.couples_service import load_couples
+    load_couples(os.path.join(DATA_DIR, "synthetic_couples.json"))
 
 
 async def _ensure_location_table():
@@ -113,9 +180,7 @@ async def _ensure_location_table():
                 print("user_locations table ready.")
             else:
                 # Table might already exist or RPC not available — try a test query
-                from supabase import create_client
-                sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-                sb.table("user_locations").select("id").limit(1).execute()
+                await asyncio.to_thread(_probe_table, "user_locations")
                 print("user_locations table already exists.")
     except Exception as e:
         print(f"Note: Could not auto-create user_locations table: {e}")
@@ -131,14 +196,10 @@ async def _ensure_location_table():
         print("  CREATE INDEX IF NOT EXISTS idx_user_locations_city ON user_locations(city);")
 
 
-async def _ensure_custom_activities_table():
+def _ensure_custom_activities_table():
     """Check custom_activities table exists. Print SQL if it needs manual creation."""
-    from supabase import create_client
-    from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
-
     try:
-        sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-        sb.table("custom_activities").select("id").limit(1).execute()
+        _probe_table("custom_activities")
         print("custom_activities table ready.")
     except Exception:
         print("Note: custom_activities table not found. Please create it in Supabase SQL Editor:")
@@ -151,6 +212,45 @@ async def _ensure_custom_activities_table():
         print("  );")
 
 
+def _ensure_materialized_table():
+    """Check materialized_recommendations exists. Without it results stay per-worker in memory."""
+    try:
+        _probe_table("materialized_recommendations", column="user_id, catalog_version, history_mark, latest_history_mark")
+        print("materialized_recommendations table ready.")
+    except Exception:
+        print("Note: materialized_recommendations table not found or out of date. Please (re)create it in Supabase SQL Editor:")
+        print("  CREATE TABLE IF NOT EXISTS materialized_recommendations (")
+        print("    user_id UUID PRIMARY KEY,")
+        print("    preference_vector JSONB NOT NULL,")
+        print("    recommendations JSONB NOT NULL,")
+        print("    worst JSONB NOT NULL,")
+        print("    social JSONB NOT NULL,")
+        print("    catalog_version TEXT,")
+        print("    history_mark TEXT,")
+        print("    latest_history_mark TEXT,")
+        print("    computed_at TIMESTAMP WITH TIME ZONE NOT NULL")
+        print("  );")
+
+
+def _probe_table(table: str, column: str = "id"):
+    from services.clients import get_supabase
+    get_supabase().table(table).select(column).limit(1).execute()
+
+
 @app.get("/api/health")
 async def health():
     return {"status": "ok", "service": "mynextdate"}
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 200 only once the activity and city caches are warm."""
+    from services.startup import is_ready, startup_report
+    return JSONResponse(startup_report(), status_code=200 if is_ready() else 503)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    """Prometheus scrape endpoint for this worker."""
+    from services.metrics import render_metrics
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
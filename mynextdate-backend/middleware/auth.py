@@ -1,6 +1,25 @@
+import hmac
+import ipaddress
 from fastapi import Request, HTTPException
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_ANON_KEY
+from config import ADMIN_API_TOKEN, SUPABASE_JWT_SECRET
+from services.clients import get_supabase_anon
+from services.circuit_breaker import CircuitOpenError, guarded
+from services.tracing import span
+
+# HS256 secrets shorter than this (Supabase's are far longer) or still holding
+# an example value are never used to accept tokens
+MIN_JWT_SECRET_LENGTH = 32
+_PLACEHOLDER_MARKERS = ("your-", "your_", "changeme", "change-me", "example", "placeholder", "secret")
+
+
+def _usable_jwt_secret(secret: str) -> bool:
+    lowered = secret.lower()
+    return len(secret) >= MIN_JWT_SECRET_LENGTH and not any(marker in lowered for marker in _PLACEHOLDER_MARKERS)
+
+
+LOCAL_JWT_VERIFICATION = _usable_jwt_secret(SUPABASE_JWT_SECRET)
+if SUPABASE_JWT_SECRET and not LOCAL_JWT_VERIFICATION:
+    print("Warning: SUPABASE_JWT_SECRET looks like a placeholder or is too short; local token verification is disabled.")
 
 
 async def get_current_user(request: Request) -> dict:
@@ -13,8 +32,10 @@ async def get_current_user(request: Request) -> dict:
     token = auth_header.split(" ", 1)[1]
 
     try:
-        sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_response = sb.auth.get_user(token)
+        with span("auth"):
+            sb = get_supabase_anon()
+            with guarded("supabase", "auth.get_user"):
+                user_response = sb.auth.get_user(token)
         user = user_response.user
 
         if not user:
@@ -26,5 +47,51 @@ async def get_current_user(request: Request) -> dict:
         }
     except HTTPException:
         raise
+    except CircuitOpenError:
+        if not LOCAL_JWT_VERIFICATION:
+            raise
+        return _verify_locally(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+def _verify_locally(token: str) -> dict:
+    """Check the token's signature and expiry with the project's JWT secret, for while Supabase is unreachable."""
+    import jwt
+    if not LOCAL_JWT_VERIFICATION:
+        raise HTTPException(status_code=503, detail="Authentication is temporarily unavailable")
+    try:
+        claims = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {"id": claims["sub"], "email": claims.get("email")}
+
+
+def admin_token_matches(token: str) -> bool:
+    """True if `token` is ADMIN_API_TOKEN. Always False while no admin token is configured."""
+    # Compare bytes: compare_digest raises TypeError on non-ASCII str, e.g. a latin-1 decoded header
+    return bool(ADMIN_API_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode())
+
+
+async def require_admin(request: Request):
+    """Allow only requests whose X-Admin-Token header matches ADMIN_API_TOKEN (refused if none is configured)."""
+    if not admin_token_matches(request.headers.get("X-Admin-Token", "")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+async def require_metrics_access(request: Request):
+    """Allow scrapes with ADMIN_API_TOKEN (X-Admin-Token or a bearer token) or, if none is configured, from internal addresses only."""
+    if ADMIN_API_TOKEN:
+        auth_header = request.headers.get("Authorization", "")
+        token = auth_header.split(" ", 1)[1] if auth_header.startswith("Bearer ") else request.headers.get("X-Admin-Token", "")
+        if not admin_token_matches(token):
+            raise HTTPException(status_code=403, detail="Admin token required")
+        return
+    try:
+        address = ipaddress.ip_address(request.client.host if request.client else "")
+    except ValueError:
+        address = None
+    if address is None or not (address.is_loopback or address.is_private):
+        raise HTTPException(status_code=403, detail="Metrics are only served to internal clients")
@@ -0,0 +1,102 @@
+import asyncio
+from urllib.parse import parse_qs
+from config import ADMIN_API_TOKEN, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS
+from middleware.auth import admin_token_matches
+from services.profiler import try_start, finish, new_profile_id, profile_path, save_profile
+
+
+def _profile_request(scope) -> tuple[bool, str]:
+    """Return (authorized, mode) for a request asking to be profiled.
+
+    Opt in with the `_profile=1` query flag (or an `X-Profile-Mode` header) and
+    an `X-Admin-Token` header matching ADMIN_API_TOKEN. The token is never read
+    from the URL, where it would end up in history and access logs. Mode comes
+    from `X-Profile-Mode` (or `_profile_mode`): "save" (default) writes the
+    profile to PROFILE_DIR and returns its id in `X-Profile-Id` (fetch it from
+    /api/admin/profiles/{id}), "inline" returns it as the response body
+    instead of the normal response.
+    """
+    token = mode = ""
+    for name, value in scope.get("headers", []):
+        if name == b"x-admin-token":
+            token = value.decode("latin-1")
+        elif name == b"x-profile-mode":
+            mode = value.decode("latin-1")
+    requested = bool(mode)
+    if b"_profile" in scope.get("query_string", b""):
+        params = parse_qs(scope["query_string"].decode("latin-1"))
+        requested = requested or params.get("_profile", [""])[0] not in ("", "0", "false")
+        mode = mode or params.get("_profile_mode", [""])[0]
+    if not requested:
+        return False, ""
+    return admin_token_matches(token), mode or "save"
+
+
+def _add_headers(send, *headers: tuple[bytes, bytes]):
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + list(headers)}
+        await send(message)
+    return wrapped
+
+
+class ProfilingMiddleware:
+    """Run admin-flagged requests under the sampling profiler. Off unless ADMIN_API_TOKEN is set."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMIN_API_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        authorized, mode = _profile_request(scope)
+        if not authorized:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = try_start(PROFILE_INTERVAL_MS / 1000, PROFILE_MAX_SECONDS)
+        if profiler is None:
+            await self.app(scope, receive, _add_headers(send, (b"x-profile", b"busy")))
+            return
+
+        if mode == "inline":
+            await self._profile_inline(profiler, scope, receive, send)
+            return
+
+        profile_id = new_profile_id(f"{scope['method']}-{scope['path']}")
+        path = profile_path(PROFILE_DIR, profile_id)
+        try:
+            await self.app(scope, receive, _add_headers(send, (b"x-profile-id", profile_id.encode())))
+        finally:
+            await asyncio.to_thread(finish, profiler)
+            await asyncio.to_thread(save_profile, profiler, path)
+            print(f"Saved request profile ({profiler.samples} samples, {profiler.duration:.2f}s): {path}")
+
+    async def _profile_inline(self, profiler, scope, receive, send):
+        """Swallow the real response and send the folded profile in its place."""
+        original_status = 500
+
+        async def discard(message):
+            nonlocal original_status
+            if message["type"] == "http.response.start":
+                original_status = message["status"]
+
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            await asyncio.to_thread(finish, profiler)
+
+        body = profiler.folded().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(profiler.samples).encode()),
+                (b"x-profile-original-status", str(original_status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,22 @@
+from fastapi import HTTPException
+from services.startup import is_warming, wait_until_ready
+
+# How long a catalog-backed request may wait for warm-up before getting a 503
+WARMUP_WAIT_SECONDS = 5.0
+
+
+async def require_warm_caches():
+    """Hold catalog-backed requests while startup warms the caches, then 503 with Retry-After.
+
+    Only applies while startup is in progress. If a startup step failed, requests
+    pass through and the services fall back to warming lazily, as before.
+    """
+    if not is_warming():
+        return
+    if await wait_until_ready(WARMUP_WAIT_SECONDS) or not is_warming():
+        return
+    raise HTTPException(
+        status_code=503,
+        detail="Service is warming up, please retry shortly",
+        headers={"Retry-After": "5"},
+    )
@@ -0,0 +1,39 @@
+from services.tracing import start_trace, end_trace
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware that opens a trace per request and adds Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+
+        trace, token = start_trace(request_id, scope["method"], scope["path"])
+        if not trace.request_id:
+            trace.request_id = trace.trace_id
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            trace.route = getattr(route, "path", None) or scope["path"]
+            end_trace(trace, token)
@@ -0,0 +1,38 @@
+"""Admin-only operations. Every route requires X-Admin-Token (see require_admin)."""
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from config import PROFILE_DIR
+from middleware.auth import require_admin
+from services import job_queue
+from services.profiler import profile_path
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/jobs")
+async def get_jobs(limit: int = 100):
+    """Background queue depth by kind/status, plus the most recent dead letters."""
+    stats, dead = await asyncio.gather(
+        asyncio.to_thread(job_queue.stats),
+        asyncio.to_thread(job_queue.dead_letters, min(limit, 1000)),
+    )
+    return {"queues": stats, "dead_letters": dead}
+
+
+@router.post("/jobs/{job_id}/requeue")
+async def requeue_job(job_id: int):
+    """Give a dead-lettered job a fresh set of attempts."""
+    if not await asyncio.to_thread(job_queue.requeue, job_id):
+        raise HTTPException(status_code=404, detail="No dead job with that id")
+    return {"requeued": job_id}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """A saved request profile (folded stacks) by the id returned in its X-Profile-Id header."""
+    path = profile_path(PROFILE_DIR, profile_id)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
@@ -1,52 +1,13 @@
 from fastapi import APIRouter, Depends
 from middleware.auth import get_current_user
-from services.actian_service import get_activity_vectors, get_custom_date_vectors
-from services.analytics_service import compute_analytics
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+from middleware.readiness import require_warm_caches
+from services.analytics_service import get_user_analytics
+from services.clients import get_supabase
 
-router = APIRouter(prefix="/api", tags=["analytics"])
-
-_sb = None
-
-
-def get_supabase():
-    global _sb
-    if _sb is None:
-        _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return _sb
+router = APIRouter(prefix="/api", tags=["analytics"], dependencies=[Depends(require_warm_caches)])
 
 
 @router.get("/analytics")
-async def get_analytics(user: dict = Depends(get_current_user)):
-    """Get user dating analytics."""
-    sb = get_supabase()
-
-    result = sb.table("date_history").select("*").eq(
-        "user_id", user["id"]
-    ).order("created_at", desc=True).execute()
-
-    dates = result.data or []
-    activity_ids = list(set(d["activity_id"] for d in dates))
-    activity_vectors = get_activity_vectors(activity_ids)
-
-    # Include custom date vectors (activity_id=0) in analytics
-    custom_date_ids = [d["id"] for d in dates if d["activity_id"] == 0]
-    custom_vectors = get_custom_date_vectors(custom_date_ids)
-
-    dates_with_names = []
-    for d in dates:
-        entry = {
-            "activity_id": d["activity_id"],
-            "rating": d["rating"],
-            "created_at": d.get("created_at", ""),
-            "activity_name": d.get("activity_name", ""),
-        }
-        # For custom dates, swap in the date record ID so analytics can find the vector
-        if d["activity_id"] == 0 and d["id"] in custom_vectors:
-            activity_vectors[d["id"]] = custom_vectors[d["id"]]
-            entry["activity_id"] = d["id"]
-        dates_with_names.append(entry)
-
-    analytics = compute_analytics(dates_with_names, activity_vectors)
-    return analytics
+async def get_analytics(repair: bool = False, user: dict = Depends(get_current_user)):
+    """Get user dating analytics. `repair=true` rebuilds the running aggregate from full history."""
+    return get_user_analytics(user["id"], get_supabase(), repair=repair)
@@ -1,23 +1,27 @@
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import math
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from config import IMPORT_MAX_BYTES
 from middleware.auth import get_current_user
-from services.actian_service import get_client, search_similar, ensure_cache, store_custom_date_vector, save_custom_activity, search_custom_activities
-from services.text_to_vector import text_to_vector
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY, COLLECTION_NAME
+from middleware.readiness import require_warm_caches
+from services.actian_service import get_client, search_similar, search_lexical, ensure_cache, store_custom_date_vector, forget_custom_date_vector, save_custom_activity, search_custom_activities
+from services.text_to_vector import text_to_vector, try_text_to_vector
+from services.clients import get_supabase
+from services.activity_seeding import enqueue_activity_seed
+from services.history_store import history_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.import_service import ImportBusyError, ImportFormatError, parse_upload, create_job, get_job, start_import
+from services.invalidation import publish_event
+from services.metrics import record_cache
+from services.circuit_breaker import CircuitOpenError, guarded
+from services.recommendation_service import merge_by_name
+from services.tracing import span
 
 router = APIRouter(prefix="/api", tags=["dates"])
 
-_sb = None
-
-
-def get_supabase():
-    global _sb
-    if _sb is None:
-        _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return _sb
-
 
 class AddDateByTextRequest(BaseModel):
     description: str
@@ -38,54 +42,130 @@ class RateDateRequest(BaseModel):
     rating: float  # 0-5
 
 
-@router.get("/dates")
-async def get_date_history(user: dict = Depends(get_current_user)):
-    """Get all dates for the current user."""
-    sb = get_supabase()
-    result = sb.table("date_history").select("*").eq(
-        "user_id", user["id"]
-    ).order("created_at", desc=True).execute()
-
-    return {"dates": result.data or []}
+def _history_changed(user_id: str, op: str, record: dict):
+    """Broadcast a date_history write with the row's delta, so per-user aggregates can apply it in place."""
+    date = {k: record.get(k) for k in ("id", "activity_id", "rating", "created_at")}
+    publish_event("history_changed", user_id=user_id, op=op, date=date)
 
 
-@router.post("/dates/preview")
-async def preview_date_matches(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
-    """Convert description to vector and return top 3 matches from JSON activities + community custom activities."""
-    if not body.description.strip():
-        raise HTTPException(status_code=400, detail="Description cannot be empty")
-
-    try:
-        query_vector = await text_to_vector(body.description)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to analyze description: {str(e)}")
-
+@router.get("/dates")
+async def get_date_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(default=""),
+    user: dict = Depends(get_current_user),
+):
+    """Get the current user's dates, newest first. Pass `next_cursor` back as `cursor` for the next page."""
     sb = get_supabase()
+    try:
+        with span("db_fetch"):
+            dates, next_cursor = history_page(sb, user["id"], limit, cursor or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"dates": dates, "next_cursor": next_cursor}
+
+
+async def _match_stages(description: str, sb) -> AsyncIterator[tuple[str, dict]]:
+    """Describe/preview matching, yielding (stage, payload) as each step completes.
+
+    Stages: "vector" (extracted vector and mode), "catalog" (catalog matches),
+    "community" (custom activity matches, hybrid mode only) and "matches"
+    (merged top 3). If the LLM is slow or down, matches come from BM25 over the
+    catalog alone (mode "lexical"). Raises HTTPException if nothing matches.
+    """
+    with span("llm"):
+        query_vector = await try_text_to_vector(description)
+    yield "vector", {"extracted_vector": query_vector, "mode": "hybrid" if query_vector is not None else "lexical"}
+
+    if query_vector is None:
+        with span("lexical_search"):
+            lexical = search_lexical(description, top_k=3)
+        if not lexical:
+            raise HTTPException(status_code=500, detail="Failed to analyze description")
+        yield "catalog", {"matches": lexical}
+        yield "matches", {"top_matches": lexical}
+        return
 
     # Search both the 200 JSON activities and community custom activities
-    json_results = search_similar(query_vector, top_k=3, text_query=body.description)
-    custom_results = search_custom_activities(query_vector, sb, top_k=3, text_query=body.description)
+    with span("search"):
+        json_results = search_similar(query_vector, top_k=3, text_query=description)
+    yield "catalog", {"matches": json_results}
+    with span("custom_search"):
+        custom_results = search_custom_activities(query_vector, sb, top_k=3, text_query=description)
+    yield "community", {"matches": custom_results}
 
     # Merge, deduplicate by name, sort by score, take top 3
-    seen_names = set()
-    merged = []
-    for r in sorted(json_results + custom_results, key=lambda x: x["score"], reverse=True):
-        name_lower = r["name"].strip().lower()
-        if name_lower not in seen_names:
-            seen_names.add(name_lower)
-            merged.append(r)
-        if len(merged) == 3:
-            break
-
+    merged = merge_by_name(json_results + custom_results, 3)
     if not merged:
         raise HTTPException(status_code=500, detail="No matching activity found")
+    yield "matches", {"top_matches": merged}
+
+
+async def _collect(stages: AsyncIterator[tuple[str, dict]]) -> dict:
+    return {stage: payload async for stage, payload in stages}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _event_stream(events: AsyncIterator[tuple[str, dict]]) -> StreamingResponse:
+    """Server-sent events for a stage iterator, ending with "done" (or "error" with the HTTP status and detail)."""
+    async def body():
+        try:
+            async for stage, payload in events:
+                yield _sse(stage, payload)
+        except HTTPException as e:
+            yield _sse("error", {"status": e.status_code, "detail": e.detail})
+            return
+        except CircuitOpenError as e:
+            # Headers are already sent, so the error handler in main.py can't turn this into a 503
+            print(f"Event stream stopped, {e.dependency} circuit open")
+            yield _sse("error", {
+                "status": 503,
+                "detail": f"{e.dependency} is temporarily unavailable, please retry shortly",
+                "retry_after": max(1, math.ceil(e.retry_after)),
+            })
+            return
+        except Exception as e:
+            print(f"Event stream failed: {e!r}")
+            yield _sse("error", {"status": 500, "detail": "Internal server error"})
+            return
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _require_description(body: AddDateByTextRequest):
+    if not body.description.strip():
+        raise HTTPException(status_code=400, detail="Description cannot be empty")
 
+
+@router.post("/dates/preview", dependencies=[Depends(require_warm_caches)])
+async def preview_date_matches(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
+    """Convert description to vector and return top 3 matches from JSON activities + community custom activities.
+
+    If the LLM is slow or down, answers from BM25 over the catalog alone (mode "lexical").
+    """
+    _require_description(body)
+    stages = await _collect(_match_stages(body.description, get_supabase()))
     return {
-        "top_matches": merged,
-        "extracted_vector": query_vector,
+        "top_matches": stages["matches"]["top_matches"],
+        **stages["vector"],
     }
 
 
+@router.post("/dates/preview/stream", dependencies=[Depends(require_warm_caches)])
+async def stream_date_matches(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
+    """Preview as server-sent events: vector, catalog, community, matches, done."""
+    _require_description(body)
+    return _event_stream(_match_stages(body.description, get_supabase()))
+
+
 @router.post("/dates/custom")
 async def add_custom_date(body: AddCustomDateRequest, user: dict = Depends(get_current_user)):
     """Add a custom date. Groq generates a vector that influences future recommendations."""
@@ -93,7 +173,10 @@ async def add_custom_date(body: AddCustomDateRequest, user: dict = Depends(get_c
         raise HTTPException(status_code=400, detail="Activity name cannot be empty")
 
     try:
-        query_vector = await text_to_vector(body.name.strip())
+        with span("llm"):
+            query_vector = await text_to_vector(body.name.strip())
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze activity: {str(e)}")
 
@@ -104,18 +187,21 @@ async def add_custom_date(body: AddCustomDateRequest, user: dict = Depends(get_c
         "activity_name": body.name.strip(),
         "rating": body.rating,
     }
-    result = sb.table("date_history").insert(data).execute()
+    with span("db_insert"), guarded("supabase", "date_history.insert"):
+        result = sb.table("date_history").insert(data).execute()
     record = result.data[0] if result.data else data
 
     # Store vector in memory so recommendations/analytics can use it
     if record.get("id"):
         store_custom_date_vector(record["id"], query_vector)
+    _history_changed(user["id"], "insert", record)
 
     # Save to shared custom_activities table so other users can find it
-    save_custom_activity(body.name.strip(), query_vector, user["id"], sb)
+    with span("custom_save"):
+        save_custom_activity(body.name.strip(), query_vector, user["id"], sb)
 
-    # Non-blocking: generate canonical entry and seed into global activity pool
-    asyncio.create_task(_seed_activity_background(body.name.strip(), query_vector))
+    # Queued: a background worker generates the canonical entry and seeds it into the global pool
+    await asyncio.to_thread(enqueue_activity_seed, body.name.strip(), query_vector)
 
     return {
         "date": record,
@@ -123,79 +209,61 @@ async def add_custom_date(body: AddCustomDateRequest, user: dict = Depends(get_c
     }
 
 
-async def _seed_activity_background(user_text: str, vector: list[float]):
-    """Background task: canonicalize activity name and seed into global pool."""
-    try:
-        from services.text_to_vector import generate_activity_entry
-        from services.actian_service import seed_single_activity
-        entry = await generate_activity_entry(user_text)
-        name = entry.get("name", user_text)
-        description = entry.get("description", "")
-        seed_single_activity(name, description, vector)
-    except Exception as e:
-        print(f"Background activity seed failed: {e}")
-
+async def _describe_stages(body: AddDateByTextRequest, user_id: str, sb) -> AsyncIterator[tuple[str, dict]]:
+    """Matching stages, then a "record" stage once the best match is stored."""
+    top_matches = None
+    async for stage, payload in _match_stages(body.description, sb):
+        yield stage, payload
+        if stage == "matches":
+            top_matches = payload["top_matches"]
 
-@router.post("/dates/describe")
-async def add_date_by_description(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
-    """Add a date by describing it in text. Uses Groq to extract a 9D vector, then matches to closest activity in Actian."""
-    if not body.description.strip():
-        raise HTTPException(status_code=400, detail="Description cannot be empty")
-
-    try:
-        query_vector = await text_to_vector(body.description)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to analyze description: {str(e)}")
-
-    # Search both JSON activities and community custom activities
-    sb = get_supabase()
-    json_results = search_similar(query_vector, top_k=3, text_query=body.description)
-    custom_results = search_custom_activities(query_vector, sb, top_k=3, text_query=body.description)
-
-    seen_names = set()
-    results = []
-    for r in sorted(json_results + custom_results, key=lambda x: x["score"], reverse=True):
-        name_lower = r["name"].strip().lower()
-        if name_lower not in seen_names:
-            seen_names.add(name_lower)
-            results.append(r)
-        if len(results) == 3:
-            break
-
-    if not results:
-        raise HTTPException(status_code=500, detail="No matching activity found")
-
-    best = results[0]
-    activity_id = best["id"]
-    activity_name = best["name"]
-    match_score = best["score"]
-
-    # Store in Supabase
-    sb = get_supabase()
+    best = top_matches[0]
     data = {
-        "user_id": user["id"],
-        "activity_id": activity_id,
-        "activity_name": activity_name,
+        "user_id": user_id,
+        "activity_id": best["id"],
+        "activity_name": best["name"],
         "rating": body.rating,
     }
-    result = sb.table("date_history").insert(data).execute()
+    with span("db_insert"), guarded("supabase", "date_history.insert"):
+        result = sb.table("date_history").insert(data).execute()
+    record = result.data[0] if result.data else data
+    _history_changed(user_id, "insert", record)
+    yield "record", {"date": record, "matched_activity": best["name"], "match_score": best["score"]}
+
+
+@router.post("/dates/describe", dependencies=[Depends(require_warm_caches)])
+async def add_date_by_description(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
+    """Add a date by describing it in text. Uses Groq to extract a 9D vector, then matches to closest activity in Actian.
 
+    If the LLM is slow or down, the date is matched with BM25 over the catalog alone.
+    """
+    _require_description(body)
+    stages = await _collect(_describe_stages(body, user["id"], get_supabase()))
     return {
-        "date": result.data[0] if result.data else data,
-        "matched_activity": activity_name,
-        "match_score": match_score,
-        "top_matches": results,
-        "extracted_vector": query_vector,
+        **stages["record"],
+        "top_matches": stages["matches"]["top_matches"],
+        **stages["vector"],
     }
 
 
-@router.post("/dates")
+@router.post("/dates/describe/stream", dependencies=[Depends(require_warm_caches)])
+async def stream_date_by_description(body: AddDateByTextRequest, user: dict = Depends(get_current_user)):
+    """Describe as server-sent events: vector, catalog, community, matches, record, done.
+
+    The top match is known after one LLM round-trip; the insert happens on the same connection.
+    """
+    _require_description(body)
+    return _event_stream(_describe_stages(body, user["id"], get_supabase()))
+
+
+@router.post("/dates", dependencies=[Depends(require_warm_caches)])
 async def add_date(body: AddDateRequest, user: dict = Depends(get_current_user)):
     """Add a date by activity ID (used when selecting from recommendations)."""
-    from services.actian_service import _payload_cache
+    from services.actian_service import get_activity_payload
     ensure_cache()
 
-    payload = _payload_cache.get(body.activity_id, {})
+    payload = get_activity_payload(body.activity_id) or {}
+    record_cache("activity_payloads", hits=int(bool(payload)), misses=int(not payload))
     activity_name = payload.get("name", "Unknown Activity")
 
     sb = get_supabase()
@@ -206,8 +274,56 @@ async def add_date(body: AddDateRequest, user: dict = Depends(get_current_user))
         "rating": body.rating,
     }
 
-    result = sb.table("date_history").insert(data).execute()
-    return {"date": result.data[0] if result.data else data}
+    with span("db_insert"), guarded("supabase", "date_history.insert"):
+        result = sb.table("date_history").insert(data).execute()
+    record = result.data[0] if result.data else data
+    _history_changed(user["id"], "insert", record)
+    return {"date": record}
+
+
+@router.post("/dates/import", status_code=202, dependencies=[Depends(require_warm_caches)])
+async def import_dates(request: Request, user: dict = Depends(get_current_user)):
+    """Bulk-import dates from JSON ({"rows": [...]}) or CSV (Content-Type: text/csv).
+
+    Rows carry `activity_id` or free text (`activity`/`name`/`description`), plus
+    optional `rating` and `date`. Runs in the background; poll the returned job.
+    """
+    try:
+        rows, errors = parse_upload(await _read_upload(request), request.headers.get("content-type", ""))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = await asyncio.to_thread(create_job, user["id"], len(rows) + len(errors), errors)
+    try:
+        start_import(job, rows, get_supabase())
+    except ImportBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+
+async def _read_upload(request: Request) -> bytes:
+    """The request body, refused with 413 as soon as it's known to exceed IMPORT_MAX_BYTES."""
+    too_large = HTTPException(status_code=413, detail=f"Upload is larger than {IMPORT_MAX_BYTES} bytes")
+    try:
+        if int(request.headers.get("content-length", "0")) > IMPORT_MAX_BYTES:
+            raise too_large
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > IMPORT_MAX_BYTES:
+            raise too_large
+    return bytes(body)
+
+
+@router.get("/dates/import/{job_id}")
+async def get_import_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Progress of a bulk import."""
+    job = await asyncio.to_thread(get_job, job_id, user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
 
 
 @router.patch("/dates/{date_id}")
@@ -219,12 +335,14 @@ async def rate_date(
         raise HTTPException(status_code=400, detail="Rating must be 0-5")
 
     sb = get_supabase()
-    result = sb.table("date_history").update(
-        {"rating": body.rating}
-    ).eq("id", date_id).eq("user_id", user["id"]).execute()
+    with span("db_update"), guarded("supabase", "date_history.update"):
+        result = sb.table("date_history").update(
+            {"rating": body.rating}
+        ).eq("id", date_id).eq("user_id", user["id"]).execute()
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Date not found")
+    _history_changed(user["id"], "rate", result.data[0])
 
     return {"date": result.data[0]}
 
@@ -233,8 +351,12 @@ async def rate_date(
 async def delete_date(date_id: str, user: dict = Depends(get_current_user)):
     """Delete a date from history."""
     sb = get_supabase()
-    result = sb.table("date_history").delete().eq(
-        "id", date_id
-    ).eq("user_id", user["id"]).execute()
-
+    with span("db_delete"), guarded("supabase", "date_history.delete"):
+        result = sb.table("date_history").delete().eq(
+            "id", date_id
+        ).eq("user_id", user["id"]).execute()
+
+    if result.data:
+        forget_custom_date_vector(date_id)
+        publish_event("history_changed", user_id=user["id"], op="delete", date_ids=[r["id"] for r in result.data])
     return {"deleted": True}
@@ -1,10 +1,12 @@
 """Public explore endpoints — no authentication required."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
+from middleware.readiness import require_warm_caches
 from services.city_service import get_cities_summary, search_city
-from services.text_to_vector import text_to_vector
+from services.text_to_vector import try_text_to_vector
+from services.tracing import span
 
-router = APIRouter(prefix="/api/explore", tags=["explore"])
+router = APIRouter(prefix="/api/explore", tags=["explore"], dependencies=[Depends(require_warm_caches)])
 
 
 class SearchCityRequest(BaseModel):
@@ -24,21 +26,25 @@ async def get_cities():
 
 @router.post("/search")
 async def search_city_activities(body: SearchCityRequest):
-    """Search city activities with optional vector ranking. No auth required."""
+    """Search city activities with optional hybrid vector + BM25 ranking. No auth required.
+
+    If the LLM is slow or down, the description is matched with BM25 alone.
+    """
     query_vector = None
-    if body.description and body.description.strip():
-        try:
-            query_vector = await text_to_vector(body.description.strip())
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to analyze description: {str(e)}")
-
-    results = search_city(
-        city=body.city,
-        query_vector=query_vector,
-        top_k=body.top_k,
-        price_tier=body.price_tier,
-        indoor=body.indoor,
-        vibes=body.vibes,
-    )
+    description = body.description.strip() if body.description else ""
+    if description:
+        with span("llm"):
+            query_vector = await try_text_to_vector(description)
+
+    with span("search"):
+        results = search_city(
+            city=body.city,
+            query_vector=query_vector,
+            top_k=body.top_k,
+            price_tier=body.price_tier,
+            indoor=body.indoor,
+            vibes=body.vibes,
+            text_query=description or None,
+        )
 
     return {"results": results, "city": body.city, "count": len(results)}
@@ -0,0 +1,40 @@
+"""Streaming exports of date history (NDJSON or CSV)."""
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from middleware.auth import get_current_user, require_admin
+from middleware.readiness import require_warm_caches
+from services.analytics_service import get_user_analytics
+from services.clients import get_supabase
+from services.export_service import FORMATS, ndjson_stream, csv_stream
+
+router = APIRouter(prefix="/api", tags=["export"], dependencies=[Depends(require_warm_caches)])
+
+FORMAT_PATTERN = "^(ndjson|csv)$"
+
+
+def _stream(body, fmt: str, name: str) -> StreamingResponse:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d")
+    return StreamingResponse(
+        body,
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{stamp}.{fmt}"'},
+    )
+
+
+@router.get("/export")
+async def export_my_dates(format: str = Query("ndjson", pattern=FORMAT_PATTERN), user: dict = Depends(get_current_user)):
+    """Stream the current user's date history. NDJSON starts with an {"type": "analytics"} record."""
+    sb = get_supabase()
+    if format == "csv":
+        return _stream(csv_stream(sb, user["id"]), format, "mynextdate-history")
+    header = {"type": "analytics", **get_user_analytics(user["id"], sb)}
+    return _stream(ndjson_stream(sb, user["id"], header), format, "mynextdate-history")
+
+
+@router.get("/admin/export", dependencies=[Depends(require_admin)])
+async def export_all_dates(format: str = Query("ndjson", pattern=FORMAT_PATTERN)):
+    """Stream every user's date history for offline analysis. Requires X-Admin-Token."""
+    sb = get_supabase()
+    body = csv_stream(sb, None) if format == "csv" else ndjson_stream(sb, None)
+    return _stream(body, format, "mynextdate-all-history")
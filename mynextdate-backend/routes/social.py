@@ -1,94 +1,28 @@
 """Social discovery — find real users with similar taste profiles."""
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends
 from middleware.auth import get_current_user
-from services.actian_service import get_activity_vectors, get_custom_date_vectors, ensure_cache
-from services.preference_engine import compute_preference_vector
-from services.couples_service import find_similar_users, get_trending_for_similar
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+from middleware.readiness import require_warm_caches
+from services.couples_service import similar_couples
+from services.materialized_service import get_materialized, schedule_refresh
+from services.recommendation_service import load_history
+from services.clients import get_supabase
 
-router = APIRouter(prefix="/api/social", tags=["social"])
-
-_sb = None
-
-
-def get_supabase():
-    global _sb
-    if _sb is None:
-        _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return _sb
+router = APIRouter(prefix="/api/social", tags=["social"], dependencies=[Depends(require_warm_caches)])
 
 
 @router.get("/similar")
 async def get_similar_couples(user: dict = Depends(get_current_user)):
     """
-    Compute the user's 9D preference vector from their history,
-    find real users with closest taste profiles,
-    and return what those users love that the current user hasn't tried.
+    Real users with the closest taste profiles, and what they love that the
+    current user hasn't tried. Served from the materialized row when fresh.
     """
     sb = get_supabase()
-    result = (
-        sb.table("date_history")
-        .select("*")
-        .eq("user_id", user["id"])
-        .order("created_at", desc=True)
-        .execute()
-    )
-    dates = result.data or []
-
-    if len(dates) < 2:
-        return {
-            "similar_couples": [],
-            "they_love": [],
-            "needs_more_dates": True,
-            "message": "Add at least 2 dates to unlock social discovery",
-        }
-
-    ensure_cache()
-
-    activity_ids = [d["activity_id"] for d in dates]
-    activity_vectors = get_activity_vectors(activity_ids)
-
-    # Merge custom date vectors
-    custom_date_ids = [d["id"] for d in dates if d["activity_id"] == 0]
-    custom_vectors = get_custom_date_vectors(custom_date_ids)
-
-    # Use ALL dates (rated or not). Unrated dates default to 3.0 (neutral weight).
-    rated_dates = []
-    for d in dates:
-        rating = d.get("rating") or 3.0
-        if d["activity_id"] == 0 and d["id"] in custom_vectors:
-            activity_vectors[d["id"]] = custom_vectors[d["id"]]
-            rated_dates.append({"activity_id": d["id"], "rating": rating})
-        elif d["activity_id"] != 0:
-            rated_dates.append({"activity_id": d["activity_id"], "rating": rating})
-
-    user_vector = compute_preference_vector(rated_dates, activity_vectors)
-
-    similar = find_similar_users(user["id"], user_vector, sb, top_k=5)
-
-    # Suggest activities the user hasn't tried yet
-    done_ids = {d["activity_id"] for d in dates if d["activity_id"] != 0}
-    they_love = get_trending_for_similar(
-        similar,
-        exclude_ids=done_ids,
-        top_k=5,
-    )
-
-    # Strip internal data before returning
-    clean_similar = [
-        {
-            "id": u["id"],
-            "persona": u["persona"],
-            "city": u["city"],
-            "total_dates": u["total_dates"],
-            "match_score": u["match_score"],
-        }
-        for u in similar
-    ]
-
-    return {
-        "similar_couples": clean_similar,
-        "they_love": they_love,
-        "needs_more_dates": False,
-    }
+    row = get_materialized(user["id"], sb)
+    if row is not None:
+        source = "stale" if row.get("stale") else "materialized"
+        return {**row["social"], "computed_at": row["computed_at"], "source": source}
+
+    result = similar_couples(user["id"], load_history(user["id"], sb), sb)
+    schedule_refresh(user["id"])
+    return {**result, "computed_at": datetime.now(timezone.utc).isoformat(), "source": "live"}
@@ -0,0 +1,34 @@
+"""Compile the activity and city catalogs into binary snapshots for fast startup.
+
+Run as a build step after editing data/activities.json or data/city_activities.json:
+
+    python scripts/build_catalog_snapshots.py
+
+Workers map data/*.snap directly. A snapshot whose source JSON has changed since
+it was compiled is ignored at startup, so a forgotten rebuild only costs speed.
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.actian_service import ACTIVITIES_SNAPSHOT, build_activity_snapshot
+from services.catalog_snapshot import Snapshot
+from services.city_service import CITY_ACTIVITIES_PATH, snapshot_path_for, build_city_snapshot
+
+
+def main():
+    for label, build, path in (
+        ("activities", build_activity_snapshot, ACTIVITIES_SNAPSHOT),
+        ("city spots", build_city_snapshot, snapshot_path_for(CITY_ACTIVITIES_PATH)),
+    ):
+        start = time.perf_counter()
+        count = build()
+        # Re-open with checksum verification so a bad write fails the build
+        Snapshot(path)
+        print(f"Compiled {count} {label} -> {os.path.relpath(path)} "
+              f"({os.path.getsize(path)} bytes, {(time.perf_counter() - start) * 1000:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
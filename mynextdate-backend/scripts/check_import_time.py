@@ -0,0 +1,95 @@
+"""Import-time budget check for the API's cold start.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, prints an
+importtime-style report of the slowest modules, and exits non-zero if the best
+run exceeds the budget or if a client SDK that should be lazily imported shows
+up in the startup import graph. tests/test_import_time.py runs the same checks.
+
+    python scripts/check_import_time.py --budget-ms 1000 --output import_time.txt
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# SDKs that must only be imported on first use (see services/clients.py)
+LAZY_MODULES = ("supabase", "groq", "cortex", "grpc", "google.genai")
+
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+
+
+def run_importtime() -> list[tuple[int, int, str]]:
+    """Return (self_us, cumulative_us, module) rows from one cold import of main."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def measure(runs: int = 3) -> tuple[int, list[tuple[int, int, str]]]:
+    """(cumulative us of `import main`, importtime rows) for the fastest of `runs` cold imports."""
+    best = None
+    for _ in range(runs):
+        rows = run_importtime()
+        total = next(cum for _, cum, name in rows if name.strip() == "main")
+        if best is None or total < best[0]:
+            best = (total, rows)
+    return best
+
+
+def eager_modules(rows: list[tuple[int, int, str]]) -> list[str]:
+    """LAZY_MODULES (or their submodules) that were imported while importing main."""
+    return sorted({
+        name.strip() for _, _, name in rows
+        if any(name.strip() == m or name.strip().startswith(m + ".") for m in LAZY_MODULES)
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    try:
+        total_us, rows = measure(args.runs)
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+    lines = [f"import main: {total_us / 1000:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)", ""]
+    lines.append(f"{'self [us]':>10} | {'cumulative':>10} | imported package")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        lines.append(f"{self_us:>10} | {cumulative_us:>10} | {name}")
+
+    eager = eager_modules(rows)
+    if eager:
+        lines.append("")
+        lines.append("Eagerly imported SDK modules (should be lazy): " + ", ".join(eager[:10]))
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    if eager or total_us / 1000 > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Merge near-duplicate activities already in data/activities.json.
+
+Activities are visited in id order. Each one that is a near-duplicate of an
+earlier kept activity (same test as seeding, see services/dedup.py) is removed
+and its name and aliases become aliases of the kept one.
+
+    python scripts/compact_catalog.py                     # dry run: print the merges
+    python scripts/compact_catalog.py --apply             # rewrite JSON + snapshot, update Actian
+    python scripts/compact_catalog.py --apply --remap-history   # also repoint date_history rows
+
+Materialized recommendations pick up the new catalog generation on their next sweep.
+"""
+import argparse
+import json
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import COLLECTION_NAME, VECTOR_DIMENSION, DEDUP_MIN_COSINE, DEDUP_MIN_NAME_SIMILARITY
+from services.actian_service import ACTIVITIES_PATH, ACTIVITIES_SNAPSHOT, activity_record, build_activity_snapshot
+from services.actian_connection import actian_call
+from services.dedup import find_near_duplicate
+from services.shared_index import build_lock, publish_snapshot
+
+
+def plan_merges(activities: list[dict], min_cosine: float, min_name_similarity: float) -> tuple[list[dict], dict[int, int]]:
+    """Return (kept activities with merged aliases, {removed id: kept id})."""
+    kept: list[dict] = []
+    kept_vectors = np.zeros((0, VECTOR_DIMENSION), dtype=np.float32)
+    merged: dict[int, int] = {}
+    for activity in sorted(activities, key=lambda a: a["id"]):
+        row = find_near_duplicate(
+            activity["name"], activity["vector"], [k["name"] for k in kept], kept_vectors,
+            min_cosine=min_cosine, min_name_similarity=min_name_similarity,
+        )
+        if row is None:
+            kept.append(dict(activity))
+            kept_vectors = np.vstack([kept_vectors, np.asarray([activity["vector"]], dtype=np.float32)])
+            continue
+        target = kept[row]
+        aliases = target.setdefault("aliases", [])
+        for name in [activity["name"]] + activity.get("aliases", []):
+            if name.strip().lower() != target["name"].strip().lower() and name not in aliases:
+                aliases.append(name)
+        merged[activity["id"]] = target["id"]
+    return kept, merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="write the compacted catalog (default: dry run)")
+    parser.add_argument("--remap-history", action="store_true", help="with --apply, repoint date_history rows to kept ids")
+    parser.add_argument("--min-cosine", type=float, default=DEDUP_MIN_COSINE)
+    parser.add_argument("--min-name-similarity", type=float, default=DEDUP_MIN_NAME_SIMILARITY)
+    args = parser.parse_args()
+
+    with build_lock("activities"):
+        with open(ACTIVITIES_PATH) as f:
+            activities = json.load(f)
+        by_id = {a["id"]: a for a in activities}
+        kept, merged = plan_merges(activities, args.min_cosine, args.min_name_similarity)
+
+        for removed, target in sorted(merged.items()):
+            print(f"  {removed:>5} {by_id[removed]['name']!r} -> {target} {by_id[target]['name']!r}")
+        print(f"{len(merged)} near-duplicates among {len(activities)} activities.")
+        if not merged or not args.apply:
+            return
+
+        with open(ACTIVITIES_PATH, "w") as f:
+            json.dump(kept, f, indent=2)
+        build_activity_snapshot()
+        generation = publish_snapshot("activities", ACTIVITIES_SNAPSHOT)
+        print(f"Wrote {len(kept)} activities and published catalog generation {generation}.")
+
+    try:
+        with actian_call("batch_delete") as client:
+            client.batch_delete(COLLECTION_NAME, sorted(merged))
+            for target in sorted(set(merged.values())):
+                client.set_payload(COLLECTION_NAME, target, activity_record(next(k for k in kept if k["id"] == target))[2])
+        print(f"Removed {len(merged)} activities from Actian.")
+    except Exception as e:
+        print(f"Warning: Actian update failed, rerun once it is reachable: {e}")
+
+    if args.remap_history:
+        from services.clients import get_supabase
+        sb = get_supabase()
+        names = {k["id"]: k["name"] for k in kept}
+        for removed, target in sorted(merged.items()):
+            result = sb.table("date_history").update(
+                {"activity_id": target, "activity_name": names[target]}
+            ).eq("activity_id", removed).execute()
+            print(f"  date_history: {len(result.data or [])} rows {removed} -> {target}")
+
+
+if __name__ == "__main__":
+    main()
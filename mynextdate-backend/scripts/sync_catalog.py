@@ -0,0 +1,50 @@
+"""Sync data/activities.json and data/city_activities.json into Actian by content hash.
+
+Only new or changed records are upserted and ids no longer in the JSON are
+deleted (see services/catalog_sync.py). The API runs the same sync after
+startup unless ACTIAN_SYNC_ON_STARTUP is off.
+
+    python scripts/sync_catalog.py                 # both collections
+    python scripts/sync_catalog.py --dry-run       # print what would change
+    python scripts/sync_catalog.py --only city     # just city_date_spots
+    python scripts/sync_catalog.py --force         # recheck everything and apply large deletes
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import ACTIAN_BULK_CHUNK_SIZE, ACTIAN_BULK_STREAMS
+from services.actian_connection import actian_call, connection
+from services.actian_service import init_collection, sync_activities
+from services.city_service import init_city_collection, sync_city_activities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=("activities", "city"), help="sync one collection (default: both)")
+    parser.add_argument("--dry-run", action="store_true", help="compare hashes but write nothing")
+    parser.add_argument("--force", action="store_true", help="ignore the up-to-date marker and the delete limit")
+    parser.add_argument("--chunk-size", type=int, default=ACTIAN_BULK_CHUNK_SIZE)
+    parser.add_argument("--streams", type=int, default=ACTIAN_BULK_STREAMS)
+    args = parser.parse_args()
+    options = {"chunk_size": args.chunk_size, "streams": args.streams, "dry_run": args.dry_run, "force": args.force}
+
+    try:
+        if args.only in (None, "activities"):
+            with actian_call("get_or_create_collection") as client:
+                init_collection(client)
+            result = sync_activities(**options)
+            if result.up_to_date:
+                print("date_activities is up to date with activities.json.")
+        if args.only in (None, "city"):
+            init_city_collection()
+            result = sync_city_activities(**options)
+            if result.up_to_date:
+                print("city_date_spots is up to date with city_activities.json.")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
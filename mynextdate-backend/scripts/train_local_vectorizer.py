@@ -0,0 +1,90 @@
+"""Train and evaluate the local text→vector regressor (services/local_vectorizer.py).
+
+    python scripts/train_local_vectorizer.py             # evaluate on held-out LLM outputs, then train on everything
+    python scripts/train_local_vectorizer.py --eval-only # evaluate the saved model against the LLM cache
+
+Training data is each catalog activity's name and "name. description" from
+data/activities.json and data/city_activities.json, plus every (text, vector)
+pair in the LLM cache. Evaluation holds out --holdout of the LLM pairs (the
+catalog is always trained on), then reports mean absolute error per dimension
+and, for each confidence threshold, how many texts would be answered locally
+and with what error. Pick LOCAL_VECTORIZER_MIN_CONFIDENCE from that table.
+"""
+import argparse
+import json
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import VECTOR_LABELS, LOCAL_VECTORIZER_PATH, LOCAL_VECTORIZER_FEATURES, LOCAL_VECTORIZER_MIN_CONFIDENCE
+from services import llm_cache
+from services.actian_service import ACTIVITIES_PATH
+from services.city_service import CITY_ACTIVITIES_PATH
+from services.local_vectorizer import LocalVectorizer
+
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def catalog_pairs() -> list[tuple[str, list[float]]]:
+    pairs = []
+    for path in (ACTIVITIES_PATH, CITY_ACTIVITIES_PATH):
+        with open(path) as f:
+            for activity in json.load(f):
+                pairs.append((activity["name"], activity["vector"]))
+                pairs.append((f"{activity['name']}. {activity['description']}", activity["vector"]))
+    return pairs
+
+
+def report(model: LocalVectorizer, pairs: list[tuple[str, list[float]]]):
+    if not pairs:
+        print("No LLM outputs to evaluate against; the LLM cache is empty.")
+        return
+    predicted, confidence = model.predict([text for text, _ in pairs])
+    error = np.abs(predicted - np.asarray([vector for _, vector in pairs], dtype=np.float32))
+    print(f"Evaluated on {len(pairs)} LLM outputs. Mean absolute error per dimension:")
+    for label, mae in zip(VECTOR_LABELS, error.mean(axis=0)):
+        print(f"  {label:<20} {mae:.3f}")
+    print(f"  {'overall':<20} {error.mean():.3f}")
+    print("\n  min confidence   answered locally   MAE    max abs error")
+    for threshold in sorted(set(THRESHOLDS) | {LOCAL_VECTORIZER_MIN_CONFIDENCE}):
+        mask = confidence >= threshold
+        marker = "  <- LOCAL_VECTORIZER_MIN_CONFIDENCE" if threshold == LOCAL_VECTORIZER_MIN_CONFIDENCE else ""
+        if mask.any():
+            print(f"  {threshold:>14.2f}   {mask.mean():>15.1%}   {error[mask].mean():.3f}  {error[mask].max():.3f}{marker}")
+        else:
+            print(f"  {threshold:>14.2f}   {0:>15.1%}     -      -{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval-only", action="store_true", help="evaluate the saved model without retraining")
+    parser.add_argument("--alpha", type=float, default=1.0, help="ridge regularization strength")
+    parser.add_argument("--features", type=int, default=LOCAL_VECTORIZER_FEATURES, help="hash buckets")
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of LLM outputs held out for evaluation")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cached = llm_cache.load_all()
+    if args.eval_only:
+        report(LocalVectorizer.load(), cached)
+        return
+
+    catalog = catalog_pairs()
+    order = np.random.default_rng(args.seed).permutation(len(cached))
+    n_holdout = int(len(cached) * args.holdout)
+    held_out = [cached[i] for i in order[:n_holdout]]
+    train = catalog + [cached[i] for i in order[n_holdout:]]
+    model = LocalVectorizer.fit([t for t, _ in train], [v for _, v in train], args.alpha, args.features)
+    report(model, held_out)
+
+    # The shipped model also learns from the held-out pairs
+    everything = catalog + cached
+    model = LocalVectorizer.fit([t for t, _ in everything], [v for _, v in everything], args.alpha, args.features)
+    model.save()
+    print(f"\nTrained on {len(everything)} texts ({len(catalog)} catalog, {len(cached)} LLM) -> "
+          f"{os.path.relpath(LOCAL_VECTORIZER_PATH)} ({os.path.getsize(LOCAL_VECTORIZER_PATH)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
-"""Seed the Actian Vector AI DB with date activities."""
+"""Seed the Actian Vector AI DB with date activities.
+
+    python seed.py                          # activities.json into date_activities
+    python seed.py --city                   # also city_activities.json into city_date_spots
+    python seed.py --chunk-size 1000 --streams 4
+    python seed.py --restart                # ignore checkpoints from an interrupted run
+"""
+import argparse
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(__file__))
 
-from services.actian_service import get_client, init_collection, seed_activities
-from config import ACTIAN_HOST
+from services.actian_connection import connection
+from services.actian_service import COLLECTION_NAME, activity_record, get_client, init_collection
+from services.bulk_loader import bulk_load
+from config import ACTIAN_HOST, ACTIAN_BULK_CHUNK_SIZE, ACTIAN_BULK_STREAMS
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", action="store_true", help="also seed the city spots collection")
+    parser.add_argument("--chunk-size", type=int, default=ACTIAN_BULK_CHUNK_SIZE, help="vectors per batch_upsert")
+    parser.add_argument("--streams", type=int, default=ACTIAN_BULK_STREAMS, help="parallel upload streams")
+    parser.add_argument("--restart", action="store_true", help="upload everything, ignoring checkpoints")
+    args = parser.parse_args()
+
     print(f"Connecting to Actian at {ACTIAN_HOST}...")
     client = get_client()
 
@@ -20,16 +38,25 @@ def main():
         init_collection(client)
 
         print("Seeding activities...")
-        activities_path = os.path.join(
-            os.path.dirname(__file__), "data", "activities.json"
+        bulk_load(
+            COLLECTION_NAME, os.path.join(DATA_DIR, "activities.json"), activity_record,
+            chunk_size=args.chunk_size, streams=args.streams, resume=not args.restart,
         )
-        seed_activities(client, activities_path)
+
+        if args.city:
+            from services.city_service import CITY_COLLECTION, city_record, init_city_collection
+            print("Seeding city spots...")
+            init_city_collection()
+            bulk_load(
+                CITY_COLLECTION, os.path.join(DATA_DIR, "city_activities.json"), city_record,
+                chunk_size=args.chunk_size, streams=args.streams, resume=not args.restart,
+            )
 
         print("Done! Verifying...")
         stats = client.describe_collection("date_activities")
         print(f"Collection stats: {stats}")
     finally:
-        client.close()
+        connection.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+"""Managed Actian (Cortex) connection: one client per worker, rebuilt when it breaks.
+
+Calls go through `actian_call(operation)`, which yields the current client
+behind the "actian" circuit breaker. A gRPC error that means the connection
+itself is gone (UNAVAILABLE, DEADLINE_EXCEEDED, ...) drops the client, and the
+next call reconnects, no sooner than an exponential backoff
+(ACTIAN_RECONNECT_BASE_SECONDS doubling up to ACTIAN_RECONNECT_MAX_SECONDS,
+with jitter). Calls during the backoff fail fast with ActianUnavailableError.
+
+`run_actian_health_checks` pings the server every ACTIAN_HEALTH_CHECK_SECONDS,
+so an Actian restart is noticed, and a lost connection re-established,
+without waiting for traffic.
+
+Every RPC carries a deadline of ACTIAN_CALL_TIMEOUT_SECONDS. The pool size and
+keepalive are per-client settings (ACTIAN_POOL_SIZE, ACTIAN_KEEPALIVE_*); the
+keepalive one needs the pinned SDK version (see KEEPALIVE_SDK_VERSION).
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+from config import (
+    ACTIAN_HOST, ACTIAN_POOL_SIZE, ACTIAN_KEEPALIVE_MS, ACTIAN_KEEPALIVE_TIMEOUT_MS, ACTIAN_CALL_TIMEOUT_SECONDS,
+    ACTIAN_HEALTH_CHECK_SECONDS, ACTIAN_RECONNECT_BASE_SECONDS, ACTIAN_RECONNECT_MAX_SECONDS,
+)
+from services.circuit_breaker import guarded
+from services.metrics import Counter, Gauge
+
+# The cortex SDK pulls in grpc; import it on first connect, not at module load
+if TYPE_CHECKING:
+    from cortex import CortexClient
+
+STATES = ("disconnected", "connecting", "connected", "backoff")
+# gRPC status names that mean the channel, not the request, is broken
+_CONNECTION_CODES = frozenset({"UNAVAILABLE", "DEADLINE_EXCEEDED", "UNKNOWN", "INTERNAL"})
+
+ACTIAN_CONNECTS = Counter(
+    "mynextdate_actian_connects_total", "Actian connection attempts by result (ok, error).", ("result",)
+)
+ACTIAN_DISCONNECTS = Counter(
+    "mynextdate_actian_disconnects_total", "Actian clients dropped after a connection-level gRPC error, by status.", ("code",)
+)
+ACTIAN_HEALTH_CHECKS = Counter(
+    "mynextdate_actian_health_checks_total", "Periodic Actian health checks by result (ok, error).", ("result",)
+)
+
+
+class ActianUnavailableError(ConnectionError):
+    """No Actian connection right now (connecting failed and the reconnect backoff hasn't expired)."""
+
+
+# CortexClient takes no keepalive settings, so _apply_keepalive rebuilds its pool
+# through private SDK attributes. Only done on the SDK version pinned in
+# requirements.txt; any other version keeps the SDK's default keepalive.
+KEEPALIVE_SDK_VERSION = "0.1.0b1"
+
+
+def _apply_keepalive(client: "CortexClient") -> bool:
+    """Rebuild the client's still-idle channels with ACTIAN_KEEPALIVE_*. Returns False if the SDK isn't the pinned one."""
+    import cortex
+    from cortex.transport.pool import PoolConfig
+
+    async_client = getattr(client, "_async_client", None)
+    if cortex.__version__ != KEEPALIVE_SDK_VERSION or not hasattr(client, "_run") or not all(
+        hasattr(async_client, attr) for attr in ("_pool", "_pool_config", "connect")
+    ):
+        print(
+            f"Warning: cortex SDK {cortex.__version__} doesn't match the pinned {KEEPALIVE_SDK_VERSION} internals; "
+            "ACTIAN_KEEPALIVE_* not applied, using the SDK's default keepalive."
+        )
+        return False
+    config = PoolConfig(
+        pool_size=ACTIAN_POOL_SIZE, keepalive_time_ms=ACTIAN_KEEPALIVE_MS, keepalive_timeout_ms=ACTIAN_KEEPALIVE_TIMEOUT_MS
+    )
+
+    async def rebuild_pool():
+        await async_client._pool.close()
+        async_client._pool, async_client._pool_config = None, config
+        await async_client.connect()
+
+    # gRPC channels connect lazily; this sends nothing
+    client._run(rebuild_pool())
+    return True
+
+
+def _open_client() -> "CortexClient":
+    from cortex import CortexClient
+
+    client = CortexClient(ACTIAN_HOST, pool_size=ACTIAN_POOL_SIZE, timeout=ACTIAN_CALL_TIMEOUT_SECONDS)
+    client.connect()
+    try:
+        _apply_keepalive(client)
+        # Connecting only opened channels; one round trip tells us the server is actually there
+        client.health_check()
+    except Exception:
+        client.close()
+        raise
+    return client
+
+
+def _describe(error: BaseException) -> str:
+    code, details = getattr(error, "code", None), getattr(error, "details", None)
+    if callable(code) and callable(details):
+        try:
+            return f"{code().name}: {details()}"
+        except Exception:
+            pass
+    return str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+
+
+def _connection_code(error: BaseException) -> str | None:
+    """The gRPC status name if `error` means the connection is broken, else None."""
+    if isinstance(error, ActianUnavailableError):
+        return None
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            name = code().name
+        except Exception:
+            return None
+        return name if name in _CONNECTION_CODES else None
+    # The SDK raises RuntimeError("Client is not connected") once its loop is gone
+    if isinstance(error, (ConnectionError, RuntimeError)) and "connect" in str(error).lower():
+        return "DISCONNECTED"
+    return None
+
+
+class ActianConnection:
+    def __init__(self):
+        self._client: "CortexClient | None" = None
+        self._lock = threading.Lock()
+        self.state = "disconnected"
+        self.last_error: str | None = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def client(self) -> "CortexClient":
+        """The connected client, connecting (and health-checking) first if needed. Raises ActianUnavailableError while backing off."""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                raise ActianUnavailableError(f"Actian reconnect backing off for {wait:.1f}s after: {self.last_error}")
+            self.state = "connecting"
+            try:
+                self._client = _open_client()
+            except Exception as e:
+                self._backoff(e)
+                ACTIAN_CONNECTS.inc("error")
+                raise
+            self._failures = 0
+            self.state = "connected"
+            ACTIAN_CONNECTS.inc("ok")
+            if self.last_error:
+                print(f"Reconnected to Actian at {ACTIAN_HOST}.")
+            return self._client
+
+    def _backoff(self, error: BaseException):
+        self._failures += 1
+        delay = min(ACTIAN_RECONNECT_MAX_SECONDS, ACTIAN_RECONNECT_BASE_SECONDS * 2 ** (self._failures - 1))
+        self._retry_at = time.monotonic() + delay * random.uniform(0.5, 1.0)
+        self.last_error = _describe(error)
+        self.state = "backoff"
+
+    def mark_broken(self, error: BaseException, code: str):
+        """Drop the current client after a connection-level error; the next call reconnects after the backoff."""
+        with self._lock:
+            client, self._client = self._client, None
+            if client is None:
+                return  # another thread already dropped it
+            self._backoff(error)
+        ACTIAN_DISCONNECTS.inc(code)
+        print(f"Actian connection lost ({code}), reconnecting with backoff: {self.last_error}")
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            self.state = "disconnected"
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+connection = ActianConnection()
+
+
+def _state_values() -> dict[tuple, float]:
+    return {(state,): float(state == connection.state) for state in STATES}
+
+
+ACTIAN_CONNECTION_STATE = Gauge(
+    "mynextdate_actian_connection_state", "1 for this worker's current Actian connection state.", ("state",), fn=_state_values
+)
+
+
+@contextmanager
+def actian_call(operation: str) -> Iterator["CortexClient"]:
+    """The Actian client for one operation, timed and behind the circuit breaker. Drops the client if the call shows it is broken."""
+    with guarded("actian", operation):
+        client = connection.client()
+        try:
+            yield client
+        except Exception as e:
+            code = _connection_code(e)
+            if code is not None:
+                connection.mark_broken(e, code)
+            raise
+
+
+def health_check() -> bool:
+    try:
+        with actian_call("health_check") as client:
+            client.health_check()
+    except Exception:
+        ACTIAN_HEALTH_CHECKS.inc("error")
+        return False
+    ACTIAN_HEALTH_CHECKS.inc("ok")
+    return True
+
+
+async def run_actian_health_checks():
+    """Health-check (and so reconnect) the Actian connection every ACTIAN_HEALTH_CHECK_SECONDS until cancelled."""
+    while True:
+        await asyncio.sleep(ACTIAN_HEALTH_CHECK_SECONDS)
+        await asyncio.to_thread(health_check)
@@ -1,59 +1,128 @@
 import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
 import numpy as np
-from cortex import CortexClient, DistanceMetric
-from cortex.transport.pool import PoolConfig
-from config import ACTIAN_HOST, COLLECTION_NAME, VECTOR_DIMENSION
-
-# Reduce keepalive ping frequency to avoid ENHANCE_YOUR_CALM from server
-PoolConfig.keepalive_time_ms = 300000  # 5 minutes
-
-# Persistent client — reused across all requests
-_client: CortexClient | None = None
-
-# In-memory cache: activity_id -> vector (loaded once at startup)
-_vector_cache: dict[int, list[float]] = {}
-_payload_cache: dict[int, dict] = {}
+from config import (
+    COLLECTION_NAME, VECTOR_DIMENSION, HYBRID_LEXICAL_WEIGHT, CUSTOM_ACTIVITIES_RELOAD_SECONDS,
+)
+from services.bm25 import BM25Index
+from services.dedup import find_near_duplicate
+from services.invalidation import publish_event, subscribe
+from services.metrics import Counter, record_cache
+from services.circuit_breaker import guarded
+from services.actian_connection import actian_call, connection
+from services.catalog_snapshot import compile_json, load_fresh, source_digest
+from services.catalog_sync import HASH_FIELD, sync_collection, with_content_hash
+from services.shared_index import IndexHandle, VectorView, PayloadView, build_lock, matches_source, publish, publish_snapshot
+
+# The cortex SDK pulls in grpc; import it on first connect, not at module load
+if TYPE_CHECKING:
+    from cortex import CortexClient
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+ACTIVITIES_PATH = os.path.join(DATA_DIR, "activities.json")
+# Compiled by scripts/build_catalog_snapshots.py; loads without parsing JSON or calling Actian
+ACTIVITIES_SNAPSHOT = os.path.join(DATA_DIR, "activities.snap")
+
+# Activity catalog, memory-mapped from the shared index so all workers share one copy.
+# The views keep the old dict-style access: activity_id -> vector / payload.
+_activities = IndexHandle("activities")
+_vector_cache = VectorView(_activities)
+_payload_cache = PayloadView(_activities)
+
+# Startup warms the cache in a worker thread; the lock stops a request from loading it twice
+_warm_lock = threading.Lock()
+
+# Set once this worker has checked the published generation against activities.json
+_source_checked: dict = {"done": False}
+
+# BM25 over catalog name + description, rebuilt per worker when the generation changes
+_catalog_lexical: dict = {"generation": None}
+
+# Community custom activities, loaded from Supabase once per worker and then
+# kept current by custom_activity_added events (see _CustomIndex)
+_custom: dict = {"index": None, "reload_at": 0.0}
+_custom_lock = threading.Lock()
+CUSTOM_ACTIVITIES_PAGE_SIZE = 1000
+# After a failed load, serve what we have (or nothing) this long before trying again
+CUSTOM_ACTIVITIES_RETRY_SECONDS = 5.0
+
+ACTIVITY_DEDUP = Counter(
+    "mynextdate_activity_dedup_total", "New catalog activities by outcome (inserted, exact name match, near-duplicate alias).", ("result",)
+)
 
 # Custom date vectors: date_history record UUID -> vector (user-specific, not in global pool)
 _custom_date_vectors: dict[str, list[float]] = {}
 
 
-def get_client() -> CortexClient:
-    """Get or create a persistent Actian connection. Reconnects if dead."""
-    global _client
-    if _client is None:
-        _client = CortexClient(ACTIAN_HOST)
-        _client.connect()
-    return _client
+def get_client() -> "CortexClient":
+    """The managed Actian client (see services/actian_connection.py). Prefer `actian_call` for calls."""
+    return connection.client()
 
 
-def _reconnect():
-    """Force a fresh connection (called after gRPC errors)."""
-    global _client
-    try:
-        if _client:
-            _client.close()
-    except Exception:
-        pass
-    _client = None
-    return get_client()
+def activity_payload(activity: dict) -> dict:
+    payload = {"name": activity["name"], "description": activity.get("description", "")}
+    if activity.get("aliases"):
+        payload["aliases"] = activity["aliases"]
+    return payload
+
+
+def build_activity_snapshot() -> int:
+    """Compile data/activities.json into the binary snapshot. Returns the activity count."""
+    return compile_json(ACTIVITIES_PATH, ACTIVITIES_SNAPSHOT, activity_payload)
 
 
 def _warm_cache():
-    """Load all 200 activity vectors into memory. Called once."""
-    global _vector_cache, _payload_cache
-    if _vector_cache:
+    """Map the shared activity index, publishing it from the snapshot (or Actian, else the JSON) if no worker has yet.
+
+    A generation left over from an earlier run is only reused if it was
+    published for the current activities.json; otherwise it is republished.
+    """
+    if _source_checked["done"] and _activities.current() is not None:
         return
-    client = get_client()
-    records, _ = client.scroll(COLLECTION_NAME, limit=250, with_vectors=True)
-    for record in records:
-        rid = record.id
-        vec = record.vector
-        payload = record.payload or {}
-        if vec is not None:
-            _vector_cache[rid] = [float(v) for v in vec]
-        _payload_cache[rid] = dict(payload)
-    print(f"Cached {len(_vector_cache)} activity vectors in memory.")
+    with _warm_lock, build_lock("activities"):
+        # Another worker may have published while we waited for the lock
+        index = _activities.refresh()
+        if index is not None and (_source_checked["done"] or matches_source(index, ACTIVITIES_PATH)):
+            _source_checked["done"] = True
+            return
+        if index is not None:
+            print(f"Published activity index (generation {index.generation}) predates {os.path.basename(ACTIVITIES_PATH)}, republishing.")
+        _source_checked["done"] = True
+        snapshot = load_fresh(ACTIVITIES_SNAPSHOT, ACTIVITIES_PATH)
+        if snapshot is not None:
+            generation = publish_snapshot("activities", ACTIVITIES_SNAPSHOT)
+            _activities.refresh()
+            print(f"Published {len(snapshot)} activity vectors from the compiled snapshot (generation {generation}).")
+            return
+        try:
+            with actian_call("scroll") as client:
+                records, _ = client.scroll(COLLECTION_NAME, limit=250, with_vectors=True)
+        except Exception as e:
+            # Actian down or its circuit open: serve the catalog from activities.json
+            print(f"Actian scroll failed ({e}), publishing the catalog from {os.path.basename(ACTIVITIES_PATH)}.")
+            count = build_activity_snapshot()
+            generation = publish_snapshot("activities", ACTIVITIES_SNAPSHOT)
+            _activities.refresh()
+            print(f"Published {count} activity vectors from JSON (generation {generation}).")
+            return
+        ids, vectors, payloads = [], [], []
+        # Id order, so the published content (and its hash) doesn't depend on scroll order
+        for record in sorted(records, key=lambda r: r.id):
+            if record.vector is None:
+                continue
+            ids.append(record.id)
+            vectors.append(record.vector)
+            payload = dict(record.payload or {})
+            payload.pop(HASH_FIELD, None)
+            payloads.append(payload)
+        # Stands in for the current JSON until the next sync or restart after an edit
+        digest = source_digest(ACTIVITIES_PATH) if os.path.exists(ACTIVITIES_PATH) else b""
+        generation = publish("activities", ids, vectors, payloads, digest)
+        _activities.refresh()
+        print(f"Published {len(ids)} activity vectors to the shared index (generation {generation}).")
 
 
 def ensure_cache():
@@ -61,8 +130,9 @@ def ensure_cache():
     _warm_cache()
 
 
-def init_collection(client: CortexClient):
+def init_collection(client: "CortexClient"):
     """Create the activities collection if it doesn't exist."""
+    from cortex import DistanceMetric
     client.get_or_create_collection(
         name=COLLECTION_NAME,
         dimension=VECTOR_DIMENSION,
@@ -73,73 +143,102 @@ def init_collection(client: CortexClient):
     )
 
 
-def seed_activities(client: CortexClient, activities_path: str):
-    """Load activities from JSON and insert into Actian."""
-    with open(activities_path) as f:
-        activities = json.load(f)
+def activity_record(activity: dict) -> tuple[int, list[float], dict]:
+    """(id, vector, payload) as stored in Actian, payload including its content hash."""
+    return with_content_hash((activity["id"], activity["vector"], activity_payload(activity)))
 
-    ids = [a["id"] for a in activities]
-    vectors = [a["vector"] for a in activities]
-    payloads = [
-        {"name": a["name"], "description": a.get("description", "")}
-        for a in activities
-    ]
 
-    client.batch_upsert(COLLECTION_NAME, ids, vectors, payloads)
-    print(f"Seeded {len(activities)} activities into Actian.")
+def seed_activities(activities_path: str, resume: bool = True):
+    """Stream activities from JSON into Actian in parallel chunks (see services/bulk_loader.py)."""
+    from services.bulk_loader import bulk_load
+    return bulk_load(COLLECTION_NAME, activities_path, activity_record, resume=resume)
+
+
+def sync_activities(activities_path: str = ACTIVITIES_PATH, **kwargs):
+    """Upsert changed and delete removed activities in Actian (see services/catalog_sync.py)."""
+    return sync_collection(COLLECTION_NAME, activities_path, activity_record, **kwargs)
+
 
+def _catalog_bm25(index) -> BM25Index:
+    """BM25 index aligned with the catalog generation's rows."""
+    if _catalog_lexical["generation"] != index.generation:
+        documents = []
+        names = {}
+        for row in range(len(index.ids)):
+            payload = index.payload(row)
+            documents.append(payload.get("name", "") + " " + payload.get("description", ""))
+            for name in [payload.get("name", "")] + payload.get("aliases", []):
+                names.setdefault(name.strip().lower(), row)
+        _catalog_lexical.update(generation=index.generation, bm25=BM25Index(documents), names=names)
+    return _catalog_lexical["bm25"]
 
-def _keyword_boost(text_query: str, name: str, description: str) -> float:
-    """Compute a keyword overlap boost between user query and activity name/description."""
-    if not text_query:
-        return 0.0
-    # Extract meaningful words (3+ chars) from query
-    query_words = {w.lower() for w in text_query.split() if len(w) >= 3}
-    if not query_words:
-        return 0.0
-    target = (name + " " + description).lower()
-    hits = sum(1 for w in query_words if w in target)
-    # Boost: 0.05 per keyword match, max 0.15
-    return min(hits * 0.05, 0.15)
+
+def _activity_result(index, row: int, score: float) -> dict:
+    payload = index.payload(row)
+    return {
+        "id": int(index.ids[row]),
+        "name": payload.get("name", ""),
+        "description": payload.get("description", ""),
+        "score": round(min(score, 1.0), 4),
+    }
 
 
 def search_similar(query_vector: list[float], top_k: int = 2, exclude_ids: list[int] | None = None, text_query: str | None = None) -> list[dict]:
-    """Search using in-memory cache with cosine similarity + optional keyword boost."""
+    """Hybrid search over the shared activity matrix: cosine similarity plus a weighted BM25 score for `text_query`."""
     _warm_cache()
-    exclude_set = set(exclude_ids) if exclude_ids else set()
-    query = np.array(query_vector)
+    index = _activities.current()
+    if index is None or not len(index):
+        return []
+
+    query = np.asarray(query_vector, dtype=np.float64)
     query_norm = np.linalg.norm(query)
     if query_norm == 0:
         query_norm = 1.0
 
-    scored = []
-    for aid, vec in _vector_cache.items():
-        if aid in exclude_set:
-            continue
-        v = np.array(vec)
-        v_norm = np.linalg.norm(v)
-        if v_norm == 0:
-            continue
-        similarity = float(np.dot(query, v) / (query_norm * v_norm))
-        # Boost score if user's text has keyword overlap with activity name/description
-        if text_query:
-            payload = _payload_cache.get(aid, {})
-            boost = _keyword_boost(text_query, payload.get("name", ""), payload.get("description", ""))
-            similarity += boost
-        scored.append((aid, similarity))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
-
-    output = []
-    for aid, score in scored[:top_k]:
-        payload = _payload_cache.get(aid, {})
-        output.append({
-            "id": aid,
-            "name": payload.get("name", ""),
-            "description": payload.get("description", ""),
-            "score": round(min(score, 1.0), 4),
-        })
-    return output
+    candidates = index.norms > 0
+    for aid in exclude_ids or ():
+        row = index.row_of.get(aid)
+        if row is not None:
+            candidates[row] = False
+    rows = np.flatnonzero(candidates)
+
+    scores = (index.vectors[rows] @ query) / (index.norms[rows] * query_norm)
+    # Blend in lexical relevance of the user's text to activity name/description
+    if text_query:
+        scores += HYBRID_LEXICAL_WEIGHT * _catalog_bm25(index).normalized(text_query)[rows]
+
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [_activity_result(index, int(rows[i]), float(scores[i])) for i in order]
+
+
+def search_lexical(text_query: str, top_k: int = 3, exclude_ids: list[int] | None = None) -> list[dict]:
+    """BM25-only search, for when no query vector is available (LLM slow or down).
+
+    Scores are normalised BM25 (best match = 1.0); activities with no matching term are omitted.
+    """
+    _warm_cache()
+    index = _activities.current()
+    if index is None or not len(index):
+        return []
+    lexical = _catalog_bm25(index).normalized(text_query)
+    for aid in exclude_ids or ():
+        row = index.row_of.get(aid)
+        if row is not None:
+            lexical[row] = 0.0
+    rows = np.flatnonzero(lexical > 0)
+    order = np.argsort(-lexical[rows], kind="stable")[:top_k]
+    return [_activity_result(index, int(rows[i]), float(lexical[rows[i]])) for i in order]
+
+
+def find_activity_by_name(name: str) -> dict | None:
+    """Catalog activity whose name or an alias equals `name` (case-insensitive), scored 1.0, or None."""
+    _warm_cache()
+    index = _activities.current()
+    if index is None or not len(index):
+        return None
+    _catalog_bm25(index)
+    row = _catalog_lexical["names"].get(name.strip().lower())
+    return _activity_result(index, row, 1.0) if row is not None else None
 
 
 def search_worst(preference_vector: list[float], top_k: int = 2) -> list[dict]:
@@ -151,124 +250,268 @@ def search_worst(preference_vector: list[float], top_k: int = 2) -> list[dict]:
 def get_activity_vectors(activity_ids: list[int]) -> dict[int, list[float]]:
     """Get activity vectors from in-memory cache (instant)."""
     _warm_cache()
-    return {aid: _vector_cache[aid] for aid in activity_ids if aid in _vector_cache}
+    found = {aid: _vector_cache[aid] for aid in activity_ids if aid in _vector_cache}
+    record_cache("activity_vectors", hits=len(found), misses=len(set(activity_ids)) - len(found))
+    return found
+
+
+def current_catalog_version() -> str | None:
+    """Content hash of the activity catalog this worker maps. Unlike the generation, it's comparable across hosts."""
+    _warm_cache()
+    index = _activities.current()
+    return index.content_hash if index is not None else None
+
+
+def get_activity_payload(activity_id: int) -> dict | None:
+    """Get one activity's payload (name, description) from the shared index."""
+    _warm_cache()
+    index = _activities.current()
+    row = index.row_of.get(activity_id) if index is not None else None
+    return index.payload(row) if row is not None else None
 
 
 def get_all_activities() -> list[dict]:
     """Get all activities from cache."""
     _warm_cache()
-    return [
-        {"id": rid, "name": _payload_cache[rid].get("name", ""), "description": _payload_cache[rid].get("description", "")}
-        for rid in _payload_cache
-    ]
+    index = _activities.current()
+    if index is None:
+        return []
+    activities = []
+    for row, rid in enumerate(index.ids):
+        payload = index.payload(row)
+        activities.append({"id": int(rid), "name": payload.get("name", ""), "description": payload.get("description", "")})
+    return activities
 
 
 def seed_single_activity(name: str, description: str, vector: list[float]) -> int:
     """Append a new activity to activities.json, update caches, and upsert to Actian."""
-    import os
+    return seed_new_activities([{"name": name, "description": description, "vector": vector}])[0]
+
+
+def seed_new_activities(entries: list[dict]) -> list[int]:
+    """Add several activities ({"name", "description", "vector"}) with one JSON rewrite, snapshot and Actian upsert.
+
+    An entry whose name (or alias) is already in the catalog, or that is a near-duplicate
+    of a catalog activity or of an earlier entry in the batch (see services.dedup), is not
+    inserted: its name is recorded as an alias of the existing activity and that id is
+    returned. Returns one id per entry.
+    """
     _warm_cache()
+    ids: list[int] = []
+    added: list[dict] = []
+    aliased = False
+
+    # The build lock serialises writers across workers, for the JSON file and the index
+    with _warm_lock, build_lock("activities"):
+        with open(ACTIVITIES_PATH) as f:
+            activities = json.load(f)
+        by_id = {a["id"]: a for a in activities}
+        by_name = {}
+        for a in activities:
+            for name in [a["name"]] + a.get("aliases", []):
+                by_name.setdefault(name.strip().lower(), a["id"])
+
+        index = _activities.refresh()
+        catalog_names = [by_id[int(i)]["name"] if int(i) in by_id else "" for i in index.ids] if index is not None else []
+        next_id = max(a["id"] for a in activities) + 1 if activities else 200
+        for entry in entries:
+            key = entry["name"].strip().lower()
+            if key in by_name:
+                ACTIVITY_DEDUP.inc("exact")
+                ids.append(by_name[key])
+                continue
+            existing_id = None
+            row = find_near_duplicate(entry["name"], entry["vector"], catalog_names, index.vectors, index.norms) if index is not None else None
+            if row is not None:
+                existing_id = int(index.ids[row])
+            elif added:
+                row = find_near_duplicate(entry["name"], entry["vector"], [a["name"] for a in added], np.asarray([a["vector"] for a in added], dtype=np.float32))
+                existing_id = added[row]["id"] if row is not None else None
+            if existing_id is not None and existing_id in by_id:
+                by_id[existing_id].setdefault("aliases", []).append(entry["name"])
+                by_name[key] = existing_id
+                aliased = True
+                ACTIVITY_DEDUP.inc("alias")
+                print(f"Aliased near-duplicate activity {entry['name']!r} to id={existing_id} ({by_id[existing_id]['name']!r})")
+                ids.append(existing_id)
+                continue
+            new_entry = {"id": next_id, "name": entry["name"], "description": entry["description"], "vector": entry["vector"]}
+            activities.append(new_entry)
+            added.append(new_entry)
+            by_id[next_id] = new_entry
+            by_name[key] = next_id
+            ids.append(next_id)
+            next_id += 1
+            ACTIVITY_DEDUP.inc("inserted")
+        if not added and not aliased:
+            return ids
+
+        with open(ACTIVITIES_PATH, "w") as f:
+            json.dump(activities, f, indent=2)
+
+        # Recompile the snapshot so it stays fresh for the new JSON, then publish
+        # it as a new index generation; every worker maps it on its next refresh
+        build_activity_snapshot()
+        publish_snapshot("activities", ACTIVITIES_SNAPSHOT)
+        _activities.refresh()
+
+    if added:
+        # Upsert to Actian
+        try:
+            records = [activity_record(a) for a in added]
+            with actian_call("batch_upsert") as client:
+                client.batch_upsert(
+                    COLLECTION_NAME,
+                    [r[0] for r in records],
+                    [r[1] for r in records],
+                    [r[2] for r in records]
+                )
+        except Exception as e:
+            print(f"Warning: Actian upsert for new activities failed: {e}")
+        print(f"Seeded {len(added)} new activities: {', '.join(a['name'] for a in added)}")
+    return ids
 
-    activities_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-        "data", "activities.json"
-    )
 
-    with open(activities_path) as f:
-        activities = json.load(f)
+def store_custom_date_vector(date_record_id: str, vector: list[float]):
+    """Store a Groq-generated vector for a custom date (activity_id=0) in every worker."""
+    publish_event("custom_date_vector", date_id=date_record_id, vector=vector)
 
-    new_id = max(a["id"] for a in activities) + 1 if activities else 200
 
-    new_entry = {"id": new_id, "name": name, "description": description, "vector": vector}
-    activities.append(new_entry)
+def forget_custom_date_vector(date_record_id: str):
+    """Drop a deleted custom date's vector from every worker."""
+    publish_event("custom_date_removed", date_id=date_record_id)
 
-    with open(activities_path, "w") as f:
-        json.dump(activities, f, indent=2)
 
-    # Update in-memory caches immediately
-    _vector_cache[new_id] = vector
-    _payload_cache[new_id] = {"name": name, "description": description}
+def _apply_custom_date_vector(event: dict):
+    _custom_date_vectors[event["date_id"]] = event["vector"]
 
-    # Upsert to Actian
-    try:
-        client = get_client()
-        client.batch_upsert(
-            COLLECTION_NAME,
-            [new_id],
-            [vector],
-            [{"name": name, "description": description}]
-        )
-    except Exception as e:
-        print(f"Warning: Actian upsert for new activity failed: {e}")
 
-    print(f"Seeded new activity id={new_id}: {name}")
-    return new_id
+def _apply_custom_date_removed(event: dict):
+    _custom_date_vectors.pop(event["date_id"], None)
 
 
-def store_custom_date_vector(date_record_id: str, vector: list[float]):
-    """Store a Groq-generated vector for a custom date (activity_id=0)."""
-    _custom_date_vectors[date_record_id] = vector
+subscribe("custom_date_vector", _apply_custom_date_vector)
+subscribe("custom_date_removed", _apply_custom_date_removed)
 
 
 def get_custom_date_vectors(date_record_ids: list[str]) -> dict[str, list[float]]:
     """Get stored vectors for custom dates by their Supabase record IDs."""
-    return {rid: _custom_date_vectors[rid] for rid in date_record_ids if rid in _custom_date_vectors}
+    found = {rid: _custom_date_vectors[rid] for rid in date_record_ids if rid in _custom_date_vectors}
+    record_cache("custom_date_vectors", hits=len(found), misses=len(set(date_record_ids)) - len(found))
+    return found
 
 
 def save_custom_activity(name: str, vector: list[float], user_id: str, sb) -> dict | None:
     """Save a custom activity to the shared custom_activities table so other users can find it."""
     try:
-        result = sb.table("custom_activities").insert({
-            "name": name,
-            "vector": vector,
-            "created_by": user_id,
-        }).execute()
-        return result.data[0] if result.data else None
+        with guarded("supabase", "custom_activities.insert"):
+            result = sb.table("custom_activities").insert({
+                "name": name,
+                "vector": vector,
+                "created_by": user_id,
+            }).execute()
     except Exception as e:
         print(f"Failed to save custom activity (non-fatal): {e}")
         return None
+    row = result.data[0] if result.data else None
+    if row is not None:
+        # Every worker adds it to its index instead of re-reading the table
+        publish_event("custom_activity_added", activity={k: row.get(k) for k in ("id", "name", "vector")})
+    return row
+
+
+class _CustomIndex:
+    """Custom activities with usable vectors: a vector matrix, its norms and BM25 over the names. Never mutated."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = [row for row in rows if row.get("vector") and len(row["vector"]) == VECTOR_DIMENSION]
+        self.ids = {row["id"] for row in self.rows}
+        self.vectors = np.asarray([row["vector"] for row in self.rows], dtype=np.float64).reshape(len(self.rows), VECTOR_DIMENSION)
+        self.norms = np.linalg.norm(self.vectors, axis=1)
+        self.lexical = BM25Index([row.get("name") or "" for row in self.rows])
+
+    def adding(self, rows: list[dict]) -> "_CustomIndex":
+        """A new index with `rows` appended, skipping ids already present."""
+        fresh = [row for row in rows if row["id"] not in self.ids]
+        return _CustomIndex(self.rows + fresh) if fresh else self
+
+
+def _fetch_custom_activities(sb) -> list[dict]:
+    """Every custom_activities row, in id-keyset pages (PostgREST caps each response)."""
+    rows: list[dict] = []
+    after = None
+    while True:
+        query = sb.table("custom_activities").select("id, name, vector")
+        if after is not None:
+            query = query.gt("id", after)
+        with guarded("supabase", "custom_activities.select"):
+            page = query.order("id").limit(CUSTOM_ACTIVITIES_PAGE_SIZE).execute().data or []
+        rows.extend(page)
+        if len(page) < CUSTOM_ACTIVITIES_PAGE_SIZE:
+            return rows
+        after = page[-1]["id"]
+
+
+def _custom_index(sb) -> _CustomIndex | None:
+    """This worker's custom activity index, loaded on first use and re-read every CUSTOM_ACTIVITIES_RELOAD_SECONDS.
+
+    Between reloads, inserts arrive as custom_activity_added events. Returns the
+    last index (or None) if Supabase can't be read.
+    """
+    if time.monotonic() < _custom["reload_at"]:
+        return _custom["index"]
+    with _custom_lock:
+        # Another thread may have reloaded while we waited for the lock
+        if time.monotonic() < _custom["reload_at"]:
+            return _custom["index"]
+        try:
+            rows = _fetch_custom_activities(sb)
+        except Exception as e:
+            print(f"Failed to fetch custom activities: {e}")
+            _custom["reload_at"] = time.monotonic() + CUSTOM_ACTIVITIES_RETRY_SECONDS
+            return _custom["index"]
+        loaded = _CustomIndex(rows)
+        current = _custom["index"]
+        if current is not None:
+            # Keep rows added by events that raced the fetch; custom activities are never deleted
+            loaded = loaded.adding(current.rows)
+        _custom["index"], _custom["reload_at"] = loaded, time.monotonic() + CUSTOM_ACTIVITIES_RELOAD_SECONDS
+        return loaded
+
+
+def _apply_custom_activity_added(event: dict):
+    with _custom_lock:
+        # Before the first load this holds only the new rows; the load merges them in
+        _custom["index"] = (_custom["index"] or _CustomIndex([])).adding([event["activity"]])
+
+
+subscribe("custom_activity_added", _apply_custom_activity_added)
 
 
 def search_custom_activities(query_vector: list[float], sb, top_k: int = 3, text_query: str | None = None) -> list[dict]:
-    """Search user-created custom activities from Supabase by vector similarity."""
-    try:
-        result = sb.table("custom_activities").select("id, name, vector").execute()
-        rows = result.data or []
-    except Exception as e:
-        print(f"Failed to fetch custom activities: {e}")
-        return []
-
-    if not rows:
+    """Hybrid search over user-created custom activities, scored like search_similar: cosine plus weighted BM25."""
+    index = _custom_index(sb)
+    if index is None or not index.rows:
         return []
 
-    query = np.array(query_vector)
+    query = np.asarray(query_vector, dtype=np.float64)
     query_norm = np.linalg.norm(query)
     if query_norm == 0:
         query_norm = 1.0
 
-    scored = []
-    for row in rows:
-        vec = row.get("vector")
-        if not vec:
-            continue
-        v = np.array(vec)
-        v_norm = np.linalg.norm(v)
-        if v_norm == 0:
-            continue
-        similarity = float(np.dot(query, v) / (query_norm * v_norm))
-        if text_query:
-            boost = _keyword_boost(text_query, row.get("name", ""), "")
-            similarity += boost
-        scored.append((row, similarity))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
+    scores = index.vectors @ query / (np.where(index.norms == 0, 1.0, index.norms) * query_norm)
+    if text_query:
+        # Same lexical term and weight as the catalog, so merged results share one scale
+        scores = scores + HYBRID_LEXICAL_WEIGHT * index.lexical.normalized(text_query)
+    order = [i for i in np.argsort(-scores, kind="stable") if index.norms[i] > 0][:top_k]
 
     return [
         {
-            "id": row["id"],
-            "name": row["name"],
+            "id": index.rows[i]["id"],
+            "name": index.rows[i]["name"],
             "description": "Custom activity from the community",
-            "score": round(min(score, 1.0), 4),
+            "score": round(min(float(scores[i]), 1.0), 4),
             "is_custom": True,
         }
-        for row, score in scored[:top_k]
+        for i in order
     ]
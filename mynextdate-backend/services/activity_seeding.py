@@ -0,0 +1,39 @@
+"""Background canonicalization and seeding of user-described activities.
+
+A custom date's text is queued once per normalized form. A worker asks the
+LLM for a canonical name and description (bounded by the job pool), and each
+drain cycle writes all newly canonicalized activities to the catalog together.
+"""
+import re
+from services.actian_service import seed_new_activities
+from services.job_queue import register, enqueue
+from services.text_to_vector import generate_activity_entry
+
+KIND = "activity_seed"
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase words only, so "Axe throwing!" and "axe  throwing" dedupe together."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def enqueue_activity_seed(user_text: str, vector: list[float]) -> bool:
+    """Queue canonicalization + seeding for `user_text`. False if the same text was already queued."""
+    key = normalize_text(user_text)
+    if not key:
+        return False
+    return enqueue(KIND, {"text": user_text, "vector": vector}, key)
+
+
+async def _canonicalize(payload: dict) -> dict:
+    entry = await generate_activity_entry(payload["text"])
+    return {
+        "name": entry.get("name") or payload["text"],
+        "description": entry.get("description", ""),
+        "vector": payload["vector"],
+    }
+
+
+register(KIND, _canonicalize, seed_new_activities)
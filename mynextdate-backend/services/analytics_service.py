@@ -1,93 +1,312 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 import numpy as np
 from config import VECTOR_DIMENSION, VECTOR_LABELS
+from services.actian_service import get_activity_vectors, get_custom_date_vectors
+from services.history_store import load_user_history, PREFERENCE_COLUMNS
+from services.invalidation import subscribe
+from services.metrics import record_cache
+from services.tracing import span
+
+
+# Recent rated dates kept per user. avg_last_five needs 5 and the trend 4; the
+# slack avoids a refill scan when a recent date is deleted or unrated.
+RECENT_RATINGS = 8
+AGGREGATES_MAX = 20000
+
+EMPTY_ANALYTICS = {
+    "total_dates": 0,
+    "avg_last_five": 0.0,
+    "success_rate": 0.0,
+    "preference_summary": "No dating history yet. Add some dates to get started!",
+    "dimension_averages": {label: 0.5 for label in VECTOR_LABELS},
+    "trend": "neutral",
+}
+
+
+def _is_rated(rating) -> bool:
+    return bool(rating) and rating > 0
+
+
+def _contribution(vector, rating: float) -> tuple[np.ndarray, float]:
+    """Weighted pull of one rated date: toward its vector if liked, away from it if not."""
+    vec = np.asarray(vector, dtype=np.float64)
+    if rating >= 3:
+        # Positive: higher rating = stronger pull toward this vector
+        weight = rating / 5.0
+        return vec * weight, weight
+    # Negative: lower rating = stronger push AWAY
+    weight = (3.0 - rating) / 5.0
+    return (1.0 - vec) * weight, weight
+
+
+@dataclass
+class _DateEntry:
+    created_at: str
+    rating: float | None
+    vector: list[float] | None
+
+
+class UserAggregate:
+    """Running analytics for one user, updated in O(1) per date insert/rate/delete.
+
+    Keeps counts, weighted vector sums, a small buffer of the most recent rated
+    dates and a per-date map (rating, vector) so that updates and deletes can
+    subtract exactly what was added.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.rated = 0
+        self.successes = 0
+        self.vector_count = 0
+        self.vector_sum = np.zeros(VECTOR_DIMENSION)
+        self.weight_sum = 0.0
+        self.entries: dict[str, _DateEntry] = {}
+        # (created_at, date_id, rating), newest first
+        self.recent: list[tuple[str, str, float]] = []
+
+    @classmethod
+    def from_history(cls, dates: list[dict], activity_vectors: dict) -> "UserAggregate":
+        """Vectorized full recompute, used to build, repair and check the incremental state.
+
+        dates: list of {"id", "activity_id", "rating", "created_at"}, newest first.
+        Custom dates (activity_id=0) are looked up in activity_vectors by record id.
+        """
+        agg = cls()
+        agg.total = len(dates)
+        vectors = []
+        for d in dates:
+            key = d["id"] if d["activity_id"] == 0 else d["activity_id"]
+            vector = activity_vectors.get(key)
+            agg.entries[d["id"]] = _DateEntry(d.get("created_at") or "", d["rating"], vector)
+            vectors.append(vector)
+
+        ratings = np.array([d["rating"] if _is_rated(d["rating"]) else np.nan for d in dates], dtype=np.float64)
+        rated = ~np.isnan(ratings)
+        agg.rated = int(rated.sum())
+        agg.successes = int((ratings[rated] >= 3).sum())
+
+        with_vectors = np.array([rated[i] and vectors[i] is not None for i in range(len(dates))], dtype=bool)
+        if with_vectors.any():
+            matrix = np.array([vectors[i] for i in np.flatnonzero(with_vectors)], dtype=np.float64)
+            r = ratings[with_vectors]
+            liked = r >= 3
+            weights = np.where(liked, r / 5.0, (3.0 - r) / 5.0)
+            pulls = np.where(liked[:, None], matrix, 1.0 - matrix) * weights[:, None]
+            agg.vector_sum = pulls.sum(axis=0)
+            agg.weight_sum = float(weights.sum())
+            agg.vector_count = int(with_vectors.sum())
+
+        agg.recent = [
+            (d.get("created_at") or "", d["id"], d["rating"])
+            for d in dates if _is_rated(d["rating"])
+        ][:RECENT_RATINGS]
+        return agg
+
+    def _count(self, entry: _DateEntry, sign: int):
+        if not _is_rated(entry.rating):
+            return
+        self.rated += sign
+        self.successes += sign * (entry.rating >= 3)
+        if entry.vector is not None:
+            pull, weight = _contribution(entry.vector, entry.rating)
+            self.vector_sum += sign * pull
+            self.weight_sum += sign * weight
+            self.vector_count += sign
+
+    def _recent_insert(self, date_id: str, entry: _DateEntry):
+        if not _is_rated(entry.rating):
+            return
+        item = (entry.created_at, date_id, entry.rating)
+        if len(self.recent) >= RECENT_RATINGS and item[:2] < self.recent[-1][:2]:
+            return
+        self.recent.append(item)
+        self.recent.sort(key=lambda x: x[:2], reverse=True)
+        del self.recent[RECENT_RATINGS:]
+
+    def _recent_remove(self, date_id: str):
+        before = len(self.recent)
+        self.recent = [item for item in self.recent if item[1] != date_id]
+        if len(self.recent) < before and len(self.recent) < min(self.rated, RECENT_RATINGS):
+            # A buffered date went away and older rated dates exist: refill from the per-date map
+            self.recent = sorted(
+                ((e.created_at, did, e.rating) for did, e in self.entries.items() if _is_rated(e.rating)),
+                reverse=True,
+            )[:RECENT_RATINGS]
+
+    def add(self, date_id: str, created_at: str, rating: float | None, vector: list[float] | None):
+        if date_id in self.entries:
+            self.remove(date_id)
+        entry = _DateEntry(created_at or "", rating, vector)
+        self.entries[date_id] = entry
+        self.total += 1
+        self._count(entry, +1)
+        self._recent_insert(date_id, entry)
+
+    def remove(self, date_id: str):
+        entry = self.entries.pop(date_id, None)
+        if entry is None:
+            return
+        self.total -= 1
+        self._count(entry, -1)
+        self._recent_remove(date_id)
+
+    def rate(self, date_id: str, rating: float | None):
+        entry = self.entries.get(date_id)
+        if entry is None:
+            return
+        self.remove(date_id)
+        self.add(date_id, entry.created_at, rating, entry.vector)
+
+    def to_analytics(self) -> dict:
+        if not self.total:
+            return dict(EMPTY_ANALYTICS)
+
+        ratings = [r for _, _, r in self.recent]
+
+        # Average of last 5 rated dates
+        last_five = ratings[:5]
+        avg_last_five = round(sum(last_five) / len(last_five), 2) if last_five else 0.0
+
+        # Success rate (>= 3 stars) — only from rated dates
+        success_rate = round(self.successes / self.rated * 100, 1) if self.rated > 0 else 0.0
+
+        # Weighted dimension averages from RATED dates only
+        if self.vector_count > 0 and self.weight_sum > 0:
+            weighted_avg = np.clip(self.vector_sum / self.weight_sum, 0.0, 1.0)
+            dim_averages = {label: round(float(weighted_avg[i]), 3) for i, label in enumerate(VECTOR_LABELS)}
+        else:
+            dim_averages = {label: 0.5 for label in VECTOR_LABELS}
+
+        summary = _generate_summary(dim_averages, success_rate, avg_last_five)
+
+        # Trend: compare last 2 dates vs previous 2 dates (rated only)
+        trend = "neutral"
+        if len(ratings) >= 4:
+            diff = sum(ratings[:2]) / 2 - sum(ratings[2:4]) / 2
+            if diff >= 0.5:
+                trend = "improving"
+            elif diff <= -0.5:
+                trend = "declining"
+
+        return {
+            "total_dates": self.total,
+            "avg_last_five": avg_last_five,
+            "success_rate": success_rate,
+            "preference_summary": summary,
+            "dimension_averages": dim_averages,
+            "trend": trend,
+        }
 
 
 def compute_analytics(
     dates: list[dict],
-    activity_vectors: dict[int, list[float]],
+    activity_vectors: dict,
 ) -> dict:
     """
-    Compute user analytics from date history.
+    Compute user analytics from full date history (vectorized recompute).
 
-    dates: list of {"activity_id": int, "rating": float, "created_at": str, "activity_name": str}
-    activity_vectors: {activity_id: [9D vector]}
+    dates: list of {"id": str, "activity_id": int, "rating": float, "created_at": str}, newest first
+    activity_vectors: {activity_id or custom date id: [9D vector]}
     """
-    if not dates:
-        return {
-            "total_dates": 0,
-            "avg_last_five": 0.0,
-            "success_rate": 0.0,
-            "preference_summary": "No dating history yet. Add some dates to get started!",
-            "dimension_averages": {label: 0.5 for label in VECTOR_LABELS},
-            "trend": "neutral",
-        }
+    return UserAggregate.from_history(dates, activity_vectors).to_analytics()
 
-    total = len(dates)
-
-    # Separate rated vs unrated dates
-    rated_dates = [d for d in dates if d["rating"] and d["rating"] > 0]
-    ratings = [d["rating"] for d in rated_dates]
-
-    # Average of last 5 rated dates
-    last_five = ratings[:5] if ratings else []
-    avg_last_five = round(sum(last_five) / len(last_five), 2) if last_five else 0.0
-
-    # Success rate (>= 3 stars) — only from rated dates
-    rated_count = len(rated_dates)
-    successful = [r for r in ratings if r >= 3]
-    success_rate = round(len(successful) / rated_count * 100, 1) if rated_count > 0 else 0.0
-
-    # Compute weighted dimension averages from RATED dates only
-    # Positive dates (rating >= 3) pull toward, negative push away, unrated are excluded
-    all_vecs = []
-    all_weights = []
-    for d in rated_dates:
-        aid = d["activity_id"]
-        if aid not in activity_vectors:
-            continue
-        vec = np.array(activity_vectors[aid])
-        rating = d["rating"]
-        if rating >= 3:
-            # Positive: higher rating = stronger pull toward this vector
-            weight = rating / 5.0
-            all_vecs.append(vec * weight)
-        else:
-            # Negative: lower rating = stronger push AWAY
-            weight = (3.0 - rating) / 5.0
-            all_vecs.append((1.0 - vec) * weight)
-        all_weights.append(weight)
-
-    dim_averages = {}
-    if all_vecs and sum(all_weights) > 0:
-        weighted_avg = np.sum(all_vecs, axis=0) / sum(all_weights)
-        weighted_avg = np.clip(weighted_avg, 0.0, 1.0)
-        for i, label in enumerate(VECTOR_LABELS):
-            dim_averages[label] = round(float(weighted_avg[i]), 3)
-    else:
-        dim_averages = {label: 0.5 for label in VECTOR_LABELS}
-
-    # Generate insight summary
-    summary = _generate_summary(dim_averages, success_rate, avg_last_five)
-
-    # Trend: compare last 2 dates vs previous 2 dates (rated only)
-    trend = "neutral"
-    if len(ratings) >= 4:
-        recent_2_avg = sum(ratings[:2]) / 2
-        previous_2_avg = sum(ratings[2:4]) / 2
-        diff = recent_2_avg - previous_2_avg
-        if diff >= 0.5:
-            trend = "improving"
-        elif diff <= -0.5:
-            trend = "declining"
-
-    return {
-        "total_dates": total,
-        "avg_last_five": avg_last_five,
-        "success_rate": success_rate,
-        "preference_summary": summary,
-        "dimension_averages": dim_averages,
-        "trend": trend,
-    }
+
+# user_id -> aggregate (LRU). While a user's aggregate is being rebuilt, a
+# change counter (so a rebuild that raced with a history change is not stored)
+# and the number of rebuilds in flight; both are dropped when the last one ends.
+_aggregates: "OrderedDict[str, UserAggregate]" = OrderedDict()
+_versions: dict[str, int] = {}
+_rebuilds: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _vector_for(date: dict) -> list[float] | None:
+    if date.get("activity_id") == 0:
+        return get_custom_date_vectors([date["id"]]).get(date["id"])
+    return get_activity_vectors([date["activity_id"]]).get(date["activity_id"])
+
+
+def _apply_history_change(event: dict):
+    user_id = event["user_id"]
+    op, date = event.get("op"), event.get("date") or {}
+    # Resolve outside the lock: it may warm the catalog and wait on its build lock
+    vector = None
+    if op == "insert" and date.get("id") and user_id in _aggregates:
+        try:
+            vector = _vector_for(date)
+        except Exception as e:
+            print(f"Analytics vector lookup failed, will rebuild: {e}")
+            op = None
+    with _lock:
+        if user_id in _versions:
+            _versions[user_id] += 1
+        agg = _aggregates.get(user_id)
+        if agg is None:
+            return
+        try:
+            if op == "insert" and date.get("id"):
+                agg.add(date["id"], date.get("created_at") or "", date.get("rating"), vector)
+            elif op == "rate" and date.get("id"):
+                agg.rate(date["id"], date.get("rating"))
+            elif op == "delete":
+                for date_id in event.get("date_ids", []):
+                    agg.remove(date_id)
+            else:
+                # Unknown change: rebuild on next read
+                del _aggregates[user_id]
+        except Exception as e:
+            print(f"Analytics aggregate update failed, will rebuild: {e}")
+            _aggregates.pop(user_id, None)
+
+
+subscribe("history_changed", _apply_history_change)
+
+
+def get_user_analytics(user_id: str, sb, repair: bool = False) -> dict:
+    """Analytics from the user's running aggregate, building it from history on a miss or when repairing."""
+    with _lock:
+        agg = None if repair else _aggregates.get(user_id)
+        if agg is not None:
+            _aggregates.move_to_end(user_id)
+    record_cache("analytics_aggregates", hits=int(agg is not None), misses=int(agg is None))
+    if agg is not None:
+        with span("analytics_compute"), _lock:
+            return agg.to_analytics()
+
+    with _lock:
+        _rebuilds[user_id] = _rebuilds.get(user_id, 0) + 1
+        version = _versions.setdefault(user_id, 0)
+    try:
+        return _rebuild(user_id, sb, version)
+    finally:
+        with _lock:
+            _rebuilds[user_id] -= 1
+            if not _rebuilds[user_id]:
+                del _rebuilds[user_id], _versions[user_id]
+
+
+def _rebuild(user_id: str, sb, version: int) -> dict:
+    dates = load_user_history(sb, user_id, PREFERENCE_COLUMNS)
+
+    with span("vector_resolution"):
+        activity_vectors = get_activity_vectors(list({d["activity_id"] for d in dates}))
+        # Custom dates (activity_id=0) are keyed by their date record ID
+        activity_vectors.update(get_custom_date_vectors([d["id"] for d in dates if d["activity_id"] == 0]))
+
+    with span("analytics_compute"):
+        agg = UserAggregate.from_history(dates, activity_vectors)
+        analytics = agg.to_analytics()
+
+    with _lock:
+        if _versions[user_id] == version:
+            _aggregates[user_id] = agg
+            _aggregates.move_to_end(user_id)
+            while len(_aggregates) > AGGREGATES_MAX:
+                _aggregates.popitem(last=False)
+    return analytics
 
 
 def _intensity_word(deviation: float) -> str:
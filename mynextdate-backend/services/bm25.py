@@ -0,0 +1,94 @@
+"""Precomputed BM25 index with light stemming, for hybrid lexical + vector search.
+
+Each term's posting list stores rows together with their precomputed BM25
+impact (idf * saturated, length-normalised tf), so scoring a query is a sum
+of a few numpy scatter-adds. Indexes are small (hundreds of documents) and
+are rebuilt per worker when a catalog generation changes.
+"""
+import math
+import re
+from collections import Counter
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by did do for from got had has have i in into is it its just me my of on or our
+out over really so some that the their them then they this to up us very was we went were with you your
+""".split())
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping so "hike", "hikes", "hiked" and "hiking" share a stem."""
+    if len(token) <= 3:
+        return token
+    stripped = False
+    if token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "i"
+    elif token.endswith("ing") and len(token) > 5:
+        token, stripped = token[:-3], True
+    elif token.endswith("ed") and len(token) > 4:
+        token, stripped = token[:-2], True
+    elif token.endswith("es") and len(token) > 4 and not token.endswith("ses"):
+        token = token[:-2]
+    elif token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    # "running" -> "runn" -> "run", "shopped" -> "shopp" -> "shop"
+    if stripped and len(token) > 2 and token[-1] == token[-2] and token[-1] not in "aeiousl":
+        token = token[:-1]
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    elif token.endswith("y") and len(token) > 3:
+        # "gallery"/"galleries" -> "galleri"
+        token = token[:-1] + "i"
+    return token
+
+
+def analyze(text: str) -> list[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """BM25 over a fixed list of documents; row i is documents[i]."""
+
+    def __init__(self, documents: list[str], k1: float = K1, b: float = B):
+        tokenized = [analyze(doc) for doc in documents]
+        self.size = len(tokenized)
+        lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float64)
+        avgdl = float(lengths.mean()) if self.size and lengths.sum() else 1.0
+
+        term_freqs: dict[str, dict[int, int]] = {}
+        for row, tokens in enumerate(tokenized):
+            for term, tf in Counter(tokens).items():
+                term_freqs.setdefault(term, {})[row] = tf
+
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, freqs in term_freqs.items():
+            rows = np.fromiter(freqs.keys(), dtype=np.int64, count=len(freqs))
+            tf = np.fromiter(freqs.values(), dtype=np.float64, count=len(freqs))
+            df = len(freqs)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * lengths[rows] / avgdl)
+            self._postings[term] = (rows, idf * tf * (k1 + 1) / (tf + norm))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scores(self, query: str) -> np.ndarray:
+        """Raw BM25 score of every row for `query`."""
+        out = np.zeros(self.size, dtype=np.float64)
+        for term in set(analyze(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                out[posting[0]] += posting[1]
+        return out
+
+    def normalized(self, query: str) -> np.ndarray:
+        """BM25 scores scaled so the best row for this query scores 1.0 (all zeros if nothing matches)."""
+        scores = self.scores(query)
+        top = scores.max() if self.size else 0.0
+        return scores / top if top > 0 else scores
@@ -0,0 +1,226 @@
+"""Chunked, parallel, resumable bulk upserts into an Actian collection.
+
+`bulk_load(collection, path, to_record)` streams records from a JSON array
+(or JSON lines) file without parsing it whole, groups them into chunks of
+ACTIAN_BULK_CHUNK_SIZE and upserts the chunks over ACTIAN_BULK_STREAMS
+parallel streams (the managed client's channel pool is shared, so keep
+ACTIAN_POOL_SIZE at least as large). At most two chunks per stream are held in
+memory at a time. A failed chunk is retried with backoff, and the load stops
+once a chunk has failed ACTIAN_BULK_MAX_ATTEMPTS times.
+
+Finished chunks are recorded in a checkpoint file under
+ACTIAN_BULK_CHECKPOINT_DIR, so a rerun after a crash or failure skips them.
+The checkpoint is only honoured for the same file (path, size and mtime) and
+chunk size, and is deleted once the load completes.
+
+Progress and the final result are printed in vectors per second, and uploaded
+vectors are counted in mynextdate_actian_bulk_vectors_total.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+from config import (
+    ACTIAN_BULK_CHUNK_SIZE, ACTIAN_BULK_STREAMS, ACTIAN_BULK_MAX_ATTEMPTS, ACTIAN_BULK_CHECKPOINT_DIR,
+    ACTIAN_RECONNECT_BASE_SECONDS,
+)
+from services.actian_connection import actian_call
+from services.metrics import Counter
+
+# (id, vector, payload) for one Actian point
+Record = tuple[int, list[float], dict]
+
+READ_BUFFER = 1 << 16
+PROGRESS_SECONDS = 5.0
+
+BULK_VECTORS = Counter(
+    "mynextdate_actian_bulk_vectors_total", "Vectors upserted by the bulk loader, by collection.", ("collection",)
+)
+
+
+@dataclass
+class LoadResult:
+    collection: str
+    vectors: int  # upserted by this run
+    skipped: int  # already uploaded by an earlier, interrupted run
+    chunks: int
+    seconds: float
+
+    @property
+    def vectors_per_second(self) -> float:
+        return self.vectors / self.seconds if self.seconds > 0 else 0.0
+
+
+def iter_json_records(path: str) -> Iterator[dict]:
+    """Yield the objects of a JSON array file (or a JSON lines file) one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buffer = f.read(READ_BUFFER).lstrip()
+        in_array = buffer.startswith("[")
+        if in_array:
+            buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if in_array and buffer.startswith("]"):
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                more = f.read(READ_BUFFER)
+                if not more:
+                    if buffer:
+                        raise ValueError(f"{path}: truncated or invalid JSON near {buffer[:40]!r}")
+                    return
+                buffer += more
+                continue
+            yield obj
+            buffer = buffer[end:]
+
+
+def iter_chunks(records: Iterable[Record], size: int) -> Iterator[list[Record]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Checkpoint:
+    """Indexes of the chunks of one source file already upserted into a collection."""
+
+    def __init__(self, collection: str, path: str, chunk_size: int, resume: bool = True):
+        stat = os.stat(path)
+        self.source = {
+            "path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "chunk_size": chunk_size,
+        }
+        self.path = os.path.join(ACTIAN_BULK_CHECKPOINT_DIR, f"{collection}.json")
+        self.done: set[int] = set()
+        self._lock = threading.Lock()
+        if resume:
+            try:
+                with open(self.path) as f:
+                    saved = json.load(f)
+                if saved.get("source") == self.source:
+                    self.done = set(saved.get("done", []))
+            except (OSError, ValueError):
+                pass
+
+    def mark(self, chunk: int):
+        with self._lock:
+            self.done.add(chunk)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"source": self.source, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _upsert_chunk(collection: str, chunk: list[Record]):
+    ids, vectors, payloads = zip(*chunk)
+    for attempt in range(1, ACTIAN_BULK_MAX_ATTEMPTS + 1):
+        try:
+            with actian_call("batch_upsert") as client:
+                client.batch_upsert(collection, list(ids), list(vectors), list(payloads))
+            return
+        except Exception as e:
+            if attempt == ACTIAN_BULK_MAX_ATTEMPTS:
+                raise
+            # An open breaker says when it will let a probe through
+            time.sleep(max(ACTIAN_RECONNECT_BASE_SECONDS * 2 ** attempt, getattr(e, "retry_after", 0.0)))
+
+
+def upsert_all(
+    collection: str,
+    records: Iterable[Record],
+    chunk_size: int = ACTIAN_BULK_CHUNK_SIZE,
+    streams: int = ACTIAN_BULK_STREAMS,
+    checkpoint: Checkpoint | None = None,
+) -> LoadResult:
+    """Upsert `records` into `collection` in parallel chunks, skipping (and recording) chunks in `checkpoint`."""
+    done = checkpoint.done if checkpoint is not None else set()
+    start = last_report = time.perf_counter()
+    uploaded = skipped = chunks = 0
+    in_flight: dict[Future, tuple[int, int]] = {}  # future -> (chunk index, vectors)
+
+    def collect(futures):
+        # Checkpoint every chunk that made it before raising the first failure
+        nonlocal uploaded
+        error = None
+        for future in futures:
+            index, count = in_flight.pop(future)
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            if checkpoint is not None:
+                checkpoint.mark(index)
+            uploaded += count
+            BULK_VECTORS.inc(collection, amount=count)
+        if error is not None:
+            raise error
+
+    with ThreadPoolExecutor(max_workers=streams, thread_name_prefix=f"bulk-{collection}") as pool:
+        try:
+            for index, chunk in enumerate(iter_chunks(records, chunk_size)):
+                chunks += 1
+                if index in done:
+                    skipped += len(chunk)
+                    continue
+                # Bound memory: wait for a slot before reading further ahead
+                while len(in_flight) >= 2 * streams:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight[pool.submit(_upsert_chunk, collection, chunk)] = (index, len(chunk))
+
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_SECONDS:
+                    last_report = now
+                    print(f"  {collection}: {uploaded} vectors uploaded, {uploaded / (now - start):.0f} vectors/s")
+            collect(list(in_flight))
+        except BaseException:
+            for future in list(in_flight):
+                if future.cancel():
+                    in_flight.pop(future)
+            wait(in_flight)
+            try:
+                collect(list(in_flight))
+            except Exception:
+                pass
+            print(f"{collection} load stopped after {uploaded} vectors"
+                  + ("; rerun to resume from the checkpoint." if checkpoint is not None else "."))
+            raise
+
+    return LoadResult(collection, uploaded, skipped, chunks, time.perf_counter() - start)
+
+
+def bulk_load(
+    collection: str,
+    path: str,
+    to_record: Callable[[dict], Record],
+    chunk_size: int = ACTIAN_BULK_CHUNK_SIZE,
+    streams: int = ACTIAN_BULK_STREAMS,
+    resume: bool = True,
+) -> LoadResult:
+    """Upsert every record of the JSON file at `path` into `collection`, resuming an interrupted load."""
+    checkpoint = Checkpoint(collection, path, chunk_size, resume)
+    if checkpoint.done:
+        print(f"Resuming {collection} load: {len(checkpoint.done)} chunks already uploaded.")
+    result = upsert_all(collection, map(to_record, iter_json_records(path)), chunk_size, streams, checkpoint)
+    checkpoint.clear()
+    print(
+        f"Loaded {result.vectors} vectors into {collection} in {result.chunks} chunks "
+        f"({result.vectors_per_second:.0f} vectors/s, {result.seconds:.1f}s"
+        + (f", {result.skipped} skipped from checkpoint)" if result.skipped else ")")
+    )
+    return result
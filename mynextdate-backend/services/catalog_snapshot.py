@@ -0,0 +1,133 @@
+"""Compiled binary catalog snapshots.
+
+A snapshot is one file that maps straight into numpy arrays without parsing:
+
+    header (128 bytes)  magic, format version, row count, vector dim,
+                        payload byte count, sha256 of the source JSON,
+                        sha256 of everything after the header
+    ids                 int64 (n,)
+    payload offsets     int64 (n + 1,) byte offsets into the payload table
+    vectors             float32 (n, dim)
+    payload table       utf-8 JSON payloads, back to back
+
+Sections are laid out in that order so each one stays 8-byte aligned for
+its dtype. The source hash makes a snapshot "stale" as soon as the JSON it
+was compiled from changes. The body hash catches truncated or corrupt files.
+"""
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"MNDSNAP\x00"
+FORMAT_VERSION = 1
+HEADER_SIZE = 128
+_HEADER = struct.Struct("<8sIIIQ32s32s")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or from another format version."""
+
+
+def source_digest(source_path: str) -> bytes:
+    with open(source_path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+class Snapshot:
+    """A snapshot file mapped read-only. Arrays are views into the page cache."""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        try:
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"cannot map {path}: {e}")
+        if len(data) < HEADER_SIZE:
+            raise SnapshotError(f"{path} is truncated")
+        magic, version, count, dim, payload_bytes, self.source_sha256, self.body_sha256 = \
+            _HEADER.unpack(data[:_HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a catalog snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        expected_size = HEADER_SIZE + count * 8 + (count + 1) * 8 + count * dim * 4 + payload_bytes
+        if len(data) != expected_size:
+            raise SnapshotError(f"{path} is {len(data)} bytes, expected {expected_size}")
+        if verify and hashlib.sha256(data[HEADER_SIZE:]).digest() != self.body_sha256:
+            raise SnapshotError(f"{path} failed its checksum")
+
+        offset = HEADER_SIZE
+        self.ids = np.frombuffer(data, dtype=np.int64, count=count, offset=offset)
+        offset += count * 8
+        self.offsets = np.frombuffer(data, dtype=np.int64, count=count + 1, offset=offset)
+        offset += (count + 1) * 8
+        self.vectors = np.frombuffer(data, dtype=np.float32, count=count * dim, offset=offset).reshape(count, dim)
+        offset += count * dim * 4
+        self._payloads = data[offset:]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def payload(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._payloads[start:end].tobytes())
+
+
+def write_snapshot(path: str, ids: list[int], vectors, payloads: list[dict], source_sha256: bytes = b"") -> None:
+    """Compile rows into a snapshot at `path`, replacing any previous file atomically."""
+    ids_array = np.asarray(ids, dtype=np.int64)
+    vector_array = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(len(ids_array), -1)) \
+        if len(ids_array) else np.zeros((0, 0), dtype=np.float32)
+    blobs = [json.dumps(p, separators=(",", ":")).encode() for p in payloads]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    if blobs:
+        offsets[1:] = np.cumsum([len(b) for b in blobs])
+    body = [ids_array.tobytes(), offsets.tobytes(), vector_array.tobytes(), b"".join(blobs)]
+
+    body_hash = hashlib.sha256()
+    for part in body:
+        body_hash.update(part)
+    dim = vector_array.shape[1] if len(ids_array) else 0
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(ids_array), dim, int(offsets[-1]),
+        source_sha256.ljust(32, b"\x00"), body_hash.digest(),
+    ).ljust(HEADER_SIZE, b"\x00")
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for part in body:
+            f.write(part)
+    os.replace(tmp, path)
+
+
+def load_fresh(snapshot_path: str, source_path: str) -> Snapshot | None:
+    """Open the snapshot if it exists, is intact and was compiled from the current source file."""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        snapshot = Snapshot(snapshot_path)
+        if os.path.exists(source_path) and snapshot.source_sha256 != source_digest(source_path):
+            print(f"Snapshot {os.path.basename(snapshot_path)} is stale, ignoring it.")
+            return None
+        return snapshot
+    except (OSError, SnapshotError) as e:
+        print(f"Snapshot {os.path.basename(snapshot_path)} unusable: {e}")
+        return None
+
+
+def compile_json(source_path: str, snapshot_path: str, payload_fn) -> int:
+    """Compile a JSON catalog (a list of rows with "id" and "vector") into a snapshot. Returns the row count."""
+    with open(source_path, "rb") as f:
+        raw = f.read()
+    rows = json.loads(raw)
+    write_snapshot(
+        snapshot_path,
+        [r["id"] for r in rows],
+        [r["vector"] for r in rows],
+        [payload_fn(r) for r in rows],
+        hashlib.sha256(raw).digest(),
+    )
+    return len(rows)
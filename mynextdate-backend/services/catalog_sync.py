@@ -0,0 +1,182 @@
+"""Incremental sync of a JSON catalog into its Actian collection by content hash.
+
+Every point the app writes to Actian carries `content_hash` in its payload: a
+hash of the vector and the rest of the payload (see `with_content_hash`).
+`sync_collection` compares the source file's hashes with the stored ones, then
+upserts only new or changed records and deletes ids that left the source.
+Rerunning it against an up-to-date collection writes nothing, so it is safe to
+run on every deploy; an interrupted sync simply redoes the remainder next time.
+
+Stored hashes are read with the SDK's scroll, following its returned cursor
+until it runs out. The current SDK scrolls client-side and stops at the
+collection's point count, so ids at or above the count are looked up
+individually: every source id, plus every id the previous sync saw in the
+source (kept in the marker below). Records removed from the source since a
+sync are therefore found and deleted wherever their id lies. That includes
+activities seeded at runtime, whose ids are allocated past the JSON ids.
+
+Deletes are skipped (with a warning) when they would remove more than
+ACTIAN_SYNC_MAX_DELETE_FRACTION of the collection, e.g. after a truncated
+export; pass `force=True` to apply them anyway.
+
+After a successful sync, a marker under ACTIAN_BULK_CHECKPOINT_DIR records the
+source file, the collection's count and the source's ids, so other workers
+starting from the same file skip the scroll unless the count has changed.
+
+The sync holds `build_lock`, which only serialises workers on one host. Two
+hosts can sync the same collection at once. That's safe, just wasted work:
+both upsert the same content-hashed records and delete the same ids.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+from config import ACTIAN_BULK_CHUNK_SIZE, ACTIAN_BULK_STREAMS, ACTIAN_BULK_CHECKPOINT_DIR, ACTIAN_SYNC_MAX_DELETE_FRACTION
+from services.actian_connection import actian_call
+from services.bulk_loader import Record, iter_chunks, iter_json_records, upsert_all
+from services.metrics import Counter
+from services.shared_index import build_lock
+
+HASH_FIELD = "content_hash"
+SCROLL_PAGE = 1000
+
+CATALOG_SYNC_RECORDS = Counter(
+    "mynextdate_catalog_sync_records_total", "Records seen by catalog syncs, by collection and outcome.", ("collection", "result")
+)
+
+
+@dataclass
+class SyncResult:
+    collection: str
+    upserted: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    skipped_deletes: int = 0  # over ACTIAN_SYNC_MAX_DELETE_FRACTION, not applied
+    seconds: float = 0.0
+    up_to_date: bool = False  # nothing checked: source and collection match the last sync
+
+
+def content_hash(vector: list[float], payload: dict) -> str:
+    body = {k: v for k, v in payload.items() if k != HASH_FIELD}
+    return hashlib.sha256(json.dumps([vector, body], sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def with_content_hash(record: Record) -> Record:
+    point_id, vector, payload = record
+    return point_id, vector, {**payload, HASH_FIELD: content_hash(vector, payload)}
+
+
+def _count(collection: str) -> int:
+    with actian_call("get_vector_count") as client:
+        return client.get_vector_count(collection)
+
+
+def _scroll_all(collection: str) -> dict[int, str | None]:
+    """Stored hashes from the scroll, paged by its returned cursor until it runs out."""
+    hashes: dict[int, str | None] = {}
+    cursor = None
+    while True:
+        with actian_call("scroll") as client:
+            records, cursor = client.scroll(collection, limit=SCROLL_PAGE, cursor=cursor, with_vectors=False)
+        hashes.update((record.id, (record.payload or {}).get(HASH_FIELD)) for record in records)
+        if cursor is None:
+            return hashes
+
+
+def _get_hashes(collection: str, ids: list[int]) -> dict[int, str | None]:
+    with actian_call("get_many") as client:
+        rows = client.get_many(collection, ids, with_vectors=False)
+    return {i: (payload or {}).get(HASH_FIELD) for i, (_, payload) in zip(ids, rows) if payload is not None}
+
+
+def _marker_path(collection: str) -> str:
+    return os.path.join(ACTIAN_BULK_CHECKPOINT_DIR, f"{collection}.synced.json")
+
+
+def _source_id(path: str) -> dict:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_marker(collection: str) -> dict | None:
+    try:
+        with open(_marker_path(collection)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_marker(collection: str, source: dict, count: int, ids: list[int]):
+    path = _marker_path(collection)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"source": source, "count": count, "ids": ids}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def sync_collection(
+    collection: str,
+    path: str,
+    to_record: Callable[[dict], Record],
+    chunk_size: int = ACTIAN_BULK_CHUNK_SIZE,
+    streams: int = ACTIAN_BULK_STREAMS,
+    dry_run: bool = False,
+    force: bool = False,
+) -> SyncResult:
+    """Bring `collection` in line with the JSON catalog at `path`. `to_record` must include the content hash."""
+    with build_lock(f"actian-sync-{collection}"):
+        start = time.perf_counter()
+        result = SyncResult(collection)
+        source = _source_id(path)
+        count = _count(collection)
+        marker = _read_marker(collection) or {}
+        if not force and marker.get("source") == source and marker.get("count") == count:
+            result.up_to_date = True
+            return result
+
+        stored = _scroll_all(collection)
+        with ThreadPoolExecutor(max_workers=streams, thread_name_prefix=f"sync-{collection}") as pool:
+            # First pass: the source's hashes only, so memory stays at one small entry per record
+            wanted = {r[0]: r[2][HASH_FIELD] for r in map(to_record, iter_json_records(path))}
+            # Ids the scroll can't reach: the source's, and the last synced source's (maybe removed since)
+            unseen = [i for i in wanted if i not in stored]
+            unseen += [i for i in marker.get("ids", []) if i not in stored and i not in wanted]
+            for found in pool.map(lambda ids: _get_hashes(collection, ids), iter_chunks(unseen, SCROLL_PAGE)):
+                stored.update(found)
+
+        changed = {i for i, h in wanted.items() if stored.get(i) != h}
+        removed = sorted(i for i in stored if i not in wanted)
+        result.unchanged = len(wanted) - len(changed)
+        if removed and not force and len(removed) > ACTIAN_SYNC_MAX_DELETE_FRACTION * max(len(stored), 1):
+            print(
+                f"Warning: {collection} sync would delete {len(removed)} of {len(stored)} points; "
+                f"skipping deletes (run scripts/sync_catalog.py --force to apply)."
+            )
+            result.skipped_deletes, removed = len(removed), []
+
+        if dry_run:
+            result.upserted, result.deleted = len(changed), len(removed)
+        else:
+            # Second pass streams the changed records straight into the bulk loader
+            if changed:
+                records = (r for r in map(to_record, iter_json_records(path)) if r[0] in changed)
+                result.upserted = upsert_all(collection, records, chunk_size, streams).vectors
+            for ids in iter_chunks(removed, chunk_size):
+                with actian_call("batch_delete") as client:
+                    client.batch_delete(collection, ids)
+                result.deleted += len(ids)
+            if not result.skipped_deletes:
+                _write_marker(collection, source, _count(collection), sorted(wanted))
+            CATALOG_SYNC_RECORDS.inc(collection, "upserted", amount=result.upserted)
+            CATALOG_SYNC_RECORDS.inc(collection, "unchanged", amount=result.unchanged)
+            CATALOG_SYNC_RECORDS.inc(collection, "deleted", amount=result.deleted)
+
+        result.seconds = time.perf_counter() - start
+        print(
+            f"{'Dry run: ' if dry_run else ''}Synced {collection}: {result.upserted} upserted, "
+            f"{result.unchanged} unchanged, {result.deleted} deleted ({result.seconds:.1f}s)."
+        )
+        return result
@@ -0,0 +1,188 @@
+"""Per-dependency circuit breakers, so a degraded dependency fails fast.
+
+Every external call runs inside `guarded(dependency, operation)`, which times
+it (like track_dependency) and feeds its breaker. Over the last CIRCUIT_WINDOW
+calls, once there have been at least CIRCUIT_MIN_CALLS, a breaker opens when
+
+- the failure rate reaches CIRCUIT_FAILURE_RATE, or
+- the rate of calls slower than SLOW_CALL_SECONDS[dependency] reaches
+  CIRCUIT_SLOW_CALL_RATE.
+
+While open, calls raise CircuitOpenError immediately instead of waiting out a
+timeout. After CIRCUIT_OPEN_SECONDS the breaker is half-open: up to
+CIRCUIT_HALF_OPEN_PROBES calls go through, and the breaker closes once that
+many succeed in time, or reopens on the first failing or slow one.
+
+Client errors (a 4xx status, e.g. an invalid token) say nothing about the
+dependency's health and are not counted. A call cancelled by its caller counts
+as slow if it had already run past the threshold, and is otherwise ignored.
+Breakers are per worker. Callers decide the fallback; a CircuitOpenError that
+reaches a route is answered 503 with Retry-After (see main.py).
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from config import (
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATE, CIRCUIT_SLOW_CALL_RATE,
+    CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES,
+)
+from services.metrics import Counter, Gauge, track_dependency
+
+SLOW_CALL_SECONDS = {"groq": 5.0, "gemini": 5.0, "supabase": 2.0, "actian": 2.0, "nominatim": 3.0}
+DEFAULT_SLOW_CALL_SECONDS = 5.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_TRANSITIONS = Counter(
+    "mynextdate_circuit_transitions_total", "Circuit breaker state changes by dependency and new state.", ("dependency", "state")
+)
+CIRCUIT_REJECTIONS = Counter(
+    "mynextdate_circuit_rejections_total", "Calls refused without trying because the dependency's circuit was open.", ("dependency",)
+)
+
+
+class CircuitOpenError(Exception):
+    """The dependency's breaker is open; retry after `retry_after` seconds."""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} is unavailable (circuit open)")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, dependency: str, slow_call_seconds: float):
+        self.dependency = dependency
+        self.slow_call_seconds = slow_call_seconds
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=CIRCUIT_WINDOW)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0  # half-open calls in flight
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, state: str):
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        self._probes = self._probe_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        CIRCUIT_TRANSITIONS.inc(self.dependency, state)
+        print(f"Circuit for {self.dependency} is now {state}")
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+            self._transition(HALF_OPEN)
+
+    def acquire(self):
+        """Permit one call or raise CircuitOpenError."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < CIRCUIT_HALF_OPEN_PROBES:
+                self._probes += 1
+                return
+            retry_after = max(0.0, CIRCUIT_OPEN_SECONDS - (time.monotonic() - self._opened_at))
+        CIRCUIT_REJECTIONS.inc(self.dependency)
+        raise CircuitOpenError(self.dependency, retry_after)
+
+    def record(self, seconds: float, failed: bool):
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._transition(OPEN)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= CIRCUIT_HALF_OPEN_PROBES:
+                    self._transition(CLOSED)
+                return
+            if self._state == OPEN:
+                return  # a call admitted before the breaker opened
+            self._outcomes.append((failed, slow))
+            n = len(self._outcomes)
+            if n < CIRCUIT_MIN_CALLS:
+                return
+            failures = sum(f for f, _ in self._outcomes)
+            slow_calls = sum(s for _, s in self._outcomes)
+            if failures / n >= CIRCUIT_FAILURE_RATE or slow_calls / n >= CIRCUIT_SLOW_CALL_RATE:
+                self._transition(OPEN)
+
+    def release(self):
+        """Forget an admitted call that ended without an outcome (e.g. cancelled early)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    breaker = _breakers.get(dependency)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(
+                dependency, CircuitBreaker(dependency, SLOW_CALL_SECONDS.get(dependency, DEFAULT_SLOW_CALL_SECONDS))
+            )
+    return breaker
+
+
+def is_open(dependency: str) -> bool:
+    """True while calls to `dependency` fail fast."""
+    return get_breaker(dependency).state == OPEN
+
+
+def states() -> dict[str, str]:
+    return {name: breaker.state for name, breaker in sorted(_breakers.items())}
+
+
+def _state_values() -> dict[tuple, float]:
+    return {(name,): _STATE_VALUES[state] for name, state in states().items()}
+
+
+CIRCUIT_STATE = Gauge(
+    "mynextdate_circuit_state", "Circuit breaker state by dependency (0 closed, 1 half-open, 2 open).", ("dependency",), fn=_state_values
+)
+
+
+def _is_client_error(error: BaseException) -> bool:
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+@contextmanager
+def guarded(dependency: str, operation: str = ""):
+    """track_dependency behind the dependency's circuit breaker. Raises CircuitOpenError without calling if open."""
+    breaker = get_breaker(dependency)
+    breaker.acquire()
+    start = time.perf_counter()
+    try:
+        with track_dependency(dependency, operation):
+            yield
+    except Exception as e:
+        breaker.record(time.perf_counter() - start, failed=not _is_client_error(e))
+        raise
+    except BaseException:
+        # Cancelled by the caller (e.g. a timeout or a hedge that lost)
+        elapsed = time.perf_counter() - start
+        if elapsed >= breaker.slow_call_seconds:
+            breaker.record(elapsed, failed=False)
+        else:
+            breaker.release()
+        raise
+    breaker.record(time.perf_counter() - start, failed=False)
@@ -1,90 +1,155 @@
 """City-specific activity search service with separate Actian collection and in-memory cache."""
 import json
+import os
 import numpy as np
-from cortex import CortexClient, DistanceMetric
-from config import ACTIAN_HOST, VECTOR_DIMENSION
+from config import VECTOR_DIMENSION, HYBRID_LEXICAL_WEIGHT
+from services.bm25 import BM25Index
+from services.actian_connection import actian_call
+from services.catalog_snapshot import compile_json, load_fresh, source_digest
+from services.catalog_sync import sync_collection, with_content_hash
+from services.shared_index import IndexHandle, VectorView, PayloadView, build_lock, matches_source, publish, publish_snapshot
 
 CITY_COLLECTION = "city_date_spots"
+CITY_ACTIVITIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "city_activities.json")
 
-# Separate in-memory caches for city activities
-_city_cache: dict[int, dict] = {}
-_city_vector_cache: dict[int, list[float]] = {}
+# City spots live in their own shared index; the views keep dict-style access
+_city_spots = IndexHandle("city_spots")
+_city_cache = PayloadView(_city_spots)
+_city_vector_cache = VectorView(_city_spots)
 
+# Set once this worker has checked the published generation against the city JSON
+_source_checked: dict = {"done": False}
 
-def _get_client() -> CortexClient:
-    """Reuse the shared Actian client."""
-    from services.actian_service import get_client
-    return get_client()
+# Per-generation lookup tables built once per worker: city -> rows, and the summary
+_layout: dict = {"generation": None}
 
 
 def init_city_collection():
     """Create city_date_spots Actian collection if it doesn't exist."""
-    client = _get_client()
-    client.get_or_create_collection(
-        name=CITY_COLLECTION,
-        dimension=VECTOR_DIMENSION,
-        distance_metric=DistanceMetric.COSINE,
-        hnsw_m=16,
-        hnsw_ef_construct=200,
-        hnsw_ef_search=100,
-    )
+    from cortex import DistanceMetric
+    with actian_call("get_or_create_collection") as client:
+        client.get_or_create_collection(
+            name=CITY_COLLECTION,
+            dimension=VECTOR_DIMENSION,
+            distance_metric=DistanceMetric.COSINE,
+            hnsw_m=16,
+            hnsw_ef_construct=200,
+            hnsw_ef_search=100,
+        )
+
+
+def snapshot_path_for(path: str) -> str:
+    return os.path.splitext(path)[0] + ".snap"
+
+
+def _city_payload(activity: dict) -> dict:
+    return {k: v for k, v in activity.items() if k != "vector"}
+
+
+def build_city_snapshot(path: str = CITY_ACTIVITIES_PATH) -> int:
+    """Compile the city spots JSON into its binary snapshot. Returns the spot count."""
+    return compile_json(path, snapshot_path_for(path), _city_payload)
+
+
+def _publish_city_spots(path: str) -> int:
+    """Publish the compiled snapshot, recompiling it from JSON first if it is missing or stale."""
+    snapshot_path = snapshot_path_for(path)
+    if load_fresh(snapshot_path, path) is None:
+        try:
+            build_city_snapshot(path)
+        except OSError as e:
+            # Read-only data dir: publish straight from the parsed JSON
+            print(f"Could not write city snapshot ({e}), publishing from JSON.")
+            with open(path) as f:
+                activities = json.load(f)
+            return publish(
+                "city_spots",
+                [a["id"] for a in activities],
+                [a["vector"] for a in activities],
+                [_city_payload(a) for a in activities],
+                source_digest(path),
+            )
+    return publish_snapshot("city_spots", snapshot_path)
 
 
 def load_city_cache(path: str):
-    """Load city activities from JSON into in-memory cache only (no Actian upsert)."""
-    global _city_cache, _city_vector_cache
-    with open(path) as f:
-        activities = json.load(f)
-    for a in activities:
-        _city_cache[a["id"]] = {k: v for k, v in a.items() if k != "vector"}
-        _city_vector_cache[a["id"]] = a["vector"]
-    print(f"Loaded {len(activities)} city activities into cache.")
-
-
-def seed_city_activities(path: str):
-    """Load city activities from JSON, seed into in-memory cache AND Actian."""
-    global _city_cache, _city_vector_cache
-    with open(path) as f:
-        activities = json.load(f)
-
-    client = _get_client()
-    ids = [a["id"] for a in activities]
-    vectors = [a["vector"] for a in activities]
-    payloads = []
-
-    for a in activities:
-        _city_cache[a["id"]] = {k: v for k, v in a.items() if k != "vector"}
-        _city_vector_cache[a["id"]] = a["vector"]
-        payloads.append({
-            "city": a["city"],
-            "state": a.get("state", ""),
-            "name": a["name"],
-            "venue": a.get("venue", ""),
-            "description": a.get("description", ""),
-            "price_tier": a.get("price_tier", 1),
-            "indoor": a.get("indoor", False),
-            "vibe": a.get("vibe", []),
-        })
-
-    client.batch_upsert(CITY_COLLECTION, ids, vectors, payloads)
-    print(f"Seeded {len(activities)} city activities into Actian.")
-
-
-def get_cities_summary() -> list[dict]:
-    """Return distinct cities with their activity counts."""
+    """Map the shared city index, publishing it from the snapshot or JSON if no worker has yet (no Actian upsert).
+
+    A generation left over from an earlier run is republished if the JSON changed since.
+    """
+    if _city_spots.current() is not None and _source_checked["done"]:
+        return
+    with build_lock("city_spots"):
+        index = _city_spots.refresh()
+        _source_checked["done"] = True
+        if index is not None and matches_source(index, path):
+            return
+        if index is not None:
+            print(f"Published city index (generation {index.generation}) predates {os.path.basename(path)}, republishing.")
+        _publish_city_spots(path)
+        index = _city_spots.refresh()
+    print(f"Loaded {len(index) if index is not None else 0} city activities into cache.")
+
+
+def city_record(a: dict) -> tuple[int, list[float], dict]:
+    """(id, vector, payload) as stored in Actian, payload including its content hash."""
+    return with_content_hash((a["id"], a["vector"], {
+        "city": a["city"],
+        "state": a.get("state", ""),
+        "name": a["name"],
+        "venue": a.get("venue", ""),
+        "description": a.get("description", ""),
+        "price_tier": a.get("price_tier", 1),
+        "indoor": a.get("indoor", False),
+        "vibe": a.get("vibe", []),
+    }))
+
+
+def seed_city_activities(path: str, resume: bool = True):
+    """Publish city activities from JSON to the shared index AND stream them into Actian in parallel chunks."""
+    from services.bulk_loader import bulk_load
+    with build_lock("city_spots"):
+        _publish_city_spots(path)
+        _city_spots.refresh()
+    return bulk_load(CITY_COLLECTION, path, city_record, resume=resume)
+
+
+def sync_city_activities(path: str = CITY_ACTIVITIES_PATH, **kwargs):
+    """Upsert changed and delete removed city spots in Actian (see services/catalog_sync.py)."""
+    return sync_collection(CITY_COLLECTION, path, city_record, **kwargs)
+
+
+def _city_layout(index) -> dict:
+    """Rows grouped by lowercased city, the cities summary and a BM25 index, rebuilt when the generation changes."""
+    if _layout["generation"] == index.generation:
+        return _layout
     from collections import Counter
+    rows_by_city: dict[str, list[int]] = {}
     city_counts: Counter = Counter()
     city_state: dict[str, str] = {}
-    for data in _city_cache.values():
+    documents: list[str] = []
+    for row in range(len(index.ids)):
+        data = index.payload(row)
+        documents.append(" ".join([data.get("name", ""), data.get("venue", ""), data.get("description", ""), *data.get("vibe", [])]))
         city = data.get("city", "")
-        state = data.get("state", "")
+        rows_by_city.setdefault(city.lower(), []).append(row)
         if city:
             city_counts[city] += 1
-            city_state[city] = state
-    return [
+            city_state[city] = data.get("state", "")
+    summary = [
         {"city": city, "state": city_state.get(city, ""), "count": count}
         for city, count in sorted(city_counts.items())
     ]
+    _layout.update(generation=index.generation, rows_by_city=rows_by_city, summary=summary, bm25=BM25Index(documents))
+    return _layout
+
+
+def get_cities_summary() -> list[dict]:
+    """Return distinct cities with their activity counts."""
+    index = _city_spots.current()
+    if index is None:
+        return []
+    return _city_layout(index)["summary"]
 
 
 def search_city(
@@ -94,58 +159,79 @@ def search_city(
     price_tier: int | None = None,
     indoor: bool | None = None,
     vibes: list[str] | None = None,
+    text_query: str | None = None,
 ) -> list[dict]:
-    """Filter city activities and optionally rank by vector similarity."""
+    """Filter city activities and optionally rank them.
+
+    With a query vector, ranking is cosine similarity plus a weighted BM25 score
+    for `text_query`. With only `text_query` (LLM unavailable), spots are ranked
+    by BM25 alone and those matching no term are dropped, unless none match.
+    """
+    index = _city_spots.current()
+    if index is None:
+        return []
+
     # Filter candidates by city
+    layout = _city_layout(index)
     candidates = [
-        (aid, data)
-        for aid, data in _city_cache.items()
-        if data.get("city", "").lower() == city.lower()
+        (row, index.payload(row))
+        for row in layout["rows_by_city"].get(city.lower(), [])
     ]
 
     # Apply filters
     if price_tier is not None:
-        candidates = [(aid, d) for aid, d in candidates if d.get("price_tier") == price_tier]
+        candidates = [(row, d) for row, d in candidates if d.get("price_tier") == price_tier]
     if indoor is not None:
-        candidates = [(aid, d) for aid, d in candidates if d.get("indoor") == indoor]
+        candidates = [(row, d) for row, d in candidates if d.get("indoor") == indoor]
     if vibes:
         vibe_set = {v.lower() for v in vibes}
         candidates = [
-            (aid, d) for aid, d in candidates
+            (row, d) for row, d in candidates
             if any(v.lower() in vibe_set for v in d.get("vibe", []))
         ]
 
     if not candidates:
         return []
 
+    lexical = layout["bm25"].normalized(text_query) if text_query else None
+
+    # Lexical-only ranking when there is text but no vector
+    if not query_vector and lexical is not None:
+        rows = np.array([row for row, _ in candidates])
+        matched = np.flatnonzero(lexical[rows] > 0)
+        if len(matched):
+            order = matched[np.argsort(-lexical[rows[matched]], kind="stable")][:top_k]
+            return [
+                _build_result(int(index.ids[candidates[i][0]]), candidates[i][1], round(float(lexical[rows[i]]), 4))
+                for i in order
+            ]
+
     # If no query vector, return candidates directly (no ranking)
     if not query_vector:
         results = []
-        for aid, data in candidates[:top_k]:
-            results.append(_build_result(aid, data, score=None))
+        for row, data in candidates[:top_k]:
+            results.append(_build_result(int(index.ids[row]), data, score=None))
         return results
 
-    # Vector similarity ranking
-    query = np.array(query_vector)
+    # Vector similarity ranking over the candidate rows of the shared matrix
+    query = np.asarray(query_vector, dtype=np.float64)
     query_norm = np.linalg.norm(query)
     if query_norm == 0:
         query_norm = 1.0
 
-    scored = []
-    for aid, data in candidates:
-        vec = _city_vector_cache.get(aid)
-        if not vec:
-            continue
-        v = np.array(vec)
-        v_norm = np.linalg.norm(v)
-        if v_norm == 0:
-            continue
-        similarity = float(np.dot(query, v) / (query_norm * v_norm))
-        scored.append((aid, data, similarity))
-
-    scored.sort(key=lambda x: x[2], reverse=True)
-
-    return [_build_result(aid, data, round(min(score, 1.0), 4)) for aid, data, score in scored[:top_k]]
+    candidates = [(row, data) for row, data in candidates if index.norms[row] > 0]
+    if not candidates:
+        return []
+    rows = np.array([row for row, _ in candidates])
+    scores = (index.vectors[rows] @ query) / (index.norms[rows] * query_norm)
+    if lexical is not None:
+        scores += HYBRID_LEXICAL_WEIGHT * lexical[rows]
+    order = np.argsort(-scores, kind="stable")[:top_k]
+
+    return [
+        _build_result(int(index.ids[candidates[i][0]]), candidates[i][1], round(min(float(scores[i]), 1.0), 4))
+        for i in order
+    ]
 
 
 def _build_result(aid: int, data: dict, score: float | None) -> dict:
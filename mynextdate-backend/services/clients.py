@@ -0,0 +1,62 @@
+"""Lazily constructed, process-wide clients for external services.
+
+Nothing here imports an SDK until a client is first requested, which keeps
+supabase and the LLM SDKs out of the import path and off the cold-start clock.
+"""
+import threading
+from config import (
+    SUPABASE_URL, SUPABASE_ANON_KEY, SUPABASE_SERVICE_KEY, GROQ_API_KEY, GEMINI_API_KEY,
+    GROQ_TIMEOUT_SECONDS, GEMINI_TIMEOUT_SECONDS, SUPABASE_TIMEOUT_SECONDS,
+)
+
+_lock = threading.Lock()
+_supabase = None
+_supabase_anon = None
+_groq = None
+_gemini = None
+
+
+def get_supabase():
+    """Service-role Supabase client, shared by all routes and services."""
+    global _supabase
+    if _supabase is None:
+        with _lock:
+            if _supabase is None:
+                from supabase import ClientOptions, create_client
+                _supabase = create_client(
+                    SUPABASE_URL, SUPABASE_SERVICE_KEY, ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS)
+                )
+    return _supabase
+
+
+def get_supabase_anon():
+    """Anon-key Supabase client used to verify user JWTs. Stateless, so safe to share."""
+    global _supabase_anon
+    if _supabase_anon is None:
+        with _lock:
+            if _supabase_anon is None:
+                from supabase import create_client
+                _supabase_anon = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    return _supabase_anon
+
+
+def get_groq():
+    global _groq
+    if _groq is None:
+        with _lock:
+            if _groq is None:
+                from groq import Groq
+                _groq = Groq(api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT_SECONDS, max_retries=1)
+    return _groq
+
+
+def get_gemini():
+    global _gemini
+    if _gemini is None:
+        with _lock:
+            if _gemini is None:
+                from google import genai
+                _gemini = genai.Client(
+                    api_key=GEMINI_API_KEY, http_options=genai.types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000))
+                )
+    return _gemini
@@ -6,6 +6,8 @@ then surfaces activities those users love that the current user hasn't tried.
 """
 import numpy as np
 from collections import Counter
+from services.circuit_breaker import guarded
+from services.tracing import span
 
 
 def load_couples(path: str):
@@ -39,9 +41,10 @@ def find_similar_users(user_id: str, user_vector: list[float], sb, top_k: int =
     ensure_cache()
 
     # Get all other users who have date history
-    all_dates_result = sb.table("date_history").select(
-        "user_id, activity_id, rating, activity_name"
-    ).neq("user_id", user_id).execute()
+    with guarded("supabase", "date_history.select"):
+        all_dates_result = sb.table("date_history").select(
+            "user_id, activity_id, rating"
+        ).neq("user_id", user_id).execute()
     all_dates = all_dates_result.data or []
 
     if not all_dates:
@@ -96,7 +99,8 @@ def find_similar_users(user_id: str, user_vector: list[float], sb, top_k: int =
 
     # Get display names from auth metadata
     try:
-        auth_users = sb.auth.admin.list_users()
+        with guarded("supabase", "auth.list_users"):
+            auth_users = sb.auth.admin.list_users()
         name_map = {}
         for au in auth_users:
             meta = au.user_metadata or {}
@@ -106,9 +110,10 @@ def find_similar_users(user_id: str, user_vector: list[float], sb, top_k: int =
 
     # Get cities
     try:
-        loc_result = sb.table("user_locations").select(
-            "user_id, city"
-        ).in_("user_id", top_user_ids).execute()
+        with guarded("supabase", "user_locations.select"):
+            loc_result = sb.table("user_locations").select(
+                "user_id, city"
+            ).in_("user_id", top_user_ids).execute()
         city_map = {r["user_id"]: r["city"] for r in (loc_result.data or [])}
     except Exception:
         city_map = {}
@@ -131,7 +136,7 @@ def get_trending_for_similar(
     top_k: int = 5,
 ) -> list[dict]:
     """Aggregate activity popularity across similar users' actual date history."""
-    from services.actian_service import _payload_cache, ensure_cache
+    from services.actian_service import _payload_cache, get_activity_payload, ensure_cache
     ensure_cache()
 
     counts: Counter = Counter()
@@ -144,12 +149,84 @@ def get_trending_for_similar(
     total = sum(counts.values()) or 1
     results = []
     for act_id, count in counts.most_common(top_k):
-        if act_id not in _payload_cache:
+        payload = get_activity_payload(act_id)
+        if payload is None:
             continue
         results.append({
             "activity_id": act_id,
-            "activity_name": _payload_cache[act_id].get("name", ""),
+            "activity_name": payload.get("name", ""),
             "count": count,
             "percentage": round(count / total * 100),
         })
     return results
+
+
+def similar_couples(user_id: str, dates: list[dict], sb) -> dict:
+    """
+    Compute the user's 9D preference vector from their history,
+    find real users with closest taste profiles,
+    and return what those users love that the current user hasn't tried.
+    """
+    from services.actian_service import get_activity_vectors, get_custom_date_vectors, ensure_cache
+    from services.preference_engine import compute_preference_vector
+
+    if len(dates) < 2:
+        return {
+            "similar_couples": [],
+            "they_love": [],
+            "needs_more_dates": True,
+            "message": "Add at least 2 dates to unlock social discovery",
+        }
+
+    ensure_cache()
+
+    with span("vector_resolution"):
+        activity_ids = [d["activity_id"] for d in dates]
+        activity_vectors = get_activity_vectors(activity_ids)
+
+        # Merge custom date vectors
+        custom_date_ids = [d["id"] for d in dates if d["activity_id"] == 0]
+        custom_vectors = get_custom_date_vectors(custom_date_ids)
+
+    # Use ALL dates (rated or not). Unrated dates default to 3.0 (neutral weight).
+    with span("preference_compute"):
+        rated_dates = []
+        for d in dates:
+            rating = d.get("rating") or 3.0
+            if d["activity_id"] == 0 and d["id"] in custom_vectors:
+                activity_vectors[d["id"]] = custom_vectors[d["id"]]
+                rated_dates.append({"activity_id": d["id"], "rating": rating})
+            elif d["activity_id"] != 0:
+                rated_dates.append({"activity_id": d["activity_id"], "rating": rating})
+
+        user_vector = compute_preference_vector(rated_dates, activity_vectors)
+
+    with span("similar_users"):
+        similar = find_similar_users(user_id, user_vector, sb, top_k=5)
+
+    # Suggest activities the user hasn't tried yet
+    done_ids = {d["activity_id"] for d in dates if d["activity_id"] != 0}
+    with span("merge"):
+        they_love = get_trending_for_similar(
+            similar,
+            exclude_ids=done_ids,
+            top_k=5,
+        )
+
+    # Strip internal data before returning
+    clean_similar = [
+        {
+            "id": u["id"],
+            "persona": u["persona"],
+            "city": u["city"],
+            "total_dates": u["total_dates"],
+            "match_score": u["match_score"],
+        }
+        for u in similar
+    ]
+
+    return {
+        "similar_couples": clean_similar,
+        "they_love": they_love,
+        "needs_more_dates": False,
+    }
@@ -0,0 +1,58 @@
+"""Near-duplicate detection for catalog activities.
+
+Two activities are near-duplicates when their 9D vectors are almost parallel
+(cosine >= DEDUP_MIN_COSINE) and their names share most of their words
+(Jaccard >= DEDUP_MIN_NAME_SIMILARITY over stemmed words, ignoring stopwords
+and generic words like "date" or "night"). The vector test alone is too loose
+in 9 dimensions and the name test alone misses rewordings, so both must pass.
+"""
+import numpy as np
+from config import DEDUP_MIN_COSINE, DEDUP_MIN_NAME_SIMILARITY
+from services.bm25 import analyze, stem
+
+GENERIC_NAME_WORDS = frozenset(stem(w) for w in (
+    "date", "dates", "night", "day", "evening", "experience", "adventure", "outing", "together", "session", "time",
+    "class", "two", "couple", "couples",
+))
+
+
+def name_key(name: str) -> frozenset[str]:
+    return frozenset(t for t in analyze(name) if t not in GENERIC_NAME_WORDS)
+
+
+def name_similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    """Jaccard overlap of two name keys (0.0 if either is empty)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_near_duplicate(
+    name: str,
+    vector: list[float],
+    names: list[str],
+    vectors: np.ndarray,
+    norms: np.ndarray | None = None,
+    min_cosine: float = DEDUP_MIN_COSINE,
+    min_name_similarity: float = DEDUP_MIN_NAME_SIMILARITY,
+) -> int | None:
+    """Row of the closest near-duplicate of (name, vector) among `names`/`vectors`, or None.
+
+    The cosine filter is one matrix-vector product; names are compared only for
+    the few rows that pass it, most similar vector first.
+    """
+    if not len(names):
+        return None
+    query = np.asarray(vector, dtype=np.float32)
+    query_norm = float(np.linalg.norm(query))
+    if query_norm == 0:
+        return None
+    if norms is None:
+        norms = np.linalg.norm(vectors, axis=1)
+    cosine = (vectors @ query) / np.maximum(norms * query_norm, 1e-12)
+    candidates = np.flatnonzero(cosine >= min_cosine)
+    key = name_key(name)
+    for row in candidates[np.argsort(-cosine[candidates], kind="stable")]:
+        if name_similarity(key, name_key(names[row])) >= min_name_similarity:
+            return int(row)
+    return None
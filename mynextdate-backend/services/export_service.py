@@ -0,0 +1,70 @@
+"""Streaming exports of date history as NDJSON or CSV.
+
+History is read in keyset pages (see history_store) and each page is enriched
+and serialized before the next one is fetched, so memory stays at one page no
+matter how long the history is. Rows carry the catalog's activity name and the
+9D vector (catalog activity, or the custom date's vector when this worker has it).
+"""
+import csv
+import io
+import json
+from typing import Iterator
+from config import VECTOR_LABELS
+from services.actian_service import get_activity_payload, get_activity_vectors, get_custom_date_vectors
+from services.history_store import iter_history_pages
+from services.metrics import Counter
+
+EXPORT_COLUMNS = "id, user_id, activity_id, activity_name, rating, created_at"
+CSV_HEADER = ["id", "user_id", "activity_id", "activity_name", "rating", "created_at"] + VECTOR_LABELS
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORTED_ROWS = Counter(
+    "mynextdate_export_rows_total", "Date history rows streamed by exports.", ("scope", "format")
+)
+
+
+def _enrich(page: list[dict]) -> list[dict]:
+    vectors = get_activity_vectors(list({d["activity_id"] for d in page if d["activity_id"] != 0}))
+    custom = get_custom_date_vectors([d["id"] for d in page if d["activity_id"] == 0])
+    rows = []
+    for d in page:
+        if d["activity_id"] == 0:
+            name, vector = d.get("activity_name"), custom.get(d["id"])
+        else:
+            payload = get_activity_payload(d["activity_id"]) or {}
+            name, vector = payload.get("name") or d.get("activity_name"), vectors.get(d["activity_id"])
+        rows.append({**d, "activity_name": name, "vector": vector})
+    return rows
+
+
+def export_rows(sb, user_id: str | None) -> Iterator[list[dict]]:
+    """Enriched history pages for one user, or for everyone when user_id is None."""
+    for page in iter_history_pages(sb, user_id, EXPORT_COLUMNS):
+        yield _enrich(page)
+
+
+def ndjson_stream(sb, user_id: str | None, header: dict | None = None) -> Iterator[str]:
+    """One JSON object per line: an optional header record, then {"type": "date", ...} per row."""
+    scope = "user" if user_id else "all"
+    if header is not None:
+        yield json.dumps(header) + "\n"
+    for rows in export_rows(sb, user_id):
+        yield "".join(json.dumps({"type": "date", **row}) + "\n" for row in rows)
+        EXPORTED_ROWS.inc(scope, "ndjson", amount=len(rows))
+
+
+def csv_stream(sb, user_id: str | None) -> Iterator[str]:
+    """CSV with a header row; the vector is spread over one column per dimension."""
+    scope = "user" if user_id else "all"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for rows in export_rows(sb, user_id):
+        for row in rows:
+            writer.writerow([row.get(c) for c in CSV_HEADER[:6]] + (row["vector"] or [""] * len(VECTOR_LABELS)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        EXPORTED_ROWS.inc(scope, "csv", amount=len(rows))
+    if buffer.tell():
+        yield buffer.getvalue()
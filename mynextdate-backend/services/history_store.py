@@ -0,0 +1,92 @@
+"""Column-projecting, keyset-paginated reads of date_history.
+
+Every read orders newest first on (created_at, id) and continues after the
+last row seen instead of using an OFFSET, so each page costs the same however
+deep into a history it is. Callers select only the columns they use. With the
+index below, a page is a single index range scan:
+
+  CREATE INDEX IF NOT EXISTS date_history_user_created_id_idx
+    ON date_history (user_id, created_at DESC, id DESC);
+
+Cursors are opaque to clients: URL-safe base64 of the last row's
+[created_at, id].
+"""
+import base64
+import json
+import re
+from typing import Iterator
+from services.circuit_breaker import guarded
+from services.tracing import span
+
+# What each internal use needs. Every set includes id and created_at for the cursor.
+LIST_COLUMNS = "id, activity_id, activity_name, rating, created_at"
+PREFERENCE_COLUMNS = "id, activity_id, rating, created_at"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Rows per request when reading a whole history (PostgREST caps responses at 1000 by default)
+SCAN_BATCH = 1000
+
+# Cursor values are interpolated into a PostgREST filter, so only timestamp/uuid characters pass
+_TIMESTAMP_RE = re.compile(r"^[0-9T:.+\- Z]+$")
+_ID_RE = re.compile(r"^[0-9A-Za-z-]+$")
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) of the row a page continues after. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, date_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not (isinstance(created_at, str) and _TIMESTAMP_RE.match(created_at)
+            and isinstance(date_id, str) and _ID_RE.match(date_id)):
+        raise ValueError("Invalid cursor")
+    return created_at, date_id
+
+
+def history_page(
+    sb,
+    user_id: str | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    columns: str = LIST_COLUMNS,
+) -> tuple[list[dict], str | None]:
+    """One page of a user's history (everyone's if user_id is None), newest first. Returns (rows, next_cursor or None)."""
+    limit = max(1, min(limit, SCAN_BATCH))
+    query = sb.table("date_history").select(columns)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    if cursor:
+        created_at, date_id = decode_cursor(cursor)
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{date_id})')
+    # One extra row tells whether another page exists
+    with guarded("supabase", "date_history.select"):
+        result = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute()
+    rows = result.data or []
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def iter_history_pages(sb, user_id: str | None, columns: str = LIST_COLUMNS, batch: int = SCAN_BATCH) -> Iterator[list[dict]]:
+    """Keyset batches of a user's whole history (everyone's if user_id is None), newest first."""
+    cursor = None
+    while True:
+        page, cursor = history_page(sb, user_id, batch, cursor, columns)
+        if page:
+            yield page
+        if cursor is None:
+            return
+
+
+def load_user_history(sb, user_id: str, columns: str = PREFERENCE_COLUMNS) -> list[dict]:
+    """A user's whole history, newest first, read in keyset batches."""
+    with span("db_fetch"):
+        return [row for page in iter_history_pages(sb, user_id, columns) for row in page]
@@ -0,0 +1,341 @@
+"""Bulk date import from JSON or CSV rows.
+
+Each row names an activity by `activity_id` or by free text (`activity`,
+`name` or `description`), with an optional `rating` (0-5) and `date`.
+Rows are resolved in three passes so an import of N rows costs far fewer
+than N LLM calls and N inserts:
+
+1. ids and names that exactly match a catalog activity resolve locally;
+2. the remaining distinct texts are vectorized IMPORT_LLM_BATCH at a time
+   in one LLM call per batch and matched like /api/dates/describe (falling
+   back to BM25 if a batch fails);
+3. resolved rows are inserted IMPORT_INSERT_BATCH at a time.
+
+Imports run as background tasks on the worker that accepted the upload, at
+most IMPORT_MAX_CONCURRENT at a time and IMPORT_MAX_QUEUED waiting. Progress
+is written to the `import_jobs` table in the job queue's SQLite file, so any
+worker on the host can answer a poll by id.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from config import (
+    IMPORT_MAX_ROWS, IMPORT_LLM_BATCH, IMPORT_LLM_TIMEOUT_SECONDS, IMPORT_INSERT_BATCH, IMPORT_MAX_CONCURRENT,
+    IMPORT_MAX_QUEUED, JOB_QUEUE_PATH,
+)
+from services.actian_service import find_activity_by_name, get_activity_payload, search_similar, search_lexical, search_custom_activities
+from services.invalidation import publish_event
+from services.metrics import Counter
+from services.circuit_breaker import CircuitOpenError, guarded
+from services.text_to_vector import texts_to_vectors, LEXICAL_FALLBACKS
+
+IMPORTED_ROWS = Counter(
+    "mynextdate_import_rows_total", "Bulk-imported date rows by how they were resolved.", ("resolution",)
+)
+
+TEXT_FIELDS = ("activity", "name", "description")
+JOBS_MAX = 1000
+
+
+class ImportFormatError(ValueError):
+    """The upload as a whole can't be imported (bad format or too many rows)."""
+
+
+class ImportBusyError(RuntimeError):
+    """This worker already has IMPORT_MAX_QUEUED imports waiting."""
+
+
+@dataclass
+class ImportRow:
+    index: int
+    activity_id: int | None
+    text: str | None
+    rating: float | None
+    created_at: str | None
+
+
+@dataclass
+class ImportJob:
+    job_id: str
+    user_id: str
+    total: int  # all uploaded rows, including ones that failed to parse
+    status: str = "queued"  # queued, matching, vectorizing, inserting, done, failed
+    resolved: int = 0  # rows whose activity lookup has finished, matched or not
+    inserted: int = 0
+    resolutions: dict = field(default_factory=lambda: {"id": 0, "name": 0, "vector": 0, "lexical": 0})
+    errors: list = field(default_factory=list)
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    finished_at: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "resolved": self.resolved,
+            "inserted": self.inserted,
+            "failed": len(self.errors),
+            "resolutions": dict(self.resolutions),
+            "errors": self.errors[:100],
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_jobs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS import_jobs_created_idx ON import_jobs (created_at);
+"""
+
+_local = threading.local()
+
+# Running and waiting import tasks. Held here so they aren't garbage-collected mid-run.
+_tasks: set[asyncio.Task] = set()
+_slots: asyncio.Semaphore | None = None
+
+
+def _db() -> sqlite3.Connection:
+    """Per-thread connection to the job queue's SQLite file."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOB_QUEUE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOB_QUEUE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _save(job_id: str, user_id: str, state: dict, created: bool = False):
+    db = _db()
+    now = time.time()
+    if created:
+        db.execute(
+            "INSERT INTO import_jobs (job_id, user_id, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, user_id, json.dumps(state), now, now),
+        )
+        db.execute(
+            "DELETE FROM import_jobs WHERE job_id NOT IN (SELECT job_id FROM import_jobs ORDER BY created_at DESC LIMIT ?)",
+            (JOBS_MAX,),
+        )
+    else:
+        db.execute("UPDATE import_jobs SET state = ?, updated_at = ? WHERE job_id = ?", (json.dumps(state), now, job_id))
+
+
+async def _checkpoint(job: ImportJob):
+    """Persist the job's progress so polls on any worker see it."""
+    try:
+        await asyncio.to_thread(_save, job.job_id, job.user_id, job.to_dict())
+    except sqlite3.Error as e:
+        print(f"Import {job.job_id} progress write failed (non-fatal): {e}")
+
+
+def _parse_date(value: str) -> str:
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.isoformat()
+
+
+def _to_row(index: int, raw: dict, errors: list) -> ImportRow | None:
+    raw = {str(k).strip().lower(): v for k, v in raw.items() if k is not None}
+    try:
+        activity_id = raw.get("activity_id")
+        activity_id = int(activity_id) if activity_id not in (None, "") else None
+        text = next((str(raw[f]).strip() for f in TEXT_FIELDS if raw.get(f) not in (None, "")), None)
+        if activity_id is None and not text:
+            raise ValueError("Row needs an activity_id or an activity description")
+        rating = raw.get("rating")
+        rating = float(rating) if rating not in (None, "") else None
+        if rating is not None and not 0 <= rating <= 5:
+            raise ValueError("Rating must be 0-5")
+        created_at = _parse_date(str(raw["date"])) if raw.get("date") not in (None, "") else None
+    except (TypeError, ValueError) as e:
+        errors.append({"row": index, "detail": str(e)})
+        return None
+    return ImportRow(index, activity_id, text, rating, created_at)
+
+
+def parse_upload(body: bytes, content_type: str) -> tuple[list[ImportRow], list[dict]]:
+    """Rows from a CSV upload (text/csv, header row required) or JSON ({"rows": [...]} or a bare list)."""
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFormatError("Upload must be UTF-8")
+    if "csv" in content_type:
+        raw_rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            raise ImportFormatError("Upload must be JSON or CSV")
+        raw_rows = data.get("rows") if isinstance(data, dict) else data
+        if not isinstance(raw_rows, list) or not all(isinstance(r, dict) for r in raw_rows):
+            raise ImportFormatError('JSON uploads must be a list of objects or {"rows": [...]}')
+    if not raw_rows:
+        raise ImportFormatError("No rows to import")
+    if len(raw_rows) > IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"Too many rows ({len(raw_rows)}); the limit is {IMPORT_MAX_ROWS}")
+
+    errors: list[dict] = []
+    rows = [row for i, raw in enumerate(raw_rows, 1) if (row := _to_row(i, raw, errors)) is not None]
+    return rows, errors
+
+
+def create_job(user_id: str, total: int, errors: list[dict]) -> ImportJob:
+    """Record a new job. Blocking; run in a thread."""
+    # Rows that failed to parse are already finished
+    job = ImportJob(job_id=secrets.token_urlsafe(12), user_id=user_id, total=total, resolved=len(errors), errors=list(errors))
+    _save(job.job_id, user_id, job.to_dict(), created=True)
+    return job
+
+
+def get_job(job_id: str, user_id: str) -> dict | None:
+    """The job's last recorded progress, from whichever worker runs it. Blocking; run in a thread."""
+    row = _db().execute("SELECT state FROM import_jobs WHERE job_id = ? AND user_id = ?", (job_id, user_id)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def start_import(job: ImportJob, rows: list[ImportRow], sb):
+    """Run the import in the background on this worker. Raises ImportBusyError when too many are waiting."""
+    global _slots
+    if len(_tasks) >= IMPORT_MAX_CONCURRENT + IMPORT_MAX_QUEUED:
+        raise ImportBusyError("Too many imports in progress, try again shortly")
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMPORT_MAX_CONCURRENT)
+
+    async def run():
+        async with _slots:
+            await run_import(job, rows, sb)
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _best_match(vector: list[float], text: str, sb) -> dict | None:
+    results = search_similar(vector, top_k=1, text_query=text)
+    results += search_custom_activities(vector, sb, top_k=1, text_query=text)
+    return max(results, key=lambda r: r["score"], default=None)
+
+
+async def _vectorize(texts: list[str], row_counts: dict[str, int], sb, job: ImportJob) -> dict[str, tuple[dict, str]]:
+    """Match each distinct text to an activity. Returns {lowercased text: (match, resolution)}."""
+    matches: dict[str, tuple[dict, str]] = {}
+    for start in range(0, len(texts), IMPORT_LLM_BATCH):
+        batch = texts[start:start + IMPORT_LLM_BATCH]
+        try:
+            vectors = await asyncio.wait_for(texts_to_vectors(batch), IMPORT_LLM_TIMEOUT_SECONDS)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "circuit_open" if isinstance(e, CircuitOpenError) else "error"
+            LEXICAL_FALLBACKS.inc(reason)
+            print(f"Import vectorization batch failed, matching lexically: {e!r}")
+            vectors = [None] * len(batch)
+        for text, vector in zip(batch, vectors):
+            if vector is not None:
+                match = await asyncio.to_thread(_best_match, vector, text, sb)
+                resolution = "vector"
+            else:
+                lexical = search_lexical(text, top_k=1)
+                match, resolution = (lexical[0] if lexical else None), "lexical"
+            if match is not None:
+                matches[text.lower()] = (match, resolution)
+        job.resolved += sum(row_counts[text.lower()] for text in batch)
+        await _checkpoint(job)
+    return matches
+
+
+async def run_import(job: ImportJob, rows: list[ImportRow], sb):
+    """Resolve, vectorize and insert an import's rows, updating `job` as it goes."""
+    try:
+        job.status = "matching"
+        await _checkpoint(job)
+        resolved: list[tuple[ImportRow, dict, str]] = []
+        pending: list[ImportRow] = []
+        for row in rows:
+            if row.activity_id is not None:
+                payload = get_activity_payload(row.activity_id)
+                if payload is None:
+                    job.errors.append({"row": row.index, "detail": f"Unknown activity_id {row.activity_id}"})
+                else:
+                    resolved.append((row, {"id": row.activity_id, "name": payload.get("name", "")}, "id"))
+                continue
+            match = find_activity_by_name(row.text)
+            if match is not None:
+                resolved.append((row, match, "name"))
+            else:
+                pending.append(row)
+        job.resolved += len(rows) - len(pending)
+
+        if pending:
+            job.status = "vectorizing"
+            await _checkpoint(job)
+            texts = list({row.text.lower(): row.text for row in pending}.values())
+            row_counts: dict[str, int] = {}
+            for row in pending:
+                row_counts[row.text.lower()] = row_counts.get(row.text.lower(), 0) + 1
+            matches = await _vectorize(texts, row_counts, sb, job)
+            for row in pending:
+                hit = matches.get(row.text.lower())
+                if hit is None:
+                    job.errors.append({"row": row.index, "detail": "No matching activity found"})
+                else:
+                    resolved.append((row, hit[0], hit[1]))
+
+        job.status = "inserting"
+        await _checkpoint(job)
+        resolved.sort(key=lambda item: item[0].index)
+        for start in range(0, len(resolved), IMPORT_INSERT_BATCH):
+            chunk = resolved[start:start + IMPORT_INSERT_BATCH]
+            records = []
+            for row, match, _ in chunk:
+                record = {
+                    "user_id": job.user_id,
+                    "activity_id": match["id"],
+                    "activity_name": match["name"],
+                    "rating": row.rating,
+                }
+                if row.created_at:
+                    record["created_at"] = row.created_at
+                records.append(record)
+            try:
+                # Only dated rows carry created_at; default_to_null=False lets the others take now()
+                with guarded("supabase", "date_history.insert"):
+                    await asyncio.to_thread(
+                        lambda: sb.table("date_history").insert(records, default_to_null=False).execute()
+                    )
+            except Exception as e:
+                job.errors.extend({"row": row.index, "detail": f"Insert failed: {e}"} for row, _, _ in chunk)
+                await _checkpoint(job)
+                continue
+            job.inserted += len(chunk)
+            for _, _, resolution in chunk:
+                job.resolutions[resolution] += 1
+                IMPORTED_ROWS.inc(resolution)
+            await _checkpoint(job)
+
+        job.status = "done"
+    except Exception as e:
+        print(f"Import {job.job_id} failed: {e}")
+        job.status = "failed"
+        job.errors.append({"row": None, "detail": str(e)})
+    finally:
+        job.finished_at = datetime.now(timezone.utc).isoformat()
+        await _checkpoint(job)
+        if job.inserted:
+            # One invalidation for the whole import; aggregates rebuild from history
+            publish_event("history_changed", user_id=job.user_id)
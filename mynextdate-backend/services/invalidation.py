@@ -0,0 +1,329 @@
+"""Cross-worker cache invalidation bus.
+
+Each worker keeps per-process caches (custom date vectors, user locations,
+mapped catalog generations). A write path calls `publish_event(type, **data)`.
+The event is applied to this worker's caches at once and broadcast through a
+backend, whose listener thread applies it in every other worker.
+
+Backends (INVALIDATION_BACKEND):
+    local     in-process only, the default for a single worker
+    file      JSON lines file polled by each worker, rotated in segments past
+              INVALIDATION_FILE_MAX_BYTES; for tests and single-host setups
+    postgres  LISTEN/NOTIFY on DATABASE_URL (Supabase's Postgres), needs psycopg or psycopg2
+
+With more than one worker (WEB_CONCURRENCY) the per-worker caches built on
+these events would drift apart for good without a bus, so the bus step fails
+instead of falling back to local and the worker never reports ready.
+"""
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable
+from config import (
+    INVALIDATION_BACKEND, INVALIDATION_FILE, INVALIDATION_FILE_MAX_BYTES, INVALIDATION_CHANNEL, DATABASE_URL,
+    WEB_CONCURRENCY,
+)
+from services.metrics import Counter
+
+EVENTS_PUBLISHED = Counter(
+    "mynextdate_invalidation_events_published_total", "Invalidation events published by this worker.", ("type",)
+)
+EVENTS_RECEIVED = Counter(
+    "mynextdate_invalidation_events_received_total", "Invalidation events received from other workers.", ("type",)
+)
+BUS_ERRORS = Counter(
+    "mynextdate_invalidation_errors_total", "Invalidation bus publish/listen failures.", ("backend", "stage")
+)
+
+# Identifies this worker so it can skip its own events when they come back
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_handlers: dict[str, list[Callable[[dict], None]]] = {}
+_bus = None
+
+
+def subscribe(event_type: str, handler: Callable[[dict], None]):
+    """Register a handler that applies `event_type` to this worker's caches."""
+    _handlers.setdefault(event_type, []).append(handler)
+
+
+def _dispatch(event: dict):
+    for handler in _handlers.get(event.get("type", ""), []):
+        try:
+            handler(event)
+        except Exception as e:
+            print(f"Invalidation handler for {event.get('type')} failed: {e}")
+
+
+def _receive(event: dict):
+    if event.get("origin") == WORKER_ID:
+        return
+    EVENTS_RECEIVED.inc(event.get("type", ""))
+    _dispatch(event)
+
+
+def publish_event(event_type: str, **data):
+    """Apply an event locally and broadcast it to the other workers. Never raises."""
+    event = {"type": event_type, "origin": WORKER_ID, "id": uuid.uuid4().hex, **data}
+    _dispatch(event)
+    EVENTS_PUBLISHED.inc(event_type)
+    bus = _bus
+    if bus is None:
+        return
+    try:
+        bus.publish(event)
+    except Exception as e:
+        BUS_ERRORS.inc(bus.name, "publish")
+        print(f"Invalidation publish failed (non-fatal): {e}")
+
+
+class FileBus:
+    """JSON lines file shared by workers on one host; each worker tails it.
+
+    Each file starts with a {"segment": n} header line. Past `max_bytes` the
+    publisher renames the file to `<path>.<n>`, starts segment n + 1 and
+    unlinks segments older than KEEP_SEGMENTS, so the file's size stays
+    bounded (it lives in /dev/shm by default). A listener finishes the file it
+    has open, then follows the segments in order, so it only loses events if
+    it falls more than KEEP_SEGMENTS rotations behind.
+    """
+
+    name = "file"
+    KEEP_SEGMENTS = 2
+
+    def __init__(self, path: str, max_bytes: int = INVALIDATION_FILE_MAX_BYTES, poll_interval: float = 0.2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def _locked(self):
+        # A separate lock file: the data file itself is renamed on rotation
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _new_segment(self, segment: int):
+        with open(self.path, "w") as f:
+            f.write(json.dumps({"segment": segment}) + "\n")
+
+    def _ensure_file(self):
+        """Create segment 0 if there's no file yet. Call with the lock held."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self._new_segment(0)
+
+    def publish(self, event: dict):
+        with self._locked():
+            self._ensure_file()
+            if os.path.getsize(self.path) >= self.max_bytes:
+                with open(self.path, "rb") as f:
+                    segment = _segment_of(f)
+                os.replace(self.path, f"{self.path}.{segment}")
+                try:
+                    os.remove(f"{self.path}.{segment - self.KEEP_SEGMENTS}")
+                except FileNotFoundError:
+                    pass
+                self._new_segment(segment + 1)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._locked():
+            self._ensure_file()
+            f = open(self.path, "rb")
+            segment = _segment_of(f)
+            # Only events published after this worker started matter
+            f.seek(0, os.SEEK_END)
+        self._thread = threading.Thread(target=self._listen, args=(f, segment), name="invalidation-file", daemon=True)
+        self._thread.start()
+
+    def _next_file(self, segment: int):
+        """Open the segment after `segment`: already rotated, or else the current file."""
+        try:
+            return open(f"{self.path}.{segment + 1}", "rb")
+        except FileNotFoundError:
+            return open(self.path, "rb")
+
+    def _listen(self, f, segment: int):
+        buffer = b""
+        try:
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    chunk = f.read()
+                    try:
+                        rotated = os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino
+                    except FileNotFoundError:
+                        rotated = False
+                    if rotated:
+                        # Nothing is appended to a file once it's renamed: finish it, then move on
+                        chunk += f.read()
+                        f.close()
+                        f = self._next_file(segment)
+                        next_segment = _segment_of(f)
+                        if next_segment != segment + 1:
+                            BUS_ERRORS.inc(self.name, "gap")
+                            print(f"Invalidation listener fell behind, skipped to segment {next_segment}.")
+                        segment = next_segment
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            _receive(json.loads(line))
+                except Exception as e:
+                    BUS_ERRORS.inc(self.name, "listen")
+                    print(f"Invalidation file listener error: {e}")
+        finally:
+            f.close()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+
+def _segment_of(f) -> int:
+    """Read a bus file's {"segment": n} header, leaving `f` positioned after it."""
+    f.seek(0)
+    try:
+        return int(json.loads(f.readline())["segment"])
+    except (ValueError, KeyError, TypeError):
+        return 0
+
+
+class PostgresBus:
+    """LISTEN/NOTIFY on a Postgres channel. Reconnects the listener after errors."""
+
+    name = "postgres"
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._driver = _import_pg_driver()
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _connect(self):
+        conn = self._driver.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def publish(self, event: dict):
+        payload = json.dumps(event, separators=(",", ":"))
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cur:
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except Exception:
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    def start(self):
+        self._thread = threading.Thread(target=self._listen, name="invalidation-postgres", daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        import select
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    for notify in self._drain(conn):
+                        _receive(json.loads(notify.payload))
+            except Exception as e:
+                BUS_ERRORS.inc(self.name, "listen")
+                print(f"Invalidation listener error, reconnecting: {e}")
+                self._stop.wait(2.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _drain(self, conn) -> list:
+        if hasattr(conn, "poll"):
+            # psycopg2
+            conn.poll()
+            notifies, conn.notifies[:] = list(conn.notifies), []
+            return notifies
+        # psycopg 3
+        return list(conn.notifies(timeout=0))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=3)
+
+
+def _import_pg_driver():
+    try:
+        import psycopg
+        return psycopg
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+        return psycopg2
+    except ImportError:
+        raise RuntimeError("INVALIDATION_BACKEND=postgres needs psycopg or psycopg2 installed")
+
+
+def start_bus():
+    """Start the configured backend's listener.
+
+    A single worker falls back to local-only on failure. With several workers
+    (WEB_CONCURRENCY > 1) a local or failed bus raises instead.
+    """
+    global _bus
+    if _bus is not None:
+        return
+    if INVALIDATION_BACKEND == "local":
+        if WEB_CONCURRENCY > 1:
+            raise RuntimeError(
+                f"INVALIDATION_BACKEND=local with WEB_CONCURRENCY={WEB_CONCURRENCY}: worker caches would diverge; "
+                "use the file or postgres backend"
+            )
+        return
+    try:
+        if INVALIDATION_BACKEND == "file":
+            bus = FileBus(INVALIDATION_FILE)
+        elif INVALIDATION_BACKEND == "postgres":
+            bus = PostgresBus(DATABASE_URL, INVALIDATION_CHANNEL)
+        else:
+            raise ValueError(f"unknown INVALIDATION_BACKEND {INVALIDATION_BACKEND!r}")
+        bus.start()
+        _bus = bus
+        print(f"Invalidation bus started ({bus.name}).")
+    except Exception as e:
+        BUS_ERRORS.inc(INVALIDATION_BACKEND, "start")
+        if WEB_CONCURRENCY > 1:
+            raise RuntimeError(f"Invalidation bus unavailable with {WEB_CONCURRENCY} workers: {e}") from e
+        print(f"Warning: invalidation bus unavailable, caches are worker-local: {e}")
+
+
+def stop_bus():
+    global _bus
+    if _bus is not None:
+        _bus.stop()
+        _bus = None
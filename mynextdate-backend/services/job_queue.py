@@ -0,0 +1,253 @@
+"""Durable background jobs backed by SQLite.
+
+Jobs are rows in JOB_QUEUE_PATH, so pending work survives a restart and every
+worker on the host shares one queue. A job kind is registered with two steps:
+
+- `prepare(payload)` (async) runs per job, at most JOB_WORKERS at a time
+  across the worker's pool (e.g. one LLM call);
+- `commit(results)` (blocking, optional) runs once per drain cycle with the
+  results of every job of that kind that prepared successfully, so writes are
+  batched (e.g. one catalog rewrite for all newly seeded activities).
+
+Each job has a dedupe key (kind, key). Enqueueing a key that already exists,
+whether pending, done or dead, is a no-op. Failures retry with exponential
+backoff (JOB_RETRY_BASE_SECONDS * 2^attempt) and after JOB_MAX_ATTEMPTS the
+job moves to the dead-letter list, where an admin can requeue it. A job
+claimed by a worker that dies is reclaimed after JOB_LEASE_SECONDS. A reclaim
+counts as a failed attempt, so a job that keeps crashing or hanging its worker
+also ends up in dead letters.
+
+`enqueue` and the other public helpers block on SQLite; call them from async
+code with asyncio.to_thread.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from config import JOB_QUEUE_PATH, JOB_WORKERS, JOB_BATCH_SIZE, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECONDS, JOB_LEASE_SECONDS, JOB_POLL_SECONDS, JOB_COALESCE_SECONDS
+from services.metrics import Counter, Gauge
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, dedupe_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (status, next_run_at);
+"""
+
+JOBS_PROCESSED = Counter(
+    "mynextdate_jobs_processed_total", "Background job attempts by kind and outcome (ok, retry, dead).", ("kind", "result")
+)
+
+
+@dataclass
+class JobKind:
+    prepare: Callable[[dict], Awaitable[object]]
+    commit: Callable[[list], None] | None = None
+
+
+_kinds: dict[str, JobKind] = {}
+_local = threading.local()
+_wakeup: asyncio.Event | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _db() -> sqlite3.Connection:
+    """Per-thread connection (sqlite3 connections can't be shared across threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOB_QUEUE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOB_QUEUE_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _depths() -> dict[tuple, float]:
+    try:
+        rows = _db().execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status").fetchall()
+    except sqlite3.Error:
+        return {}
+    return {(r["kind"], r["status"]): r["n"] for r in rows}
+
+
+JOB_QUEUE_DEPTH = Gauge("mynextdate_job_queue_depth", "Jobs in the durable queue by kind and status.", ("kind", "status"), fn=_depths)
+
+
+def register(kind: str, prepare: Callable[[dict], Awaitable[object]], commit: Callable[[list], None] | None = None):
+    _kinds[kind] = JobKind(prepare, commit)
+
+
+def enqueue(kind: str, payload: dict, dedupe_key: str) -> bool:
+    """Add a job unless (kind, dedupe_key) was already queued. Returns True if it was added."""
+    now = time.time()
+    cursor = _db().execute(
+        "INSERT OR IGNORE INTO jobs (kind, dedupe_key, payload, next_run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, dedupe_key, json.dumps(payload), now, now, now),
+    )
+    if cursor.rowcount and _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return bool(cursor.rowcount)
+
+
+def _claim(limit: int) -> list[dict]:
+    """Atomically mark up to `limit` ready jobs as running (or reclaim expired leases).
+
+    Reclaiming an expired lease uses up an attempt; a job out of attempts goes to dead letters instead.
+    """
+    db = _db()
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        rows = db.execute(
+            "SELECT * FROM jobs WHERE (status = 'pending' AND next_run_at <= ?) OR (status = 'running' AND updated_at < ?) "
+            "ORDER BY next_run_at LIMIT ?",
+            (now, now - JOB_LEASE_SECONDS, limit),
+        ).fetchall()
+        claimed, dead = [], []
+        for row in rows:
+            job = dict(row)
+            if job["status"] == "running":
+                job["attempts"] += 1
+                job["last_error"] = f"lease expired after {JOB_LEASE_SECONDS:.0f}s (worker crashed or hung)"
+                if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                    dead.append(job)
+                    continue
+            job["status"] = "running"
+            claimed.append(job)
+        db.executemany(
+            "UPDATE jobs SET status = 'running', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            [(j["attempts"], j["last_error"], now, j["id"]) for j in claimed],
+        )
+        db.executemany(
+            "UPDATE jobs SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            [(j["attempts"], j["last_error"], now, j["id"]) for j in dead],
+        )
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    for job in dead:
+        JOBS_PROCESSED.inc(job["kind"], "dead")
+        print(f"Job {job['kind']}:{job['dedupe_key']} moved to dead letters after {job['attempts']} expired leases or attempts.")
+    return claimed
+
+
+def _finish(job_id: int):
+    _db().execute("UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+
+def _fail(job: dict, error: Exception):
+    attempts = job["attempts"] + 1
+    now = time.time()
+    if attempts >= JOB_MAX_ATTEMPTS:
+        status, next_run_at, result = "dead", now, "dead"
+        print(f"Job {job['kind']}:{job['dedupe_key']} moved to dead letters after {attempts} attempts: {error}")
+    else:
+        status, next_run_at, result = "pending", now + JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), "retry"
+    _db().execute(
+        "UPDATE jobs SET status = ?, attempts = ?, next_run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+        (status, attempts, next_run_at, str(error)[:500], now, job["id"]),
+    )
+    JOBS_PROCESSED.inc(job["kind"], result)
+
+
+async def drain_once() -> int:
+    """Claim a batch, prepare its jobs on the bounded pool and commit each kind once. Returns jobs claimed."""
+    jobs = await asyncio.to_thread(_claim, JOB_BATCH_SIZE)
+    if not jobs:
+        return 0
+    semaphore = asyncio.Semaphore(JOB_WORKERS)
+
+    async def prepare(job):
+        kind = _kinds.get(job["kind"])
+        if kind is None:
+            raise RuntimeError(f"No handler registered for job kind {job['kind']!r}")
+        async with semaphore:
+            return await kind.prepare(json.loads(job["payload"]))
+
+    outcomes = await asyncio.gather(*(prepare(job) for job in jobs), return_exceptions=True)
+
+    prepared: dict[str, list[tuple[dict, object]]] = {}
+    for job, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            await asyncio.to_thread(_fail, job, outcome)
+        else:
+            prepared.setdefault(job["kind"], []).append((job, outcome))
+
+    for kind_name, items in prepared.items():
+        commit = _kinds[kind_name].commit
+        try:
+            if commit is not None:
+                await asyncio.to_thread(commit, [result for _, result in items])
+        except Exception as e:
+            for job, _ in items:
+                await asyncio.to_thread(_fail, job, e)
+            continue
+        for job, _ in items:
+            await asyncio.to_thread(_finish, job["id"])
+            JOBS_PROCESSED.inc(kind_name, "ok")
+    return len(jobs)
+
+
+async def run_job_queue():
+    """Drain the queue until cancelled: shortly after an enqueue, else every JOB_POLL_SECONDS."""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            if await drain_once():
+                continue
+        except Exception as e:
+            print(f"Job queue drain failed: {e}")
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+            # Let a burst of enqueues land so they are prepared and committed together
+            await asyncio.sleep(JOB_COALESCE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def stats() -> dict:
+    counts: dict[str, dict[str, int]] = {}
+    for (kind, status), n in _depths().items():
+        counts.setdefault(kind, {})[status] = int(n)
+    return counts
+
+
+def dead_letters(limit: int = 100) -> list[dict]:
+    rows = _db().execute(
+        "SELECT id, kind, dedupe_key, payload, attempts, last_error, updated_at FROM jobs WHERE status = 'dead' "
+        "ORDER BY updated_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [{**dict(r), "payload": json.loads(r["payload"])} for r in rows]
+
+
+def requeue(job_id: int) -> bool:
+    """Move a dead job back to pending with a fresh attempt budget."""
+    now = time.time()
+    cursor = _db().execute(
+        "UPDATE jobs SET status = 'pending', attempts = 0, next_run_at = ?, updated_at = ? WHERE id = ? AND status = 'dead'",
+        (now, now, job_id),
+    )
+    if cursor.rowcount and _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return bool(cursor.rowcount)
@@ -0,0 +1,79 @@
+"""Persisted LLM text→vector outputs, keyed by normalized text.
+
+Every vector Groq returns is written to LLM_CACHE_PATH (SQLite, shared by the
+workers on one host). A repeated description is answered from here without an
+LLM call, and the rows are training data for the local regressor
+(scripts/train_local_vectorizer.py). Only LLM outputs are stored, never local
+predictions, so the model is never trained on its own guesses.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from config import LLM_CACHE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS text_vectors (
+    text_key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    vector TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    """Per-thread connection (sqlite3 connections can't be shared across threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def text_key(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def get(text: str) -> list[float] | None:
+    key = text_key(text)
+    if not key:
+        return None
+    try:
+        row = _db().execute("SELECT vector FROM text_vectors WHERE text_key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"LLM cache read failed: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def put_many(items: list[tuple[str, list[float]]]):
+    """Store (text, LLM vector) pairs; a later output for the same text replaces the earlier one."""
+    now = time.time()
+    rows = [(key, text, json.dumps(vector), now) for text, vector in items if (key := text_key(text))]
+    if not rows:
+        return
+    try:
+        _db().executemany("INSERT OR REPLACE INTO text_vectors (text_key, text, vector, created_at) VALUES (?, ?, ?, ?)", rows)
+    except sqlite3.Error as e:
+        print(f"LLM cache write failed: {e}")
+
+
+def put(text: str, vector: list[float]):
+    put_many([(text, vector)])
+
+
+def load_all() -> list[tuple[str, list[float]]]:
+    """Every cached (text, vector) pair, oldest first."""
+    if not os.path.exists(LLM_CACHE_PATH):
+        return []
+    rows = _db().execute("SELECT text, vector FROM text_vectors ORDER BY created_at").fetchall()
+    return [(text, json.loads(vector)) for text, vector in rows]
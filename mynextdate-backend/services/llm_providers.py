@@ -0,0 +1,197 @@
+"""LLM providers behind one interface, with hedged calls across them.
+
+`complete(prompt, temperature, operation)` sends the prompt to the primary
+provider (the first configured entry of LLM_PROVIDERS). If it hasn't answered
+within the hedge delay, or fails, the same prompt goes to the next provider and
+whichever answers first wins; the other call is cancelled.
+
+The hedge delay is the primary's recent LLM_HEDGE_QUANTILE latency, clamped
+to [LLM_HEDGE_MIN_DELAY_SECONDS, LLM_HEDGE_MAX_DELAY_SECONDS], and
+LLM_HEDGE_DEFAULT_DELAY_SECONDS until enough calls have been timed. So only
+about 1 in 10 calls is hedged while the primary behaves, and more when it
+slows down. A call cancelled because the other provider won counts its time
+so far as a latency sample (a lower bound), so a provider that keeps losing
+doesn't look fast.
+
+`FakeProvider` answers with scripted replies and delays, for exercising the
+hedging without network access:
+
+    set_providers([FakeProvider("slow", delays=[3.0]), FakeProvider("fast", delays=[0.05])])
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from config import (
+    GROQ_API_KEY, GEMINI_API_KEY, GEMINI_MODEL, LLM_PROVIDERS, LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_MIN_DELAY_SECONDS, LLM_HEDGE_MAX_DELAY_SECONDS, LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+)
+from services.clients import get_groq, get_gemini
+from services.metrics import Counter
+from services.circuit_breaker import guarded
+
+LLM_CALLS = Counter(
+    "mynextdate_llm_calls_total",
+    "LLM completions by operation, answering provider and whether the call was hedged.",
+    ("operation", "provider", "hedged"),
+)
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Sliding window of a provider's recent call latencies."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMProvider:
+    name = ""
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+
+    async def complete(self, prompt: str, temperature: float, operation: str) -> str:
+        raise NotImplementedError
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+    model = "llama-3.1-8b-instant"
+
+    async def complete(self, prompt: str, temperature: float, operation: str) -> str:
+        # The Groq SDK call blocks; run it off the event loop so callers can time it out
+        with guarded("groq", operation):
+            response = await asyncio.to_thread(
+                get_groq().chat.completions.create,
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+        return response.choices[0].message.content
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    async def complete(self, prompt: str, temperature: float, operation: str) -> str:
+        from google.genai import types
+        with guarded("gemini", operation):
+            response = await get_gemini().aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(temperature=temperature),
+            )
+        return response.text
+
+
+class FakeProvider(LLMProvider):
+    """Answers after scripted delays. `reply` is a string or a function of the prompt; delays cycle."""
+
+    def __init__(self, name: str, reply="[0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5]", delays=(0.0,), error: Exception | None = None):
+        super().__init__()
+        self.name = name
+        self.reply = reply
+        self.delays = list(delays)
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, prompt: str, temperature: float, operation: str) -> str:
+        delay = self.delays[self.calls % len(self.delays)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+
+_PROVIDERS = {"groq": (GroqProvider, GROQ_API_KEY), "gemini": (GeminiProvider, GEMINI_API_KEY)}
+_providers: list[LLMProvider] | None = None
+
+
+def get_providers() -> list[LLMProvider]:
+    """Configured providers with an API key, in LLM_PROVIDERS order."""
+    global _providers
+    if _providers is None:
+        providers = []
+        for name in LLM_PROVIDERS:
+            if name not in _PROVIDERS:
+                print(f"Unknown LLM provider {name!r} in LLM_PROVIDERS, ignoring")
+                continue
+            cls, key = _PROVIDERS[name]
+            if key:
+                providers.append(cls())
+        # Without any key, keep Groq so errors say what is missing
+        _providers = providers or [GroqProvider()]
+    return _providers
+
+
+def set_providers(providers: list[LLMProvider]):
+    """Replace the provider chain (e.g. with FakeProviders)."""
+    global _providers
+    _providers = list(providers)
+
+
+def hedge_delay(provider: LLMProvider) -> float:
+    observed = provider.latency.quantile(LLM_HEDGE_QUANTILE)
+    if observed is None:
+        return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+    return max(LLM_HEDGE_MIN_DELAY_SECONDS, min(LLM_HEDGE_MAX_DELAY_SECONDS, observed))
+
+
+async def _timed(provider: LLMProvider, prompt: str, temperature: float, operation: str) -> str:
+    start = time.perf_counter()
+    try:
+        result = await provider.complete(prompt, temperature, operation)
+    except asyncio.CancelledError:
+        provider.latency.record(time.perf_counter() - start)
+        raise
+    provider.latency.record(time.perf_counter() - start)
+    return result
+
+
+async def complete(prompt: str, temperature: float = 0.1, operation: str = "") -> str:
+    """The first answer to `prompt` from the primary provider or, once hedged, the secondary."""
+    providers = get_providers()
+    primary = asyncio.ensure_future(_timed(providers[0], prompt, temperature, operation))
+    racing = {primary: providers[0]}
+    try:
+        if len(providers) > 1:
+            # Returns early if the primary finishes (or fails) before the hedge delay
+            await asyncio.wait({primary}, timeout=hedge_delay(providers[0]))
+            if not primary.done() or primary.exception() is not None:
+                racing[asyncio.ensure_future(_timed(providers[1], prompt, temperature, operation))] = providers[1]
+        hedged = "yes" if len(racing) > 1 else "no"
+
+        pending = set(racing)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LLM_CALLS.inc(operation, racing[task].name, hedged)
+                    return task.result()
+        raise primary.exception()
+    finally:
+        # The losing call, or both if our caller gave up (e.g. a timeout)
+        for task in racing:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,144 @@
+"""CPU-only text→9D vector regressor, used before Groq when it is confident.
+
+Features are hashed (signed, L2-normalized) stemmed words, word bigrams and
+character 3-grams in LOCAL_VECTORIZER_FEATURES buckets. Ridge regression maps
+them to the centered catalog vectors in closed form, solved in whichever of
+the primal (features) or dual (samples) space is smaller. Training data is the
+catalog (activities.json, city_activities.json: "name. description" → vector)
+plus the persisted LLM outputs in services/llm_cache.py.
+
+Confidence is the fraction of a text's distinct words that occur in at least
+two training texts: 1.0 means every word is familiar, 0.0 means none is
+(character n-grams are left out, since almost any English text shares them).
+text_to_vector uses the prediction when confidence is at least
+LOCAL_VECTORIZER_MIN_CONFIDENCE and asks the LLM otherwise.
+
+Train and evaluate with scripts/train_local_vectorizer.py; the model is a
+small .npz at LOCAL_VECTORIZER_PATH, reloaded when the file changes.
+"""
+import os
+import threading
+import zlib
+import numpy as np
+from config import VECTOR_DIMENSION, LOCAL_VECTORIZER_PATH, LOCAL_VECTORIZER_FEATURES
+from services.bm25 import analyze
+
+_SIGN_BIT = 1 << 31
+
+
+def _bucket(gram: str, n_features: int) -> tuple[int, float]:
+    # crc32 rather than hash(): str hashes are salted per process
+    h = zlib.crc32(gram.encode())
+    return h % n_features, (-1.0 if h & _SIGN_BIT else 1.0)
+
+
+def _features(words: list[str]) -> list[str]:
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return grams
+
+
+def _word_buckets(text: str, n_features: int) -> set[int]:
+    return {_bucket(f"w:{w}", n_features)[0] for w in analyze(text)}
+
+
+def featurize(texts: list[str], n_features: int = LOCAL_VECTORIZER_FEATURES) -> np.ndarray:
+    """Dense (len(texts), n_features) float32 matrix of hashed, L2-normalized n-gram counts."""
+    X = np.zeros((len(texts), n_features), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for gram in _features(analyze(text)):
+            col, sign = _bucket(gram, n_features)
+            X[row, col] += sign
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+
+class LocalVectorizer:
+    def __init__(self, weights: np.ndarray, mean: np.ndarray, seen: np.ndarray, alpha: float, n_samples: int):
+        self.weights = weights  # (n_features, 9)
+        self.mean = mean  # (9,)
+        self.seen = seen  # (n_features,) bool: word bucket occurs in >= 2 training texts
+        self.alpha = alpha
+        self.n_samples = n_samples
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    @classmethod
+    def fit(cls, texts: list[str], vectors: list[list[float]], alpha: float = 1.0, n_features: int = LOCAL_VECTORIZER_FEATURES) -> "LocalVectorizer":
+        X = featurize(texts, n_features).astype(np.float64)
+        Y = np.asarray(vectors, dtype=np.float64)
+        mean = Y.mean(axis=0)
+        Yc = Y - mean
+        n, d = X.shape
+        if n < d:
+            # Dual: W = X^T (X X^T + alpha I)^-1 Y
+            weights = X.T @ np.linalg.solve(X @ X.T + alpha * np.eye(n), Yc)
+        else:
+            weights = np.linalg.solve(X.T @ X + alpha * np.eye(d), X.T @ Yc)
+        counts = np.zeros(n_features, dtype=np.int32)
+        for text in texts:
+            counts[list(_word_buckets(text, n_features))] += 1
+        seen = counts >= 2
+        return cls(weights.astype(np.float32), mean.astype(np.float32), seen, alpha, n)
+
+    def predict(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(vectors clipped to [0, 1], confidences) for each text."""
+        X = featurize(texts, self.n_features)
+        vectors = np.clip(X @ self.weights + self.mean, 0.0, 1.0)
+        confidence = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = _word_buckets(text, self.n_features)
+            if buckets:
+                confidence[row] = sum(bool(self.seen[b]) for b in buckets) / len(buckets)
+        return vectors, confidence
+
+    def save(self, path: str = LOCAL_VECTORIZER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, weights=self.weights, mean=self.mean, seen=self.seen, alpha=self.alpha, n_samples=self.n_samples)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_VECTORIZER_PATH) -> "LocalVectorizer":
+        with np.load(path) as data:
+            if data["weights"].shape[1] != VECTOR_DIMENSION:
+                raise ValueError(f"Model predicts {data['weights'].shape[1]} dimensions, expected {VECTOR_DIMENSION}")
+            return cls(data["weights"], data["mean"], data["seen"], float(data["alpha"]), int(data["n_samples"]))
+
+
+_model: LocalVectorizer | None = None
+_model_mtime: float | None = None
+_lock = threading.Lock()
+
+
+def get_model() -> LocalVectorizer | None:
+    """The trained model, reloaded if LOCAL_VECTORIZER_PATH changed. None if there is none."""
+    global _model, _model_mtime
+    try:
+        mtime = os.stat(LOCAL_VECTORIZER_PATH).st_mtime
+    except OSError:
+        return None
+    if mtime != _model_mtime:
+        with _lock:
+            if mtime != _model_mtime:
+                try:
+                    _model = LocalVectorizer.load()
+                except Exception as e:
+                    print(f"Could not load local vectorizer: {e}")
+                    _model = None
+                _model_mtime = mtime
+    return _model
+
+
+def predict_one(text: str) -> tuple[list[float], float] | None:
+    """(vector, confidence) for `text`, or None if no model is trained."""
+    model = get_model()
+    if model is None:
+        return None
+    vectors, confidence = model.predict([text])
+    return [round(float(v), 4) for v in vectors[0]], float(confidence[0])
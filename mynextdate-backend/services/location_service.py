@@ -1,38 +1,52 @@
 """Browser geolocation + reverse geocoding and local activity trend aggregation."""
-import httpx
+from typing import TYPE_CHECKING
 import numpy as np
-from supabase import Client
 from services.actian_service import get_activity_vectors, search_similar
+from services.invalidation import publish_event, subscribe
+from services.metrics import record_cache
+from services.circuit_breaker import guarded
 
+if TYPE_CHECKING:
+    from supabase import Client
 
-# In-memory cache: user_id -> city
+# In-memory cache: user_id -> city. Saves are broadcast so every worker sees a user's new city.
 _location_cache: dict[str, str] = {}
 
 
-async def reverse_geocode_and_save(user_id: str, lat: float, lng: float, sb: Client) -> str | None:
+def _apply_user_location(event: dict):
+    _location_cache[event["user_id"]] = event["city"]
+
+
+subscribe("user_location", _apply_user_location)
+
+
+async def reverse_geocode_and_save(user_id: str, lat: float, lng: float, sb: "Client") -> str | None:
     """
     Reverse geocode lat/lng to city via OpenStreetMap Nominatim, save to Supabase.
     Never raises — returns None on failure.
     """
     try:
         if user_id in _location_cache:
+            record_cache("user_locations", hits=1)
             return _location_cache[user_id]
+        record_cache("user_locations", misses=1)
 
         city, region, country = await _reverse_geocode(lat, lng)
         if not city:
             return None
 
-        sb.table("user_locations").upsert(
-            {
-                "user_id": user_id,
-                "city": city,
-                "region": region,
-                "country": country,
-            },
-            on_conflict="user_id",
-        ).execute()
-
-        _location_cache[user_id] = city
+        with guarded("supabase", "user_locations.upsert"):
+            sb.table("user_locations").upsert(
+                {
+                    "user_id": user_id,
+                    "city": city,
+                    "region": region,
+                    "country": country,
+                },
+                on_conflict="user_id",
+            ).execute()
+
+        publish_event("user_location", user_id=user_id, city=city)
         return city
 
     except Exception as e:
@@ -40,13 +54,16 @@ async def reverse_geocode_and_save(user_id: str, lat: float, lng: float, sb: Cli
         return None
 
 
-async def get_user_city(user_id: str, sb: Client) -> str | None:
+async def get_user_city(user_id: str, sb: "Client") -> str | None:
     """Get user's cached city, or look it up from Supabase."""
     if user_id in _location_cache:
+        record_cache("user_locations", hits=1)
         return _location_cache[user_id]
+    record_cache("user_locations", misses=1)
 
     try:
-        result = sb.table("user_locations").select("city").eq("user_id", user_id).limit(1).execute()
+        with guarded("supabase", "user_locations.select"):
+            result = sb.table("user_locations").select("city").eq("user_id", user_id).limit(1).execute()
         if result.data:
             city = result.data[0]["city"]
             _location_cache[user_id] = city
@@ -58,14 +75,16 @@ async def get_user_city(user_id: str, sb: Client) -> str | None:
 
 async def _reverse_geocode(lat: float, lng: float) -> tuple[str | None, str | None, str | None]:
     """Reverse geocode lat/lng to city using OpenStreetMap Nominatim (free, no key)."""
+    import httpx
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(
-                "https://nominatim.openstreetmap.org/reverse",
-                params={"lat": lat, "lon": lng, "format": "json", "zoom": 10},
-                headers={"User-Agent": "MyNextDate/1.0"},
-            )
-            data = resp.json()
+        with guarded("nominatim", "reverse"):
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                resp = await client.get(
+                    "https://nominatim.openstreetmap.org/reverse",
+                    params={"lat": lat, "lon": lng, "format": "json", "zoom": 10},
+                    headers={"User-Agent": "MyNextDate/1.0"},
+                )
+                data = resp.json()
 
         address = data.get("address", {})
         city = address.get("city") or address.get("town") or address.get("village") or address.get("county")
@@ -77,7 +96,7 @@ async def _reverse_geocode(lat: float, lng: float) -> tuple[str | None, str | No
         return None, None, None
 
 
-async def get_local_trends(city: str, user_id: str, sb: Client) -> dict:
+async def get_local_trends(city: str, user_id: str, sb: "Client") -> dict:
     """
     Aggregate activity taste for users in the same city via Actian Vector AI DB.
 
@@ -89,7 +108,8 @@ async def get_local_trends(city: str, user_id: str, sb: Client) -> dict:
     """
     try:
         # Get all user_ids in this city
-        loc_result = sb.table("user_locations").select("user_id").eq("city", city).execute()
+        with guarded("supabase", "user_locations.select"):
+            loc_result = sb.table("user_locations").select("user_id").eq("city", city).execute()
         local_user_ids = [row["user_id"] for row in (loc_result.data or [])]
 
         # Remove current user — we want to show what OTHER people are doing
@@ -99,9 +119,10 @@ async def get_local_trends(city: str, user_id: str, sb: Client) -> dict:
             return {"city": city, "total_users": 0, "total_dates": 0, "trends": []}
 
         # Get activity_id + activity_name for other users' date history
-        dates_result = sb.table("date_history").select(
-            "activity_id, activity_name"
-        ).in_("user_id", other_user_ids).execute()
+        with guarded("supabase", "date_history.select"):
+            dates_result = sb.table("date_history").select(
+                "activity_id, activity_name"
+            ).in_("user_id", other_user_ids).execute()
 
         dates = dates_result.data or []
         total_dates = len(dates)
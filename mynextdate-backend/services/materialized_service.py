@@ -0,0 +1,256 @@
+"""Materialized per-user results: recommendations, worst picks and similar couples.
+
+A user's results only change when their history (or the catalog) changes, so
+they are computed in the background and stored instead of on every dashboard
+load:
+
+- after a date_history write, the worker that handled it recomputes the user
+  (debounced by MATERIALIZE_DEBOUNCE_SECONDS so bursts of writes coalesce);
+- every MATERIALIZE_SWEEP_SECONDS a sweep recomputes rows built against
+  other catalog content. Rows record the catalog's content hash, not its
+  generation: generations are numbered per host and restart from 1, the
+  table is shared by every host.
+
+Rows are stored in the Supabase table `materialized_recommendations`, with a
+per-worker copy in memory. Each row records the id of the last history_changed
+event its computation saw (`history_mark`). A worker treats a row as stale
+while it has seen a later event for that user. The worker that handled the
+write also stores the event id in the row's `latest_history_mark`, so a worker
+that started after the event (or the writer, restarted before its refresh ran)
+still sees the row as stale. Event ids are compared, never clocks, so hosts
+don't need synchronised time. Reads return None on a miss or
+for a stale row, and the caller computes live and schedules a refresh. While
+Supabase's circuit is open, live computation isn't possible, so a stale
+in-memory row is returned instead, marked "stale": True.
+"""
+import asyncio
+import fcntl
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from config import (
+    INDEX_DIR, REC_SESSION_CANDIDATES, MATERIALIZE_DEBOUNCE_SECONDS, MATERIALIZE_SWEEP_SECONDS, MATERIALIZE_LOCAL_MAX,
+)
+from services.circuit_breaker import is_open
+from services.invalidation import WORKER_ID, subscribe
+from services.metrics import Counter, record_cache
+from services.circuit_breaker import guarded
+
+TABLE = "materialized_recommendations"
+
+# Rows per sweep query, below PostgREST's default response cap of 1000
+SWEEP_PAGE_SIZE = 500
+
+MATERIALIZE_JOBS = Counter(
+    "mynextdate_materialize_jobs_total", "Background recommendation recomputes by trigger and result.", ("trigger", "result")
+)
+
+# user_id -> materialized row, and user_id -> id of the latest history_changed
+# event not yet covered by a row this worker has seen. Both are LRU-bounded by
+# MATERIALIZE_LOCAL_MAX; a mark is dropped as soon as a row covering it shows up.
+_local: OrderedDict[str, dict] = OrderedDict()
+_history_marks: OrderedDict[str, str] = OrderedDict()
+_state_lock = threading.Lock()
+
+_loop: asyncio.AbstractEventLoop | None = None
+_pending: dict[str, asyncio.TimerHandle] = {}
+
+
+def _remember(cache: OrderedDict, user_id: str, value):
+    with _state_lock:
+        cache[user_id] = value
+        cache.move_to_end(user_id)
+        while len(cache) > MATERIALIZE_LOCAL_MAX:
+            cache.popitem(last=False)
+
+
+def _on_history_changed(event: dict):
+    user_id = event["user_id"]
+    # The in-memory row is kept: it's now stale, but it's the fallback while Supabase is down
+    _remember(_history_marks, user_id, event.get("id", ""))
+    # Only the worker that handled the write persists the mark and recomputes
+    if event.get("origin") == WORKER_ID:
+        if _loop is not None and not _loop.is_closed():
+            _loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(asyncio.to_thread(_persist_mark, user_id, event.get("id", "")))
+            )
+        schedule_refresh(user_id)
+
+
+subscribe("history_changed", _on_history_changed)
+
+
+def _persist_mark(user_id: str, mark: str):
+    """Record `mark` as the user's latest history event on their stored row, if they have one."""
+    from services.clients import get_supabase
+    try:
+        with guarded("supabase", f"{TABLE}.update"):
+            get_supabase().table(TABLE).update({"latest_history_mark": mark}).eq("user_id", user_id).execute()
+    except Exception as e:
+        print(f"Materialized history mark write failed (non-fatal): {e}")
+
+
+def _is_stale(user_id: str, row: dict) -> bool:
+    mark = _history_marks.get(user_id)
+    if mark is not None and row.get("history_mark") != mark:
+        return True
+    # Set on rows read back from Supabase; covers events this worker never saw
+    latest = row.get("latest_history_mark")
+    return latest is not None and row.get("history_mark") != latest
+
+
+def _accept(user_id: str, row: dict) -> bool:
+    """Keep `row` as this worker's copy unless it's stale. A fresh row retires the user's mark."""
+    if _is_stale(user_id, row):
+        return False
+    with _state_lock:
+        if _history_marks.get(user_id) == row.get("history_mark"):
+            _history_marks.pop(user_id, None)
+    _remember(_local, user_id, row)
+    return True
+
+
+def get_materialized(user_id: str, sb) -> dict | None:
+    """The user's materialized row if one exists and covers their latest history change.
+
+    While Supabase's circuit is open, the last row this worker saw even if stale.
+    """
+    row = _local.get(user_id)
+    if row is None or _is_stale(user_id, row):
+        fetched = None
+        try:
+            with guarded("supabase", f"{TABLE}.select"):
+                result = sb.table(TABLE).select("*").eq("user_id", user_id).limit(1).execute()
+            fetched = result.data[0] if result.data else None
+        except Exception as e:
+            print(f"Materialized read failed (non-fatal): {e}")
+        if fetched is not None and (_accept(user_id, fetched) or row is None):
+            row = fetched
+    if row is not None and _is_stale(user_id, row):
+        row = {**row, "stale": True} if is_open("supabase") else None
+    record_cache("materialized_recommendations", hits=int(row is not None), misses=int(row is None))
+    return row
+
+
+def refresh_user(user_id: str, sb) -> dict:
+    """Recompute and store everything materialized for one user. Blocking; run in a thread."""
+    from services.actian_service import current_catalog_version
+    from services.couples_service import similar_couples
+    from services.recommendation_service import load_history, rank_for_history, worst_recommendations
+
+    # Mark before reading history, so a write that lands mid-compute leaves the row stale
+    history_mark = _history_marks.get(user_id)
+    if history_mark is None:
+        history_mark = _stored_latest_mark(user_id, sb)
+    computed_at = datetime.now(timezone.utc).isoformat()
+    dates = load_history(user_id, sb)
+    pref_vector, candidates = rank_for_history(dates, sb, [], REC_SESSION_CANDIDATES)
+    row = {
+        "user_id": user_id,
+        "preference_vector": pref_vector,
+        "recommendations": candidates,
+        "worst": worst_recommendations(dates, sb),
+        "social": similar_couples(user_id, dates, sb),
+        "catalog_version": current_catalog_version(),
+        "history_mark": history_mark,
+        "computed_at": computed_at,
+    }
+    try:
+        with guarded("supabase", f"{TABLE}.upsert"):
+            sb.table(TABLE).upsert(row, on_conflict="user_id").execute()
+    except Exception as e:
+        print(f"Materialized write failed, keeping it in this worker only: {e}")
+    _accept(user_id, row)
+    return row
+
+
+def _stored_latest_mark(user_id: str, sb) -> str | None:
+    """The latest_history_mark on the user's stored row, for events from before this worker started."""
+    try:
+        with guarded("supabase", f"{TABLE}.select"):
+            result = sb.table(TABLE).select("latest_history_mark").eq("user_id", user_id).limit(1).execute()
+    except Exception as e:
+        print(f"Materialized mark read failed (non-fatal): {e}")
+        return None
+    return result.data[0].get("latest_history_mark") if result.data else None
+
+
+async def _run_refresh(user_id: str, trigger: str):
+    from services.clients import get_supabase
+    try:
+        await asyncio.to_thread(refresh_user, user_id, get_supabase())
+        MATERIALIZE_JOBS.inc(trigger, "ok")
+    except Exception as e:
+        MATERIALIZE_JOBS.inc(trigger, "error")
+        print(f"Materialize for {user_id} failed: {e}")
+
+
+def _debounce(user_id: str):
+    handle = _pending.pop(user_id, None)
+    if handle is not None:
+        handle.cancel()
+
+    def fire():
+        _pending.pop(user_id, None)
+        asyncio.ensure_future(_run_refresh(user_id, "history"))
+
+    _pending[user_id] = _loop.call_later(MATERIALIZE_DEBOUNCE_SECONDS, fire)
+
+
+def schedule_refresh(user_id: str):
+    """Queue a debounced background recompute. Safe to call from any thread; no-op before startup."""
+    if _loop is None or _loop.is_closed():
+        return
+    _loop.call_soon_threadsafe(_debounce, user_id)
+
+
+def _sweep_stale_catalog():
+    """Recompute rows built against other catalog content. One worker per host runs it."""
+    from services.actian_service import current_catalog_version
+    from services.clients import get_supabase
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(os.path.join(INDEX_DIR, ".materialize-sweep.lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        version = current_catalog_version()
+        if version is None:
+            return
+        sb = get_supabase()
+        refreshed, after = 0, None
+        while True:
+            # Only rows from other catalog content, in user_id pages: PostgREST caps each response
+            query = sb.table(TABLE).select("user_id").or_(f"catalog_version.neq.{version},catalog_version.is.null")
+            if after is not None:
+                query = query.gt("user_id", after)
+            with guarded("supabase", f"{TABLE}.select"):
+                result = query.order("user_id").limit(SWEEP_PAGE_SIZE).execute()
+            page = [r["user_id"] for r in (result.data or [])]
+            for user_id in page:
+                try:
+                    refresh_user(user_id, sb)
+                    refreshed += 1
+                    MATERIALIZE_JOBS.inc("catalog", "ok")
+                except Exception as e:
+                    MATERIALIZE_JOBS.inc("catalog", "error")
+                    print(f"Materialize sweep for {user_id} failed: {e}")
+            if len(page) < SWEEP_PAGE_SIZE:
+                break
+            after = page[-1]
+        if refreshed:
+            print(f"Materialize sweep refreshed {refreshed} users for catalog {version[:12]}.")
+
+
+async def run_materializer():
+    """Bind background refreshes to this event loop and run the periodic catalog sweep."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(MATERIALIZE_SWEEP_SECONDS)
+        try:
+            await asyncio.to_thread(_sweep_stale_catalog)
+        except Exception as e:
+            print(f"Materialize sweep failed: {e}")
@@ -0,0 +1,253 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Recording is a dict lookup, a bisect and a few integer adds under a lock, so it
+stays in the low microseconds and can run in production. Everything lives in
+this process; scrape each worker separately.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_lock = threading.Lock()
+_registry: list = []
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        # Copy under the lock: a request thread may add a label set mid-scrape
+        with _lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(values)
+        ]
+
+
+class Gauge:
+    """Settable gauge keyed by label values. `fn` makes it computed at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._fn = fn
+        _registry.append(self)
+
+    def set(self, value: float, *labels) -> None:
+        with _lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        if self._fn:
+            values = list(self._fn().items())
+        else:
+            with _lock:
+                values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(values)
+        ]
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, *labels) -> int:
+        row = self._values.get(labels)
+        return row[-1] if row else 0
+
+    def samples(self) -> list[str]:
+        with _lock:
+            rows = [(labels, list(row)) for labels, row in self._values.items()]
+        lines = []
+        for labels, row in sorted(rows):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {row[-2]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {row[-1]}")
+        return lines
+
+
+# ── Request metrics ──
+
+REQUEST_LATENCY = Histogram(
+    "mynextdate_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "mynextdate_http_requests_in_flight",
+    "HTTP requests currently being served.",
+)
+
+# ── External dependency metrics ──
+
+DEPENDENCY_LATENCY = Histogram(
+    "mynextdate_dependency_duration_seconds",
+    "Latency of calls to external dependencies (supabase, groq, actian, nominatim).",
+    ("dependency", "operation"),
+)
+DEPENDENCY_ERRORS = Counter(
+    "mynextdate_dependency_errors_total",
+    "Failed calls to external dependencies.",
+    ("dependency", "operation"),
+)
+
+# ── Event loop ──
+
+EVENT_LOOP_LAG = Gauge(
+    "mynextdate_event_loop_lag_seconds",
+    "Most recent event loop scheduling lag.",
+)
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    "mynextdate_event_loop_lag_distribution_seconds",
+    "Distribution of event loop scheduling lag.",
+    buckets=LOOP_LAG_BUCKETS,
+)
+
+# ── In-memory caches ──
+
+CACHE_REQUESTS = Counter(
+    "mynextdate_cache_requests_total",
+    "In-memory cache lookups by outcome.",
+    ("cache", "result"),
+)
+
+
+def _cache_hit_ratios() -> dict[tuple, float]:
+    totals: dict[str, list[float]] = {}
+    for (cache, result), n in list(CACHE_REQUESTS._values.items()):
+        entry = totals.setdefault(cache, [0.0, 0.0])
+        entry[0 if result == "hit" else 1] += n
+    return {
+        (cache,): round(hits / (hits + misses), 4)
+        for cache, (hits, misses) in totals.items()
+        if hits + misses > 0
+    }
+
+
+CACHE_HIT_RATIO = Gauge(
+    "mynextdate_cache_hit_ratio",
+    "Hit ratio of in-memory caches since process start.",
+    ("cache",),
+    fn=_cache_hit_ratios,
+)
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str = ""):
+    """Time a call to an external dependency and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.inc(dependency, operation)
+        raise
+    finally:
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - start, dependency, operation)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Count lookups against an in-memory cache."""
+    if hits:
+        CACHE_REQUESTS.inc(cache, "hit", amount=hits)
+    if misses:
+        CACHE_REQUESTS.inc(cache, "miss", amount=misses)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Measure how late the loop wakes up from a fixed sleep. Runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format 0.0.4."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,112 @@
+"""Sampling profiler for single requests, producing flamegraph-compatible folded stacks.
+
+A background thread snapshots the stack of every thread in the process every
+`interval` seconds via sys._current_frames(), so work handed to
+asyncio.to_thread or the threadpool (LLM calls, the job queue, catalog sync and
+snapshot builds) shows up next to the event loop. Each stack is rooted at its
+thread's name. Output is Brendan Gregg's folded format ("outer;inner;leaf
+count" per line), which flamegraph.pl, speedscope and inferno all read
+directly.
+
+Samples from other requests and from idle background threads are included
+too. Profile on a quiet worker for the cleanest picture, and zoom into the
+thread you care about.
+"""
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_STACK_DEPTH = 128
+
+# Only one profile may run per process at a time
+_active = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample every thread's stack at a fixed interval until stopped or bounded out."""
+
+    def __init__(self, interval: float = 0.005, max_seconds: float = 30.0):
+        # Floor the interval so a misconfiguration can't turn sampling into a busy loop
+        self.interval = max(interval, 0.001)
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            if time.perf_counter() - start > self.max_seconds:
+                break
+        self.duration = time.perf_counter() - start
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def try_start(interval: float, max_seconds: float) -> SamplingProfiler | None:
+    """Start profiling the process, or return None if a profile is already running."""
+    if not _active.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler(interval, max_seconds)
+    profiler.start()
+    return profiler
+
+
+def finish(profiler: SamplingProfiler) -> None:
+    try:
+        profiler.stop()
+    finally:
+        _active.release()
+
+
+_PROFILE_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def new_profile_id(label: str) -> str:
+    """Pick an id for a profile before the request runs, so it can be returned in a header."""
+    safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "request"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}-{safe_label}"
+
+
+def profile_path(directory: str, profile_id: str) -> str | None:
+    """Where a profile id is stored under `directory`, or None for an id that isn't one of ours."""
+    if not _PROFILE_ID_RE.fullmatch(profile_id):
+        return None
+    return os.path.join(directory, f"{profile_id}.folded")
+
+
+def save_profile(profiler: SamplingProfiler, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(profiler.folded())
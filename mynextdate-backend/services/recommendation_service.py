@@ -0,0 +1,207 @@
+"""Recommendation pipeline and cursor-based recommendation sessions.
+
+The first /api/recommend call loads the user's history, computes the
+preference vector and ranks a merged list of catalog + custom candidates.
+That list (or the user's materialized one, see materialized_service) is
+cached under an opaque cursor token for REC_SESSION_TTL_SECONDS.
+Later pages ("Try different ideas") are sliced from the cached list instead
+of recomputing everything to drop a few ids.
+
+Sessions live in the worker's memory. A cursor that this worker doesn't know
+(expired, evicted, or issued by another worker) simply starts a new session.
+Any date_history write for the user drops their sessions on every worker via
+the invalidation bus.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+from config import REC_SESSION_TTL_SECONDS, REC_SESSION_CANDIDATES, REC_SESSION_MAX
+from services.actian_service import search_similar, search_worst, search_custom_activities, get_activity_vectors, get_custom_date_vectors
+from services.history_store import load_user_history, PREFERENCE_COLUMNS
+from services.invalidation import subscribe
+from services.metrics import record_cache
+from services.preference_engine import compute_preference_vector, apply_repeat_penalty
+from services.tracing import span
+
+PAGE_SIZE = 3
+
+
+@dataclass
+class RecommendationSession:
+    cursor: str
+    user_id: str
+    preference_vector: list[float]
+    candidates: list[dict]
+    expires_at: float
+    computed_at: str
+    source: str
+    served: set = field(default_factory=set)
+
+
+_sessions: "OrderedDict[str, RecommendationSession]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _invalidate_user(event: dict):
+    user_id = event["user_id"]
+    with _lock:
+        for cursor in [c for c, s in _sessions.items() if s.user_id == user_id]:
+            del _sessions[cursor]
+
+
+subscribe("history_changed", _invalidate_user)
+
+
+def load_history(user_id: str, sb) -> list[dict]:
+    return load_user_history(sb, user_id, PREFERENCE_COLUMNS)
+
+
+def compute_user_preference(dates: list[dict], repeat_penalty: bool = True) -> tuple[list[float], list[int]]:
+    """Preference vector from rated history (custom dates included). Returns (vector, activity_ids)."""
+    with span("vector_resolution"):
+        activity_ids = [d["activity_id"] for d in dates]
+        activity_vectors = get_activity_vectors(activity_ids)
+
+        # Include custom date vectors (activity_id=0) in preference computation
+        custom_date_ids = [d["id"] for d in dates if d["activity_id"] == 0]
+        custom_vectors = get_custom_date_vectors(custom_date_ids)
+
+    with span("preference_compute"):
+        rated_dates = []
+        for d in dates:
+            if d["rating"] is None:
+                continue
+            if d["activity_id"] == 0 and d["id"] in custom_vectors:
+                # Use date record ID as key for custom dates
+                activity_vectors[d["id"]] = custom_vectors[d["id"]]
+                rated_dates.append({"activity_id": d["id"], "rating": d["rating"]})
+            else:
+                rated_dates.append({"activity_id": d["activity_id"], "rating": d["rating"]})
+
+        pref_vector = compute_preference_vector(rated_dates, activity_vectors)
+        if repeat_penalty:
+            pref_vector = apply_repeat_penalty(pref_vector, activity_ids, activity_vectors)
+    return pref_vector, activity_ids
+
+
+def merge_by_name(results: list[dict], limit: int) -> list[dict]:
+    """Sort by score, dedupe by case-insensitive name and keep the first `limit`."""
+    with span("merge"):
+        seen_names = set()
+        merged = []
+        for r in sorted(results, key=lambda x: x["score"], reverse=True):
+            name_lower = r["name"].strip().lower()
+            if name_lower not in seen_names:
+                seen_names.add(name_lower)
+                merged.append(r)
+            if len(merged) == limit:
+                break
+    return merged
+
+
+def rank_candidates(pref_vector: list[float], exclude_ids: list[int], sb, limit: int) -> list[dict]:
+    """Merged catalog + custom candidates for a preference vector, best first."""
+    with span("search"):
+        json_recs = search_similar(pref_vector, top_k=limit, exclude_ids=exclude_ids)
+    with span("custom_search"):
+        custom_recs = search_custom_activities(pref_vector, sb, top_k=limit)
+    return merge_by_name(json_recs + custom_recs, limit)
+
+
+def rank_for_history(dates: list[dict], sb, skip_ids: list[int], limit: int) -> tuple[list[float], list[dict]]:
+    """Preference vector and ranked candidates, excluding activities already in the history."""
+    pref_vector, activity_ids = compute_user_preference(dates)
+    return pref_vector, rank_candidates(pref_vector, list(set(activity_ids + skip_ids)), sb, limit)
+
+
+def worst_recommendations(dates: list[dict], sb) -> list[dict]:
+    """Breakup button: activities furthest from the user's taste, catalog + custom."""
+    pref_vector, _ = compute_user_preference(dates, repeat_penalty=False)
+    with span("search"):
+        json_worst = search_worst(pref_vector, top_k=PAGE_SIZE)
+
+    # Also search custom activities with inverted preference
+    inverse_pref = [round(1.0 - v, 4) for v in pref_vector]
+    with span("custom_search"):
+        custom_worst = search_custom_activities(inverse_pref, sb, top_k=PAGE_SIZE)
+    return merge_by_name(json_worst + custom_worst, PAGE_SIZE)
+
+
+def _get_session(cursor: str | None, user_id: str) -> RecommendationSession | None:
+    if not cursor:
+        return None
+    with _lock:
+        session = _sessions.get(cursor)
+        if session is None or session.user_id != user_id:
+            return None
+        if session.expires_at < time.monotonic():
+            del _sessions[cursor]
+            return None
+        _sessions.move_to_end(cursor)
+        return session
+
+
+def _start_session(user_id: str, sb, skip_ids: list[int], materialized: dict | None) -> RecommendationSession:
+    if materialized is not None:
+        # Precomputed by the materializer; skip ids are filtered per page
+        pref_vector, candidates = materialized["preference_vector"], materialized["recommendations"]
+        computed_at, source = materialized["computed_at"], "stale" if materialized.get("stale") else "materialized"
+    else:
+        computed_at, source = datetime.now(timezone.utc).isoformat(), "live"
+        pref_vector, candidates = rank_for_history(load_history(user_id, sb), sb, skip_ids, REC_SESSION_CANDIDATES)
+    session = RecommendationSession(
+        cursor=secrets.token_urlsafe(16),
+        user_id=user_id,
+        preference_vector=pref_vector,
+        candidates=candidates,
+        expires_at=time.monotonic() + REC_SESSION_TTL_SECONDS,
+        computed_at=computed_at,
+        source=source,
+    )
+    with _lock:
+        _sessions[session.cursor] = session
+        while len(_sessions) > REC_SESSION_MAX:
+            _sessions.popitem(last=False)
+    return session
+
+
+def _next_page(session: RecommendationSession, skip_ids: list[int]) -> list[dict]:
+    skip = set(skip_ids)
+    with span("session_page"), _lock:
+        page = [c for c in session.candidates if c["id"] not in session.served and c["id"] not in skip][:PAGE_SIZE]
+        if len(page) < PAGE_SIZE:
+            # Ran out of unseen candidates: start over from the best ones
+            session.served.clear()
+            page += [c for c in session.candidates if c not in page and c["id"] not in skip][:PAGE_SIZE - len(page)]
+        session.served.update(c["id"] for c in page)
+    return page
+
+
+def recommend(
+    user_id: str,
+    sb,
+    cursor: str | None = None,
+    skip_ids: list[int] | None = None,
+    materialized: Callable[[], dict | None] | None = None,
+) -> dict:
+    """Next page of recommendations from the cursor's session, or a new session.
+
+    `materialized` is a callable returning the user's precomputed row (or None);
+    it is only consulted when a new session has to be started.
+    """
+    skip_ids = skip_ids or []
+    session = _get_session(cursor, user_id)
+    record_cache("recommendation_sessions", hits=int(session is not None), misses=int(bool(cursor) and session is None))
+    if session is None:
+        session = _start_session(user_id, sb, skip_ids, materialized() if materialized else None)
+    return {
+        "recommendations": _next_page(session, skip_ids),
+        "preference_vector": session.preference_vector,
+        "cursor": session.cursor,
+        "computed_at": session.computed_at,
+        "source": session.source,
+    }
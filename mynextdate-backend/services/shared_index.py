@@ -0,0 +1,229 @@
+"""Read-only vector catalogs shared by every worker through memory-mapped files.
+
+Each published catalog generation is one compiled snapshot file (see
+services/catalog_snapshot.py):
+
+    INDEX_DIR/<name>/gen-000007.snap    ids, float32 vectors and JSON payload table
+    INDEX_DIR/<name>/CURRENT            "gen-000007"
+
+Workers map the snapshot with np.memmap, so the page cache holds a single copy
+however many uvicorn workers run. Payloads are decoded from the mapped table
+on access instead of being kept as per-worker dicts. Publishing writes a new
+generation and then swaps CURRENT with os.replace. A worker sees either the
+old snapshot or the new one, never a partial write.
+"""
+import fcntl
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+import numpy as np
+from config import INDEX_DIR, INDEX_REFRESH_SECONDS
+from services.catalog_snapshot import Snapshot, SnapshotError, source_digest, write_snapshot
+from services.invalidation import publish_event, subscribe
+
+# Generations kept on disk besides the current one. Workers still on an older
+# generation keep a valid mapping even after its files are unlinked.
+KEEP_GENERATIONS = 2
+
+
+class CatalogIndex:
+    """One published generation of a catalog, mapped read-only."""
+
+    def __init__(self, name: str, generation: int, path: str):
+        self.name = name
+        self.generation = generation
+        self.path = path
+        # Generations are written by publish(); skip re-hashing them on every map
+        self.snapshot = Snapshot(path, verify=False)
+        # Identifies the content, not the publish: equal on every host and across restarts
+        self.content_hash = self.snapshot.body_sha256.hex()
+        # sha256 of the JSON it was published for (zeros if none), see matches_source
+        self.source_sha256 = self.snapshot.source_sha256
+        self.ids = self.snapshot.ids
+        self.vectors = self.snapshot.vectors
+        # Small per-worker structures: row lookup and norms for cosine scoring
+        self.row_of: dict[int, int] = {int(aid): row for row, aid in enumerate(self.ids)}
+        self.norms = np.linalg.norm(self.vectors, axis=1) if len(self.ids) else np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def vector(self, row: int) -> list[float]:
+        # Round away float32 noise so callers see the catalog's original values
+        return [round(v, 6) for v in self.vectors[row].tolist()]
+
+    def payload(self, row: int) -> dict:
+        return self.snapshot.payload(row)
+
+
+def _catalog_dir(name: str) -> str:
+    return os.path.join(INDEX_DIR, name)
+
+
+@contextmanager
+def build_lock(name: str):
+    """Cross-process lock so only one worker builds or publishes a catalog at a time."""
+    os.makedirs(_catalog_dir(name), exist_ok=True)
+    with open(os.path.join(_catalog_dir(name), ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_generation(name: str) -> int | None:
+    try:
+        with open(os.path.join(_catalog_dir(name), "CURRENT")) as f:
+            return int(f.read().strip().removeprefix("gen-"))
+    except (OSError, ValueError):
+        return None
+
+
+def load(name: str) -> CatalogIndex | None:
+    """Map the current generation of `name`, or return None if none is published."""
+    generation = read_generation(name)
+    if generation is None:
+        return None
+    path = os.path.join(_catalog_dir(name), f"gen-{generation:06d}.snap")
+    try:
+        return CatalogIndex(name, generation, path)
+    except SnapshotError:
+        return None
+
+
+def publish(name: str, ids: list[int], vectors, payloads: list[dict], source_sha256: bytes = b"") -> int:
+    """Write a new generation and make it current. Returns the generation number.
+
+    `source_sha256` records the JSON the rows stand for (see matches_source).
+    Callers that read-modify-write (e.g. appending one activity) should hold
+    build_lock around both the read and this call.
+    """
+    return _publish_with(name, lambda path: write_snapshot(path, ids, vectors, payloads, source_sha256))
+
+
+def publish_snapshot(name: str, snapshot_path: str) -> int:
+    """Publish an already compiled snapshot file as the next generation."""
+    return _publish_with(name, lambda path: shutil.copyfile(snapshot_path, path))
+
+
+def matches_source(index: CatalogIndex, source_path: str) -> bool:
+    """True if `index` was published for the current contents of `source_path` (or that file is gone).
+
+    INDEX_DIR outlives the process, so a generation found at startup may
+    predate an edit to the JSON catalog and must then be republished.
+    """
+    if not os.path.exists(source_path):
+        return True
+    return index.source_sha256 == source_digest(source_path).ljust(32, b"\x00")
+
+
+def _publish_with(name: str, write) -> int:
+    root = _catalog_dir(name)
+    os.makedirs(root, exist_ok=True)
+    generation = (read_generation(name) or 0) + 1
+    final = os.path.join(root, f"gen-{generation:06d}.snap")
+    tmp = f"{final}.tmp-{os.getpid()}"
+    write(tmp)
+    os.rename(tmp, final)
+
+    pointer_tmp = os.path.join(root, f"CURRENT.tmp-{os.getpid()}")
+    with open(pointer_tmp, "w") as f:
+        f.write(f"gen-{generation:06d}")
+    os.replace(pointer_tmp, os.path.join(root, "CURRENT"))
+
+    _prune(root, generation)
+    # Workers on this host would pick it up within INDEX_REFRESH_SECONDS; tell them now
+    publish_event("catalog_published", catalog=name, generation=generation)
+    return generation
+
+
+def _prune(root: str, current: int):
+    for entry in os.listdir(root):
+        if not entry.startswith("gen-") or not entry.endswith(".snap"):
+            continue
+        try:
+            generation = int(entry.removeprefix("gen-").removesuffix(".snap"))
+        except ValueError:
+            continue
+        if generation < current - KEEP_GENERATIONS:
+            try:
+                os.remove(os.path.join(root, entry))
+            except OSError:
+                pass
+
+
+# Handles per catalog name, refreshed when a catalog_published event arrives
+_handles: dict[str, list["IndexHandle"]] = {}
+
+
+class IndexHandle:
+    """A worker's view of one catalog. Picks up newly published generations."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.index: CatalogIndex | None = None
+        self._checked_at = 0.0
+        _handles.setdefault(name, []).append(self)
+
+    def current(self) -> CatalogIndex | None:
+        """Return the mapped index, re-checking CURRENT at most every INDEX_REFRESH_SECONDS."""
+        now = time.monotonic()
+        if self.index is not None and now - self._checked_at < INDEX_REFRESH_SECONDS:
+            return self.index
+        self._checked_at = now
+        generation = read_generation(self.name)
+        if generation is not None and (self.index is None or generation != self.index.generation):
+            self.index = load(self.name) or self.index
+        return self.index
+
+    def refresh(self) -> CatalogIndex | None:
+        """Re-check CURRENT now, e.g. right after this worker published."""
+        self._checked_at = 0.0
+        return self.current()
+
+
+def _apply_catalog_published(event: dict):
+    for handle in _handles.get(event["catalog"], []):
+        if handle.index is None or handle.index.generation != event["generation"]:
+            handle.refresh()
+
+
+subscribe("catalog_published", _apply_catalog_published)
+
+
+class VectorView(Mapping):
+    """Dict-like id -> vector view over a handle's current generation."""
+
+    def __init__(self, handle: IndexHandle):
+        self._handle = handle
+
+    def __getitem__(self, key: int) -> list[float]:
+        index = self._handle.current()
+        if index is None or key not in index.row_of:
+            raise KeyError(key)
+        return index.vector(index.row_of[key])
+
+    def __contains__(self, key) -> bool:
+        index = self._handle.current()
+        return index is not None and key in index.row_of
+
+    def __iter__(self):
+        index = self._handle.current()
+        return iter(index.row_of) if index is not None else iter(())
+
+    def __len__(self) -> int:
+        index = self._handle.current()
+        return len(index) if index is not None else 0
+
+
+class PayloadView(VectorView):
+    """Dict-like id -> payload view over a handle's current generation."""
+
+    def __getitem__(self, key: int) -> dict:
+        index = self._handle.current()
+        if index is None or key not in index.row_of:
+            raise KeyError(key)
+        return index.payload(index.row_of[key])
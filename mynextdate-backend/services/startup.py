@@ -0,0 +1,136 @@
+"""Concurrent startup orchestration with per-step timeouts and readiness gating.
+
+Steps run as soon as the steps they depend on have finished, each under its own
+timeout. Sync steps run in a worker thread so the event loop keeps serving
+/api/health while the caches warm. The app is "ready" once every step marked
+`gates_ready` has succeeded.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+from services.metrics import Gauge
+
+STARTUP_STEP_SECONDS = Gauge(
+    "mynextdate_startup_step_seconds",
+    "Duration of each startup step by final status.",
+    ("step", "status"),
+)
+READY = Gauge("mynextdate_ready", "1 once all readiness-gating startup steps have succeeded.")
+
+
+@dataclass
+class StartupStep:
+    name: str
+    fn: Callable
+    timeout: float = 30.0
+    requires: tuple[str, ...] = ()
+    gates_ready: bool = False
+
+
+@dataclass
+class _StepState:
+    status: str = "pending"
+    duration_ms: float | None = None
+    error: str | None = None
+
+
+@dataclass
+class _StartupState:
+    running: bool = False
+    finished: bool = False
+    ready: bool = False
+    started_at: float | None = None
+    duration_ms: float | None = None
+    steps: dict[str, _StepState] = field(default_factory=dict)
+
+
+_state = _StartupState()
+_ready_event: asyncio.Event | None = None
+
+
+def is_ready() -> bool:
+    return _state.ready
+
+
+def is_warming() -> bool:
+    """True while startup is still in progress. Failed startups stop counting as warming."""
+    return _state.running and not _state.finished
+
+
+async def wait_until_ready(timeout: float) -> bool:
+    """Wait (without blocking the loop) for readiness or for startup to finish."""
+    if not is_warming() or _ready_event is None:
+        return _state.ready
+    try:
+        await asyncio.wait_for(_ready_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return _state.ready
+
+
+def startup_report() -> dict:
+    return {
+        "ready": _state.ready,
+        "warming": is_warming(),
+        "duration_ms": _state.duration_ms,
+        "steps": {
+            name: {"status": s.status, "duration_ms": s.duration_ms, "error": s.error}
+            for name, s in _state.steps.items()
+        },
+    }
+
+
+async def _run_step(step: StartupStep, done: dict[str, asyncio.Event]):
+    state = _state.steps[step.name]
+    for dep in step.requires:
+        await done[dep].wait()
+    failed_deps = [d for d in step.requires if _state.steps[d].status != "ok"]
+    if failed_deps:
+        state.status = "skipped"
+        state.error = f"dependency failed: {', '.join(failed_deps)}"
+        print(f"Startup step {step.name}: skipped ({state.error})")
+        done[step.name].set()
+        return
+
+    state.status = "running"
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(step.fn):
+            await asyncio.wait_for(step.fn(), step.timeout)
+        else:
+            # A timed-out thread can't be killed; it finishes in the background
+            await asyncio.wait_for(asyncio.to_thread(step.fn), step.timeout)
+        state.status = "ok"
+    except asyncio.TimeoutError:
+        state.status = "timeout"
+        state.error = f"exceeded {step.timeout}s"
+    except Exception as e:
+        state.status = "failed"
+        state.error = str(e)
+    state.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    STARTUP_STEP_SECONDS.set(state.duration_ms / 1000, step.name, state.status)
+
+    suffix = f" ({state.error})" if state.error else ""
+    print(f"Startup step {step.name}: {state.status} in {state.duration_ms}ms{suffix}")
+    done[step.name].set()
+
+
+async def run_startup(steps: list[StartupStep]):
+    """Run all steps concurrently, honouring `requires`, and flip readiness at the end."""
+    global _ready_event
+    _ready_event = asyncio.Event()
+    _state.running = True
+    _state.started_at = time.time()
+    _state.steps = {s.name: _StepState() for s in steps}
+    start = time.perf_counter()
+
+    done = {s.name: asyncio.Event() for s in steps}
+    await asyncio.gather(*(_run_step(s, done) for s in steps))
+
+    _state.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    _state.ready = all(_state.steps[s.name].status == "ok" for s in steps if s.gates_ready)
+    _state.finished = True
+    READY.set(1 if _state.ready else 0)
+    _ready_event.set()
+    print(f"Startup finished in {_state.duration_ms}ms — ready={_state.ready}")
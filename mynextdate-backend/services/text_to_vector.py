@@ -1,11 +1,31 @@
-"""Convert free-text date descriptions to 9D vectors using Groq (Llama 3.3 70B)."""
-import json
-from groq import Groq
-from config import GROQ_API_KEY
-
-client = Groq(api_key=GROQ_API_KEY)
+"""Convert free-text date descriptions to 9D vectors with an LLM (Groq, hedged to Gemini).
 
-PROMPT_TEMPLATE = """You are a date activity analyzer. Given a description of a date, output exactly 9 scores between 0.0 and 1.0. Be PRECISE — avoid defaulting to 0.5 unless truly ambiguous. Use the full range of values.
+A description is answered without the LLM when it was vectorized before
+(services/llm_cache.py) or when the local regressor is confident about it
+(services/local_vectorizer.py). Every LLM output is persisted to the cache.
+"""
+import asyncio
+import json
+from config import LLM_TIMEOUT_SECONDS, LOCAL_VECTORIZER_MIN_CONFIDENCE
+from services import llm_cache
+from services.circuit_breaker import CircuitOpenError
+from services.llm_providers import complete
+from services.local_vectorizer import predict_one
+from services.metrics import Counter
+
+LEXICAL_FALLBACKS = Counter(
+    "mynextdate_lexical_fallbacks_total",
+    "Searches answered lexically because text_to_vector timed out, failed or its circuit was open.",
+    ("reason",),
+)
+
+TEXT_VECTOR_SOURCES = Counter(
+    "mynextdate_text_vector_source_total",
+    "Text→vector conversions by where the vector came from (cache, local, llm).",
+    ("source",),
+)
+
+_DIMENSION_GUIDE = """You are a date activity analyzer. Given a description of a date, output exactly 9 scores between 0.0 and 1.0. Be PRECISE — avoid defaulting to 0.5 unless truly ambiguous. Use the full range of values.
 
 Dimensions with detailed anchors:
 1. cost: 0.0=free, 0.1=nearly free, 0.2=cheap ($5-15), 0.35=budget ($15-35), 0.5=mid ($35-60), 0.7=pricey ($60-120), 0.85=expensive ($120-250), 1.0=luxury ($250+)
@@ -30,11 +50,21 @@ Examples:
 - "Amusement park all day" → [0.5, 0.75, 0.8, 0.85, 0.5, 0.8, 0.7, 0.45, 0.3]
 - "Painting class together" → [0.35, 0.0, 0.25, 0.4, 0.55, 0.35, 0.5, 0.5, 0.45]
 
-Respond with ONLY a JSON array of 9 numbers. No text.
+"""
+
+PROMPT_TEMPLATE = _DIMENSION_GUIDE + """Respond with ONLY a JSON array of 9 numbers. No text.
 
 Description: "{description}"
 """
 
+BATCH_PROMPT_TEMPLATE = _DIMENSION_GUIDE + """Score EACH of the numbered descriptions below independently.
+
+Respond with ONLY a JSON array containing one array of 9 numbers per description, in the same order ({count} arrays). No text.
+
+Descriptions:
+{descriptions}
+"""
+
 
 ACTIVITY_ENTRY_PROMPT = """Given a raw date activity description from a user, generate a canonical entry for a date activity database.
 
@@ -54,45 +84,92 @@ Respond with ONLY the JSON object. No markdown, no extra text."""
 async def generate_activity_entry(user_text: str) -> dict:
     """Generate canonical activity name and description from user-provided text."""
     prompt = ACTIVITY_ENTRY_PROMPT.format(user_text=user_text)
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
-    text = response.choices[0].message.content.strip()
-    if "```" in text:
-        text = text.split("```")[1]
-        if text.startswith("json"):
-            text = text[4:]
-        text = text.strip()
-    result = json.loads(text)
-    return result
+    reply = await complete(prompt, temperature=0.3, operation="activity_entry")
+    return _parse_json(reply)
+
+
+def _fast_vector(description: str) -> list[float] | None:
+    """A cached LLM vector or a confident local prediction for `description`, else None.
+
+    Blocks on SQLite and the model, so async callers run it in a worker thread.
+    """
+    cached = llm_cache.get(description)
+    if cached is not None:
+        TEXT_VECTOR_SOURCES.inc("cache")
+        return cached
+    prediction = predict_one(description)
+    if prediction is not None and prediction[1] >= LOCAL_VECTORIZER_MIN_CONFIDENCE:
+        TEXT_VECTOR_SOURCES.inc("local")
+        return prediction[0]
+    return None
 
 
 async def text_to_vector(description: str) -> list[float]:
-    """Convert a text description to a 9D vector using Groq."""
+    """Convert a text description to a 9D vector, asking the LLM only when there is no fast answer."""
+    fast = await asyncio.to_thread(_fast_vector, description)
+    if fast is not None:
+        return fast
     prompt = PROMPT_TEMPLATE.format(description=description)
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1,
-    )
-    text = response.choices[0].message.content.strip()
+    reply = await complete(prompt, temperature=0.1, operation="text_to_vector")
+    vector = _clamp_vector(_parse_json(reply))
+    TEXT_VECTOR_SOURCES.inc("llm")
+    await asyncio.to_thread(llm_cache.put, description, vector)
+    return vector
 
-    # Parse the JSON array from response
+
+def _parse_json(text: str):
+    text = text.strip()
     # Handle cases where LLM might wrap in markdown code blocks
     if "```" in text:
         text = text.split("```")[1]
         if text.startswith("json"):
             text = text[4:]
         text = text.strip()
+    return json.loads(text)
 
-    vector = json.loads(text)
 
+def _clamp_vector(vector) -> list[float]:
     if len(vector) != 9:
         raise ValueError(f"Expected 9 dimensions, got {len(vector)}")
 
     # Clamp values to [0, 1]
-    vector = [max(0.0, min(1.0, float(v))) for v in vector]
-    return vector
+    return [max(0.0, min(1.0, float(v))) for v in vector]
+
+
+async def texts_to_vectors(descriptions: list[str]) -> list[list[float]]:
+    """Convert several descriptions to 9D vectors, those without a fast answer in a single LLM call.
+
+    Raises if the reply doesn't line up.
+    """
+    results = await asyncio.to_thread(lambda: [_fast_vector(d) for d in descriptions])
+    remaining = [d for d, v in zip(descriptions, results) if v is None]
+    if not remaining:
+        return results
+    numbered = "\n".join(f"{i}. {json.dumps(d)}" for i, d in enumerate(remaining, 1))
+    prompt = BATCH_PROMPT_TEMPLATE.format(count=len(remaining), descriptions=numbered)
+
+    reply = await complete(prompt, temperature=0.1, operation="texts_to_vectors")
+    vectors = _parse_json(reply)
+    if len(vectors) != len(remaining):
+        raise ValueError(f"Expected {len(remaining)} vectors, got {len(vectors)}")
+    vectors = [_clamp_vector(v) for v in vectors]
+    TEXT_VECTOR_SOURCES.inc("llm", amount=len(vectors))
+    await asyncio.to_thread(llm_cache.put_many, list(zip(remaining, vectors)))
+    llm_vectors = iter(vectors)
+    return [v if v is not None else next(llm_vectors) for v in results]
+
+
+async def try_text_to_vector(description: str, timeout: float = LLM_TIMEOUT_SECONDS) -> list[float] | None:
+    """text_to_vector bounded by `timeout`. Returns None if the LLM is slow or fails, so callers can answer lexically."""
+    try:
+        return await asyncio.wait_for(text_to_vector(description), timeout)
+    except asyncio.TimeoutError:
+        LEXICAL_FALLBACKS.inc("timeout")
+        print(f"text_to_vector exceeded {timeout}s, falling back to lexical search")
+    except CircuitOpenError:
+        LEXICAL_FALLBACKS.inc("circuit_open")
+    except Exception as e:
+        LEXICAL_FALLBACKS.inc("error")
+        print(f"text_to_vector failed, falling back to lexical search: {e}")
+    return None
@@ -0,0 +1,182 @@
+"""Per-request trace spans, emitted as Server-Timing headers and JSON log lines.
+
+A trace is opened by middleware.tracing.TracingMiddleware and carried in a
+context variable, so `span()` can be dropped into any route or service without
+threading state through call signatures. Outside a request it is a no-op.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import TRACE_LOG_ENABLED, OTEL_TRACE_FILE
+
+_current_trace: ContextVar["Trace | None"] = ContextVar("current_trace", default=None)
+_current_span_id: ContextVar[str | None] = ContextVar("current_span_id", default=None)
+
+logger = logging.getLogger("mynextdate.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_export_lock = threading.Lock()
+
+
+class Trace:
+    """Spans collected while serving one request."""
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.trace_id = uuid.uuid4().hex
+        self.root_span_id = uuid.uuid4().hex[:16]
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status = 500
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.end_ns = 0
+        self.spans: list[dict] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def server_timing(self) -> str:
+        """Sum span durations by name into a Server-Timing header value."""
+        totals: dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"]
+        parts = [f"{name};dur={ms:.2f}" for name, ms in totals.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.2f}")
+        return ", ".join(parts)
+
+
+def start_trace(request_id: str, method: str, path: str) -> tuple[Trace, object]:
+    trace = Trace(request_id, method, path)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(trace: Trace, token) -> None:
+    _current_trace.reset(token)
+    trace.end_ns = time.time_ns()
+    if TRACE_LOG_ENABLED:
+        _log_trace(trace)
+    if OTEL_TRACE_FILE:
+        _export_otlp(trace)
+
+
+def current_request_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage of the current request. Cheap no-op when no trace is active."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    parent = _current_span_id.get() or trace.root_span_id
+    token = _current_span_id.set(span_id)
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span_id.reset(token)
+        record = {
+            "name": name,
+            "span_id": span_id,
+            "parent_id": parent,
+            "start_ns": start_ns,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        if attrs:
+            record["attrs"] = attrs
+        if error:
+            record["error"] = error
+        trace.spans.append(record)
+
+
+def _log_trace(trace: Trace) -> None:
+    logger.info(json.dumps({
+        "event": "request",
+        "request_id": trace.request_id,
+        "trace_id": trace.trace_id,
+        "method": trace.method,
+        "route": trace.route,
+        "status": trace.status,
+        "duration_ms": round((trace.end_ns - trace.start_ns) / 1e6, 3),
+        "spans": [
+            {k: v for k, v in s.items() if k not in ("span_id", "parent_id", "start_ns")}
+            for s in trace.spans
+        ],
+    }))
+
+
+def _otlp_attributes(attrs: dict) -> list[dict]:
+    out = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            out.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            out.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            out.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            out.append({"key": key, "value": {"stringValue": str(value)}})
+    return out
+
+
+def _export_otlp(trace: Trace) -> None:
+    """Append the trace as one OTLP/JSON line, readable by the collector's file receiver."""
+    spans = [{
+        "traceId": trace.trace_id,
+        "spanId": trace.root_span_id,
+        "name": f"{trace.method} {trace.route}",
+        "kind": 2,
+        "startTimeUnixNano": str(trace.start_ns),
+        "endTimeUnixNano": str(trace.end_ns),
+        "attributes": _otlp_attributes({
+            "http.request.method": trace.method,
+            "http.route": trace.route,
+            "http.response.status_code": trace.status,
+            "request.id": trace.request_id,
+        }),
+    }]
+    for s in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s["span_id"],
+            "parentSpanId": s["parent_id"],
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["start_ns"] + int(s["duration_ms"] * 1e6)),
+            "attributes": _otlp_attributes(s.get("attrs", {})),
+            "status": {"code": 2, "message": s["error"]} if "error" in s else {},
+        })
+    line = json.dumps({
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "mynextdate-backend"})},
+            "scopeSpans": [{"scope": {"name": "mynextdate.tracing"}, "spans": spans}],
+        }]
+    })
+    try:
+        with _export_lock, open(OTEL_TRACE_FILE, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Trace export failed (non-fatal): {e}")
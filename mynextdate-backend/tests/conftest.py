@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Keep every on-disk store the services touch out of data/ and /dev/shm
+_tmp = tempfile.mkdtemp(prefix="mynextdate-tests-")
+os.environ.setdefault("INDEX_DIR", os.path.join(_tmp, "index"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+os.environ.setdefault("TRACE_LOG_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
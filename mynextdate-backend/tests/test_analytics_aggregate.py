@@ -0,0 +1,95 @@
+"""Parity between the incremental UserAggregate and the vectorized full recompute."""
+import random
+import numpy as np
+import pytest
+from config import VECTOR_DIMENSION
+from services.analytics_service import UserAggregate, compute_analytics
+
+RATINGS = [None, 0, 0.5, 1, 2, 2.5, 3, 3.5, 4, 5]
+
+
+def _random_history(rng: random.Random, n: int) -> tuple[list[dict], dict]:
+    vectors = {aid: [rng.random() for _ in range(VECTOR_DIMENSION)] for aid in range(1, 20)}
+    dates = []
+    for i in range(n):
+        custom = rng.random() < 0.2
+        date_id = f"d{i}"
+        if custom:
+            vectors[date_id] = [rng.random() for _ in range(VECTOR_DIMENSION)]
+        dates.append({
+            "id": date_id,
+            # Some activities have no vector (e.g. removed from the catalog)
+            "activity_id": 0 if custom else rng.randint(1, 22),
+            "rating": rng.choice(RATINGS),
+            "created_at": f"2026-01-01T00:00:{i:02d}.{i:06d}+00:00",
+        })
+    return dates, vectors
+
+
+def _vector(date: dict, vectors: dict):
+    return vectors.get(date["id"] if date["activity_id"] == 0 else date["activity_id"])
+
+
+def _newest_first(dates: list[dict]) -> list[dict]:
+    return sorted(dates, key=lambda d: d["created_at"], reverse=True)
+
+
+def _assert_parity(agg: UserAggregate, dates: list[dict], vectors: dict):
+    full = UserAggregate.from_history(_newest_first(dates), vectors)
+    assert agg.total == full.total
+    assert agg.rated == full.rated
+    assert agg.successes == full.successes
+    assert agg.vector_count == full.vector_count
+    assert agg.weight_sum == pytest.approx(full.weight_sum)
+    np.testing.assert_allclose(agg.vector_sum, full.vector_sum, atol=1e-9)
+    assert [item[1:] for item in agg.recent[:5]] == [item[1:] for item in full.recent[:5]]
+
+    incremental, expected = agg.to_analytics(), compute_analytics(_newest_first(dates), vectors)
+    dims, expected_dims = incremental.pop("dimension_averages"), expected.pop("dimension_averages")
+    assert dims == pytest.approx(expected_dims, abs=1e-3)
+    incremental.pop("preference_summary"), expected.pop("preference_summary")
+    assert incremental == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_add_rate_remove_match_full_recompute(seed):
+    rng = random.Random(seed)
+    dates, vectors = _random_history(rng, 40)
+    agg = UserAggregate()
+    live: dict[str, dict] = {}
+
+    # Inserts arrive in any order, e.g. from a bulk import with explicit dates
+    for date in rng.sample(dates, len(dates)):
+        agg.add(date["id"], date["created_at"], date["rating"], _vector(date, vectors))
+        live[date["id"]] = date
+    _assert_parity(agg, list(live.values()), vectors)
+
+    for _ in range(60):
+        date_id = rng.choice(list(live))
+        if rng.random() < 0.6:
+            rating = rng.choice(RATINGS)
+            agg.rate(date_id, rating)
+            live[date_id] = {**live[date_id], "rating": rating}
+        else:
+            agg.remove(date_id)
+            del live[date_id]
+        _assert_parity(agg, list(live.values()), vectors)
+        if not live:
+            break
+
+
+def test_from_history_matches_incremental_build():
+    dates, vectors = _random_history(random.Random(99), 30)
+    agg = UserAggregate()
+    for date in reversed(_newest_first(dates)):
+        agg.add(date["id"], date["created_at"], date["rating"], _vector(date, vectors))
+    _assert_parity(agg, dates, vectors)
+
+
+def test_removing_everything_returns_empty_analytics():
+    dates, vectors = _random_history(random.Random(7), 10)
+    agg = UserAggregate.from_history(_newest_first(dates), vectors)
+    for date in dates:
+        agg.remove(date["id"])
+    assert agg.to_analytics() == compute_analytics([], vectors)
+    np.testing.assert_allclose(agg.vector_sum, np.zeros(VECTOR_DIMENSION), atol=1e-9)
@@ -0,0 +1,81 @@
+"""FileBus: events survive segment rotation, a lagging listener skips ahead, own events aren't echoed."""
+import os
+import time
+import pytest
+from services import invalidation
+from services.invalidation import BUS_ERRORS, WORKER_ID, FileBus, publish_event
+
+MAX_BYTES = 1024
+
+
+@pytest.fixture
+def received(monkeypatch):
+    events: list[dict] = []
+    monkeypatch.setattr(invalidation, "_handlers", {"test_event": [events.append]})
+    return events
+
+
+@pytest.fixture
+def buses(tmp_path, monkeypatch):
+    """(publisher, listener): two workers' buses on one file. The listener is started."""
+    path = str(tmp_path / "bus.jsonl")
+    publisher = FileBus(path, max_bytes=MAX_BYTES, poll_interval=0.01)
+    listener = FileBus(path, max_bytes=MAX_BYTES, poll_interval=0.01)
+    listener.start()
+    monkeypatch.setattr(invalidation, "_bus", publisher)
+    yield publisher, listener
+    listener.stop()
+
+
+def _foreign(n: int) -> dict:
+    return {"type": "test_event", "origin": "another-worker", "id": f"e{n}", "n": n}
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the listener"
+        time.sleep(0.01)
+
+
+def test_events_survive_rotation(buses, received):
+    publisher, _ = buses
+    # In bursts well under a segment, so the listener never falls KEEP_SEGMENTS behind
+    for start in range(0, 200, 5):
+        for n in range(start, start + 5):
+            publisher.publish(_foreign(n))
+        _wait_for(lambda: len(received) == start + 5)
+    assert [e["n"] for e in received] == list(range(200))
+
+    rotated = [name for name in os.listdir(os.path.dirname(publisher.path)) if name.startswith("bus.jsonl.") and name[-1].isdigit()]
+    assert 0 < len(rotated) <= FileBus.KEEP_SEGMENTS
+    assert os.path.getsize(publisher.path) < MAX_BYTES + 200
+
+
+def test_lagging_listener_skips_to_the_newest_segment(tmp_path, received):
+    path = str(tmp_path / "bus.jsonl")
+    publisher = FileBus(path, max_bytes=MAX_BYTES)
+    listener = FileBus(path, max_bytes=MAX_BYTES, poll_interval=0.5)
+    listener.start()
+    try:
+        gaps = BUS_ERRORS.value("file", "gap")
+        # Many rotations inside one poll interval: the listener's next segment is gone
+        for n in range(300):
+            publisher.publish(_foreign(n))
+        _wait_for(lambda: received and received[-1]["n"] == 299)
+    finally:
+        listener.stop()
+    assert BUS_ERRORS.value("file", "gap") > gaps
+    numbers = [e["n"] for e in received]
+    assert numbers == sorted(numbers) and len(numbers) < 300
+
+
+def test_own_events_are_not_dispatched_back(buses, received):
+    publisher, _ = buses
+    publish_event("test_event", n=-1)
+    # Applied locally once, at publish time
+    assert [e["origin"] for e in received] == [WORKER_ID]
+    publisher.publish(_foreign(0))
+    _wait_for(lambda: len(received) == 2)
+    time.sleep(0.05)
+    assert [e["n"] for e in received] == [-1, 0]
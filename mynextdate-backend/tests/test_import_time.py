@@ -0,0 +1,26 @@
+"""Cold-start budget: `import main` stays within IMPORT_BUDGET_MS and leaves client SDKs lazy."""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from check_import_time import DEFAULT_BUDGET_MS, eager_modules, measure
+
+
+@pytest.fixture(scope="module")
+def importtime():
+    return measure(runs=3)
+
+
+def test_import_main_within_budget(importtime):
+    total_us, rows = importtime
+    slowest = sorted(rows, key=lambda r: r[1], reverse=True)[1:6]
+    assert total_us / 1000 <= DEFAULT_BUDGET_MS, (
+        f"import main took {total_us / 1000:.0f} ms (budget {DEFAULT_BUDGET_MS:.0f} ms); slowest: "
+        + ", ".join(f"{name.strip()} {cumulative / 1000:.0f} ms" for _, cumulative, name in slowest)
+    )
+
+
+def test_client_sdks_imported_lazily(importtime):
+    _, rows = importtime
+    assert eager_modules(rows) == []
@@ -0,0 +1,133 @@
+"""Durable job queue: dedupe, retry backoff, dead letters, lease reclaim and requeue."""
+import asyncio
+import threading
+import pytest
+from services import job_queue
+
+BASE = 5.0
+LEASE = 300.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "JOB_QUEUE_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_queue, "_local", threading.local())
+    monkeypatch.setattr(job_queue, "_kinds", {})
+    monkeypatch.setattr(job_queue, "_loop", None)
+    monkeypatch.setattr(job_queue, "time", clock)
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(job_queue, "JOB_RETRY_BASE_SECONDS", BASE)
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", LEASE)
+    return clock
+
+
+def _job(dedupe_key: str = "k") -> dict:
+    return dict(job_queue._db().execute("SELECT * FROM jobs WHERE dedupe_key = ?", (dedupe_key,)).fetchone())
+
+
+def _drain() -> int:
+    return asyncio.run(job_queue.drain_once())
+
+
+def _register_failing(kind: str = "test"):
+    async def prepare(payload):
+        raise RuntimeError("boom")
+
+    job_queue.register(kind, prepare)
+
+
+def test_enqueue_dedupes_on_kind_and_key(clock):
+    done = []
+
+    async def prepare(payload):
+        return payload["n"]
+
+    job_queue.register("test", prepare, commit=done.extend)
+    assert job_queue.enqueue("test", {"n": 1}, "k")
+    assert not job_queue.enqueue("test", {"n": 2}, "k")
+    assert job_queue.enqueue("other", {"n": 3}, "k")
+    job_queue.register("other", prepare)
+    assert _drain() == 2
+    assert done == [1]
+    # Still a no-op once the job is done
+    assert not job_queue.enqueue("test", {"n": 4}, "k")
+    assert _drain() == 0
+
+
+def test_failures_back_off_exponentially(clock):
+    _register_failing()
+    job_queue.enqueue("test", {}, "k")
+    assert _drain() == 1
+    job = _job()
+    assert (job["status"], job["attempts"], job["last_error"]) == ("pending", 1, "boom")
+    assert job["next_run_at"] == clock.now + BASE
+
+    clock.now += BASE - 1
+    assert _drain() == 0
+    clock.now += 1
+    assert _drain() == 1
+    job = _job()
+    assert job["attempts"] == 2
+    assert job["next_run_at"] == clock.now + BASE * 2
+
+
+def test_job_out_of_attempts_moves_to_dead_letters(clock):
+    _register_failing()
+    job_queue.enqueue("test", {"x": 1}, "k")
+    for _ in range(3):
+        assert _drain() == 1
+        clock.now += BASE * 4
+    assert _drain() == 0
+    [dead] = job_queue.dead_letters()
+    assert (dead["dedupe_key"], dead["attempts"], dead["payload"]) == ("k", 3, {"x": 1})
+    assert job_queue.stats() == {"test": {"dead": 1}}
+
+
+def test_expired_lease_counts_as_an_attempt(clock):
+    job_queue.enqueue("test", {}, "k")
+    # A worker claims the job and dies without finishing it
+    assert len(job_queue._claim(10)) == 1
+    clock.now += LEASE - 1
+    assert job_queue._claim(10) == []
+
+    clock.now += 2
+    [reclaimed] = job_queue._claim(10)
+    assert reclaimed["attempts"] == 1
+    assert "lease expired" in reclaimed["last_error"]
+
+    clock.now += LEASE + 1
+    assert len(job_queue._claim(10)) == 1
+    # The third expiry exhausts JOB_MAX_ATTEMPTS instead of running it again
+    clock.now += LEASE + 1
+    assert job_queue._claim(10) == []
+    job = _job()
+    assert (job["status"], job["attempts"]) == ("dead", 3)
+
+
+def test_requeue_gives_a_dead_job_a_fresh_budget(clock):
+    _register_failing()
+    job_queue.enqueue("test", {}, "k")
+    for _ in range(3):
+        _drain()
+        clock.now += BASE * 4
+    job_id = _job()["id"]
+    assert job_queue.requeue(job_id)
+    assert not job_queue.requeue(job_id)
+    job = _job()
+    assert (job["status"], job["attempts"]) == ("pending", 0)
+
+    async def prepare(payload):
+        return None
+
+    job_queue.register("test", prepare)
+    assert _drain() == 1
+    assert _job()["status"] == "done"
@@ -0,0 +1,61 @@
+"""Hedged LLM calls across FakeProviders with scripted delays."""
+import asyncio
+import time
+import pytest
+from services import llm_providers
+from services.llm_providers import FakeProvider, complete, set_providers
+
+HEDGE_DELAY = 0.2
+
+
+@pytest.fixture(autouse=True)
+def fast_hedge(monkeypatch):
+    # Fresh providers have no latency samples, so the default delay applies
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_DEFAULT_DELAY_SECONDS", HEDGE_DELAY)
+    monkeypatch.setattr(llm_providers, "_providers", None)
+
+
+def _complete(primary: FakeProvider, secondary: FakeProvider) -> str:
+    set_providers([primary, secondary])
+
+    async def run():
+        result = await complete("prompt", operation="test")
+        # Let the cancelled loser see its CancelledError
+        await asyncio.sleep(0)
+        return result
+
+    return asyncio.run(run())
+
+
+def test_primary_before_hedge_delay_is_not_hedged():
+    primary = FakeProvider("primary", reply="p", delays=[0.0])
+    secondary = FakeProvider("secondary", reply="s", delays=[0.0])
+    assert _complete(primary, secondary) == "p"
+    assert secondary.calls == 0
+
+
+def test_slow_primary_loses_to_secondary_and_is_cancelled():
+    primary = FakeProvider("primary", reply="p", delays=[5.0])
+    secondary = FakeProvider("secondary", reply="s", delays=[0.0])
+    assert _complete(primary, secondary) == "s"
+    assert (primary.calls, secondary.calls) == (1, 1)
+    assert primary.cancelled == 1
+    assert secondary.cancelled == 0
+
+
+def test_failed_primary_is_hedged_at_once():
+    primary = FakeProvider("primary", delays=[0.0], error=RuntimeError("primary down"))
+    secondary = FakeProvider("secondary", reply="s", delays=[0.0])
+    start = time.perf_counter()
+    assert _complete(primary, secondary) == "s"
+    # Didn't wait out the hedge delay first
+    assert time.perf_counter() - start < HEDGE_DELAY
+    assert secondary.calls == 1
+
+
+def test_both_failing_raises_the_primary_error():
+    primary = FakeProvider("primary", delays=[0.0], error=ValueError("primary error"))
+    secondary = FakeProvider("secondary", delays=[0.0], error=RuntimeError("secondary error"))
+    with pytest.raises(ValueError, match="primary error"):
+        _complete(primary, secondary)
+    assert secondary.calls == 1
@@ -1,7 +1,7 @@
 import { useState } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { X, Loader2, Send, Sparkles, Check, Heart, PenLine } from 'lucide-react'
-import { previewDateMatches, addDate, addCustomDate } from '../lib/api'
+import { streamDateMatches, addDate, addCustomDate } from '../lib/api'
 
 export default function AddDateModal({ isOpen, onClose, onDateAdded }) {
   const [description, setDescription] = useState('')
@@ -35,8 +35,15 @@ export default function AddDateModal({ isOpen, onClose, onDateAdded }) {
     setSelected(null)
     setSaved(false)
     try {
-      const data = await previewDateMatches(description.trim())
-      setMatches(data.top_matches)
+      // Show catalog matches as soon as they arrive; the merged top 3 replaces them
+      await streamDateMatches(description.trim(), (event, data) => {
+        if (event === 'catalog' && data.matches.length) {
+          setMatches(data.matches)
+          setLoading(false)
+        } else if (event === 'matches') {
+          setMatches(data.top_matches)
+        }
+      })
     } catch (err) {
       setError('Failed to match your date. Please try again.')
       console.error(err)
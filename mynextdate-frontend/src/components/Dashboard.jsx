@@ -28,6 +28,7 @@ const stagger = {
 export default function Dashboard() {
   const { user, signOut } = useAuth()
   const [dates, setDates] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [showAddModal, setShowAddModal] = useState(false)
   const [refreshKey, setRefreshKey] = useState(0)
   const [heroShrunken, setHeroShrunken] = useState(false)
@@ -46,10 +47,24 @@ export default function Dashboard() {
 
   useEffect(() => {
     getDateHistory()
-      .then((data) => setDates(data.dates))
+      .then((data) => {
+        setDates(data.dates)
+        setNextCursor(data.next_cursor)
+      })
       .catch(console.error)
   }, [refreshKey])
 
+  const loadMoreDates = useCallback(async () => {
+    if (!nextCursor) return
+    try {
+      const data = await getDateHistory(nextCursor)
+      setDates((prev) => [...prev, ...data.dates])
+      setNextCursor(data.next_cursor)
+    } catch (err) {
+      console.error(err)
+    }
+  }, [nextCursor])
+
   // Request browser geolocation on mount and save to backend
   useEffect(() => {
     if (!navigator.geolocation) return
@@ -278,7 +293,7 @@ export default function Dashboard() {
                       className="label-editorial px-2 py-0.5 rounded-full"
                       style={{ background: 'rgba(139, 92, 246, 0.18)', fontSize: '0.65rem' }}
                     >
-                      {dates.length}
+                      {dates.length}{nextCursor ? '+' : ''}
                     </span>
                   )}
                 </div>
@@ -302,7 +317,7 @@ export default function Dashboard() {
                 </motion.button>
               </div>
               <div>
-                <DateHistory dates={dates} onUpdate={refresh} />
+                <DateHistory dates={dates} hasMore={!!nextCursor} onLoadMore={loadMoreDates} onUpdate={refresh} />
               </div>
             </motion.div>
 
@@ -6,11 +6,12 @@ import { rateDate, deleteDate } from '../lib/api'
 
 const PAGE_SIZE = 7
 
-export default function DateHistory({ dates, onUpdate }) {
+export default function DateHistory({ dates, hasMore = false, onLoadMore, onUpdate }) {
   const [deleting, setDeleting] = useState(null)
   const [rating, setRating] = useState(null)
   const [ratingOpen, setRatingOpen] = useState(null)
   const [page, setPage] = useState(0)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   const handleRate = async (dateId, value) => {
     setRating(dateId)
@@ -62,6 +63,17 @@ export default function DateHistory({ dates, onUpdate }) {
 
   const start = safePage * PAGE_SIZE
   const pageDates = dates.slice(start, start + PAGE_SIZE)
+  const canGoNext = safePage < totalPages - 1 || hasMore
+
+  const handleNext = async () => {
+    // Fetch the next server page when stepping past the dates loaded so far
+    if (safePage >= totalPages - 1 && hasMore) {
+      setLoadingMore(true)
+      await onLoadMore?.()
+      setLoadingMore(false)
+    }
+    setPage((p) => p + 1)
+  }
 
   return (
     <div>
@@ -154,7 +166,7 @@ export default function DateHistory({ dates, onUpdate }) {
       </div>
 
       {/* Pagination */}
-      {totalPages > 1 && (
+      {(totalPages > 1 || hasMore) && (
         <div className="flex items-center justify-between mt-4 pt-3" style={{ borderTop: '1px solid rgba(109, 44, 142, 0.1)' }}>
           <motion.button
             onClick={() => setPage((p) => Math.max(0, p - 1))}
@@ -169,19 +181,19 @@ export default function DateHistory({ dates, onUpdate }) {
           </motion.button>
 
           <span className="text-xs font-mono" style={{ color: '#6b5f7e' }}>
-            {safePage + 1} / {totalPages}
+            {safePage + 1} / {totalPages}{hasMore ? '+' : ''}
           </span>
 
           <motion.button
-            onClick={() => setPage((p) => Math.min(totalPages - 1, p + 1))}
-            disabled={safePage >= totalPages - 1}
+            onClick={handleNext}
+            disabled={!canGoNext || loadingMore}
             className="flex items-center gap-1 text-xs px-3 py-1.5 rounded-lg disabled:opacity-30"
             style={{ color: '#c084fc', background: 'rgba(139, 92, 246, 0.08)' }}
-            whileHover={safePage < totalPages - 1 ? { scale: 1.05, background: 'rgba(139, 92, 246, 0.15)' } : {}}
-            whileTap={safePage < totalPages - 1 ? { scale: 0.95 } : {}}
+            whileHover={canGoNext ? { scale: 1.05, background: 'rgba(139, 92, 246, 0.15)' } : {}}
+            whileTap={canGoNext ? { scale: 0.95 } : {}}
           >
             Next
-            <ChevronRight className="w-3.5 h-3.5" />
+            {loadingMore ? <Loader2 className="w-3.5 h-3.5 animate-spin" /> : <ChevronRight className="w-3.5 h-3.5" />}
           </motion.button>
         </div>
       )}
@@ -11,6 +11,8 @@ export default function RecommendButton({ onDateAdded, dateCount = 0, onAddDate,
   const [chosenId, setChosenId] = useState(null)
   const [showPulse, setShowPulse] = useState(false)
   const [skippedIds, setSkippedIds] = useState([])
+  // Recommendation session cursor: "Try different ideas" pages through cached candidates
+  const [cursor, setCursor] = useState(null)
   const [needsHistory, setNeedsHistory] = useState(false)
   const [localTrends, setLocalTrends] = useState(null)
   const SCROLL_EXIT_MS = 850
@@ -40,7 +42,7 @@ export default function RecommendButton({ onDateAdded, dateCount = 0, onAddDate,
     try {
       const currentSkipped = [...skippedIds, ...extraSkips]
       const [data, trendsData] = await Promise.all([
-        breakup ? getWorstRecommendations() : getRecommendations(currentSkipped),
+        breakup ? getWorstRecommendations() : getRecommendations(currentSkipped, extraSkips.length ? cursor : null),
         getLocalTrends().catch(() => null),
       ])
 
@@ -56,6 +58,7 @@ export default function RecommendButton({ onDateAdded, dateCount = 0, onAddDate,
       // Wait for the scroll indicator to fully fade out before showing recs
       setTimeout(() => {
         setRecs(data.recommendations)
+        if (!breakup) setCursor(data.cursor ?? null)
         // Reset skipped IDs after successful fetch — fresh batch, fresh skips
         setSkippedIds([])
         setLoading(false)
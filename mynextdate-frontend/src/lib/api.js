@@ -8,8 +8,11 @@ async function authHeaders() {
   }
 }
 
-export async function getRecommendations(skipIds = []) {
-  const params = skipIds.length ? `?skip=${skipIds.join(',')}` : ''
+export async function getRecommendations(skipIds = [], cursor = null) {
+  const query = new URLSearchParams()
+  if (skipIds.length) query.set('skip', skipIds.join(','))
+  if (cursor) query.set('cursor', cursor)
+  const params = query.toString() ? `?${query}` : ''
   const res = await fetch(`/api/recommend${params}`, { headers: await authHeaders() })
   if (!res.ok) throw new Error('Failed to get recommendations')
   return res.json()
@@ -21,8 +24,10 @@ export async function getWorstRecommendations() {
   return res.json()
 }
 
-export async function getDateHistory() {
-  const res = await fetch('/api/dates', { headers: await authHeaders() })
+export async function getDateHistory(cursor = null, limit = 50) {
+  const query = new URLSearchParams({ limit })
+  if (cursor) query.set('cursor', cursor)
+  const res = await fetch(`/api/dates?${query}`, { headers: await authHeaders() })
   if (!res.ok) throw new Error('Failed to get date history')
   return res.json()
 }
@@ -37,6 +42,37 @@ export async function addDate(activityId, rating = null) {
   return res.json()
 }
 
+// POST a JSON body and call onEvent(event, data) for each server-sent event as it arrives
+async function postEventStream(url, body, onEvent) {
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: await authHeaders(),
+    body: JSON.stringify(body),
+  })
+  if (!res.ok || !res.body) throw new Error(`Request to ${url} failed`)
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += value
+    let end
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, end)
+      buffer = buffer.slice(end + 2)
+      let event = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      const payload = data ? JSON.parse(data) : null
+      if (event === 'error') throw new Error(payload?.detail || 'Stream failed')
+      onEvent(event, payload)
+    }
+  }
+}
+
 export async function previewDateMatches(description) {
   const res = await fetch('/api/dates/preview', {
     method: 'POST',
@@ -47,6 +83,16 @@ export async function previewDateMatches(description) {
   return res.json()
 }
 
+// Streams preview stages: vector, catalog (catalog top 3), community, matches (merged top 3), done
+export function streamDateMatches(description, onEvent) {
+  return postEventStream('/api/dates/preview/stream', { description }, onEvent)
+}
+
+// Streams describe stages: as preview, then record (the saved date)
+export function streamDateByDescription(description, rating, onEvent) {
+  return postEventStream('/api/dates/describe/stream', { description, rating }, onEvent)
+}
+
 export async function addCustomDate(name) {
   const res = await fetch('/api/dates/custom', {
     method: 'POST',